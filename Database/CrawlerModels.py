@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Boolean, Float, DateTime, Date, Computed
+from sqlalchemy import Column, String, Integer, BigInteger, Boolean, Float, DateTime, Date, Computed
 from sqlalchemy.dialects.postgresql import JSONB, BYTEA
 from sqlalchemy.sql import func
 from sqlalchemy.orm import declarative_base, declarative_mixin
@@ -15,7 +15,7 @@ class UrlStateMixin:
     content_path = Column(String)
 
     # Scheduler timestamps
-    first_seen = Column(DateTime(timezone=True), server_default=func.now())
+    first_seen = Column(DateTime(timezone=True), server_default=func.now(), index=True) # DomainScoreJob 的 watermark 查詢
     last_offered = Column(DateTime(timezone=True), default=datetime.min, index=True)
     last_fetched = Column(DateTime(timezone=True), default=datetime.min, index=True)
     last_typesense_push = Column(DateTime(timezone=True), default=datetime.min, index=True)
@@ -35,13 +35,14 @@ class UrlStateMixin:
     # Link count
     inlink_count = Column(Integer, default=0)
     outlink_count = Column(Integer, default=0)
+    page_rank = Column(Float, default=0.0) # 由 PageRankJob 寫入 (pr * N，平均值為 1)
 
     # Scheduling parameters
     crawl_priority = Column(Float, default=0.0, index=True)
     index_priority = Column(Float, default=0.0, index=True)
     domain_score = Column(Float, default=0.0, index=True)
 
-    indexed = Column(Integer, default=0, index=True)
+    indexed = Column(Integer, default=0, index=True) # 0: 未處理, 1: 已索引, -1: 永久失敗, -2: 等待重試 (index_retry), -3: DiversityCap 政策拒絕
     indexed_reason = Column(String, default="", index=True)
 
 @declarative_mixin
@@ -62,7 +63,7 @@ class DomainStatsMixin:
 @declarative_mixin
 class DomainStatsDailyMixin:
     domain = Column(String, primary_key=True)
-    stat_date = Column(Date, primary_key=True)
+    stat_date = Column(Date, primary_key=True, index=True) # 日期範圍查詢用 (TeamFlowAggregator)
     offered_count = Column(Integer, default=0)
     fetch_ok = Column(Integer, default=0)
     fetch_fail = Column(Integer, default=0)
@@ -110,4 +111,32 @@ class UrlLink(Base):
     anchor_text = Column(String)
 
     first_seen = Column(DateTime(timezone=True), server_default=func.now())
-    last_seen = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
\ No newline at end of file
+    last_seen = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class IndexRetry(Base):
+    """
+    Index Selection 暫時失敗的重試佇列 (見 IndexSelection/Retry/RetryQueue.py)
+    """
+    __tablename__ = "index_retry"
+
+    url = Column(String, primary_key=True)
+    table_index = Column(Integer, index=True)
+    reason = Column(String)
+    attempts = Column(Integer, default=0)
+    last_failed_at = Column(DateTime(timezone=True), server_default=func.now())
+    next_retry_at = Column(DateTime(timezone=True), index=True)
+
+class UrlStateCounter(Base):
+    """
+    url_state_NNN 的計數器 (見 Metric/Counter/ShardCounter.py)
+    is_base 為每個 Shard 的基準列，其餘為 Trigger 寫入的增量列，讀取時合併回基準列
+    """
+    __tablename__ = "url_state_counter"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    shard_id = Column(Integer, index=True, nullable=False)
+    discovered = Column(BigInteger, default=0, nullable=False)
+    crawled = Column(BigInteger, default=0, nullable=False)
+    indexed = Column(BigInteger, default=0, nullable=False)
+    is_base = Column(Boolean, default=False, server_default='false', nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
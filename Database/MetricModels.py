@@ -43,6 +43,13 @@ class CrawlerStatMixin:
     http_error_500_7  = Column(Integer, nullable=True)
     http_error_500_30 = Column(Integer, nullable=True)
 
+    # 估計模式 (CrawlerStatusMeasure approx)：is_estimate 為 True 時 discovered / crawled / indexed 為估計值，
+    # *_ci 為信賴區間半寬
+    is_estimate   = Column(Boolean, default=False)
+    discovered_ci = Column(Float, nullable=True)
+    crawled_ci    = Column(Float, nullable=True)
+    indexed_ci    = Column(Float, nullable=True)
+
 
 # ==========================================
 # 2. 定義 Mixin: Metric Coverage (覆蓋率指標)
@@ -99,6 +106,8 @@ class MetricQuery(Base):
 
     __table_args__ = (
         Index('ix_metric_queries_tags', tags, postgresql_using='gin'),
+        # GoldenSetWriter 以 ON CONFLICT (batch_id, keyword) Upsert
+        Index('uq_metric_queries_batch_keyword', batch_id, keyword, unique=True),
     )
 
 
@@ -121,4 +130,40 @@ class MetricURL(Base):
     # [新增] 記錄這條 URL 屬於哪個 Shard (Team)，方便除錯
     shard_id = Column(Integer, nullable=True)
     
-    query = relationship("MetricQuery", back_populates="results")
\ No newline at end of file
+    query = relationship("MetricQuery", back_populates="results")
+
+
+class DomainShard(Base):
+    """
+    Domain -> Crawler Shard 目錄 (每個 Domain 只會存在於一個 domain_stats_NNN / url_state_NNN)
+    由 DomainShardDirectory 建立與增量維護；shard_id = -1 表示探測不到 (Negative Cache，依 updated_at 過期)
+    """
+    __tablename__ = 'domain_shard'
+
+    domain = Column(String, primary_key=True)
+    shard_id = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.now)
+
+
+class MetricIR(Base):
+    """
+    搜尋品質指標 (IREvaluator)：每個 Batch / 標籤 / 日期 / 指標一列 (e.g. "ndcg@10")
+    ci_low / ci_high 為 Bootstrap 信賴區間
+    """
+    __tablename__ = 'metric_ir'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    batch_id = Column(BigInteger, ForeignKey('metric_batches.id'), index=True)
+    tag = Column(String, nullable=False)
+    stat_date = Column(Date, nullable=False)
+    metric = Column(String, nullable=False)
+
+    value = Column(Float, nullable=True)
+    ci_low = Column(Float, nullable=True)
+    ci_high = Column(Float, nullable=True)
+    queries = Column(Integer, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index('uq_metric_ir_batch_tag_date_metric', batch_id, tag, stat_date, metric, unique=True),
+    )
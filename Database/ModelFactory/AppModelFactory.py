@@ -1,6 +1,6 @@
 from Database.ModelFactory.DynamicModelFactory import DynamicModelFactory
-from Database.MetricModels import CrawlerStatMixin, MetricCoverageMixin, MetricBatch, MetricQuery, MetricURL
-from Database.CrawlerModels import UrlStateMixin, DomainStatsMixin, DomainStatsDailyMixin, SummaryDaily, UrlLink
+from Database.MetricModels import CrawlerStatMixin, MetricCoverageMixin, MetricBatch, MetricQuery, MetricURL, DomainShard, MetricIR
+from Database.CrawlerModels import UrlStateMixin, DomainStatsMixin, DomainStatsDailyMixin, SummaryDaily, UrlLink, IndexRetry, UrlStateCounter
 
 class AppModelFactory():
     def __init__(self, crawlerBase, metricBase):
@@ -42,6 +42,12 @@ class AppModelFactory():
     def create_metric_url(self):
         return MetricURL
     
+    def create_domain_shard(self):
+        return DomainShard
+
+    def create_metric_ir(self):
+        return MetricIR
+    
     def create_url_state_model(self, idx: int):
         """Dynamically create UrlState ORM class for a given shard table."""
         return self.crawlerModelFactory.get_or_create(
@@ -71,4 +77,10 @@ class AppModelFactory():
         return SummaryDaily
     
     def create_url_link_model(self):
-        return UrlLink
\ No newline at end of file
+        return UrlLink
+    
+    def create_index_retry_model(self):
+        return IndexRetry
+    
+    def create_url_state_counter_model(self):
+        return UrlStateCounter
\ No newline at end of file
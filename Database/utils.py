@@ -1,5 +1,10 @@
 from Database.ModelFactory.AppModelFactory import AppModelFactory
 from Database.Database import Database
+from sqlalchemy import inspect, text
+import io
+
+# copyRows 的 NULL 標記 (CSV 中只有未加引號時才視為 NULL)
+COPY_NULL = r'\N'
 
 def createAllMetricModel(modelFactory: AppModelFactory):
     suffixes = ['Total', 'A', 'B']
@@ -19,3 +24,60 @@ def createDB(user, password, url, name, createTable: bool=False, base=None) -> D
         db.create_tables(base)
     return db
 
+def addMissingColumns(db: Database, model) -> list:
+    """
+    create_all 不會修改已存在的表：比對 Model 與資料庫，補上缺少的欄位 (ADD COLUMN IF NOT EXISTS)
+    回傳新增的欄位名稱；Schema 變更只在 migrate_db 執行，不在一般的啟動流程中
+    """
+    table = model.__table__
+    inspector = inspect(db.engine)
+    if not inspector.has_table(table.name):
+        return []
+
+    existing = {c['name'] for c in inspector.get_columns(table.name)}
+    added = []
+    with db.engine.begin() as conn:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS {column.name} {column_type}'))
+            added.append(column.name)
+    return added
+
+def missingColumns(engine, table_name: str, columns: list) -> list:
+    """
+    回傳 table_name 缺少的欄位 (表不存在時視為全部缺少)；用於啟動時檢查是否已執行過 migrate_db
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(table_name):
+        return list(columns)
+    existing = {c['name'] for c in inspector.get_columns(table_name)}
+    return [c for c in columns if c not in existing]
+
+def _csvField(value) -> str:
+    if value is None:
+        return COPY_NULL
+    return '"' + str(value).replace('"', '""') + '"'
+
+def copyRows(session, table_name: str, columns: list, rows) -> int:
+    """
+    透過 PostgreSQL COPY (CSV) 將 rows 寫入 table_name，在 session 目前的 Transaction 內執行。
+    rows: iterable of tuple，順序對應 columns
+
+    None 寫成未加引號的 COPY_NULL，其餘欄位一律加引號：空字串 '' 保持為空字串，不會被當成 NULL
+    """
+    buffer = io.StringIO()
+    count = 0
+    for row in rows:
+        buffer.write(",".join(_csvField(v) for v in row))
+        buffer.write("\n")
+        count += 1
+    buffer.seek(0)
+
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')", buffer)
+    finally:
+        cursor.close()
+    return count
@@ -0,0 +1,194 @@
+# Filename: Chain/DiversityCap.py
+from IndexSelection.Chain.Handler import Handler
+from IndexSelection.Chain.PipelineResult import PipelineResult
+from collections import defaultdict
+import heapq
+
+class DiversityCap(Handler):
+    """
+    Stage 5: Domain 多樣性上限 (Streaming Top-K)
+
+    每個 Domain 只保留 index_priority 最高的 K 筆，整個 Shard 另有總量上限 (shard_budget)。
+    Heap 在整個 Run 之間持續存在，所以後面的 Batch 分數較高時，會把前面已放行的頁面擠出去。
+    被擠出去的 URL 會累積在 evicted，由呼叫端 (indexSelection.py) 在 commit 前回寫降級。
+    只有後面的 Stage (Ingestion) 也成功時才真正佔用名額，失敗的頁面不會擠掉有效的頁面。
+    Heap 採 lazy deletion：被擠掉的項目只從 entries 移除，留在 Heap 裡的過期項目在碰到時才丟掉。
+
+    [新增至 data._index_content 的資料]:
+    - diversity_group (str): 分組依據 (目前為 domain)，給 Ingestion 當 group_id
+    """
+
+    REJECT_DOMAIN = "Domain cap exceeded"
+    REJECT_BUDGET = "Index budget exceeded"
+    EVICT_DOMAIN = "Domain cap evicted"
+    EVICT_BUDGET = "Index budget evicted"
+
+    def __init__(self, default_cap: int = 0, domain_caps: dict = None, shard_budget: int = 0):
+        """
+        :param default_cap: 每個 Domain 預設保留筆數 (0 表示不限制)
+        :param domain_caps: 個別 Domain 的上限覆寫，例如 {"wikipedia.org": 50000}
+        :param shard_budget: 整個 Shard 最多放行的筆數 (0 表示不限制)
+        """
+        super().__init__()
+        self.name = "DiversityCap"
+        self.default_cap = default_cap
+        self.domain_caps = domain_caps or {}
+        self.shard_budget = shard_budget
+
+        # domain -> min-heap of (index_priority, url, seq)
+        self.heaps = defaultdict(list)
+        # domain -> 目前保留的筆數 (Heap 含過期項目，不能直接用 len)
+        self.counts = defaultdict(int)
+        # Shard 總量用的 min-heap of (index_priority, url, seq)
+        self.budget_heap = []
+        # 目前仍被保留的 URL -> (index_priority, domain, seq)；Heap 項目的 seq 不同即為過期
+        self.entries = {}
+        self.seq = 0
+        # (url, reason)：尚未回寫到 DB 的降級清單
+        self.evicted = []
+
+        # 只檢查、不佔名額；通過後交給下一個 Stage，成功才呼叫 _keep
+        self.processors = [
+            self._check_domain_cap,
+            self._check_shard_budget
+        ]
+
+    def canHandle(self, data):
+        return hasattr(data, 'index_priority') and hasattr(data, 'domain')
+
+    def handle(self, data) -> PipelineResult:
+        if not self.canHandle(data):
+            return super().handle(data)
+
+        data._index_content['diversity_group'] = data.domain
+
+        for processor in self.processors:
+            reason = processor(data)
+            if reason:
+                return PipelineResult(success=False, stage=self.name, reason=reason)
+
+        result = super().handle(data)
+        if not result.success:
+            return result
+
+        reason = self._keep(data.url, data.domain or "", data.index_priority or 0.0)
+        if reason:
+            return PipelineResult(success=False, stage=self.name, reason=reason)
+        return result
+
+    def seed(self, rows):
+        """
+        用 DB 中已經 indexed = 1 的資料預熱 Heap，讓沒有 --reset 的增量執行也遵守上限。
+        rows: iterable of (url, domain, index_priority)
+        超出上限的舊資料會直接進入 evicted。
+        """
+        for url, domain, priority in rows:
+            reason = self._keep(url, domain or "", priority or 0.0)
+            if reason:
+                # 預熱時被拒絕的舊資料也要降級
+                self.evicted.append((url, self.EVICT_DOMAIN if reason == self.REJECT_DOMAIN else self.EVICT_BUDGET))
+
+    def drainEvicted(self) -> list:
+        """
+        取出並清空目前累積的降級清單 [(url, reason), ...]
+        """
+        evicted, self.evicted = self.evicted, []
+        return evicted
+
+    def _cap_of(self, domain):
+        return self.domain_caps.get(domain, self.default_cap)
+
+    def _top(self, heap):
+        """
+        丟掉 Heap 頂端的過期項目，回傳最小的有效項目 (沒有則為 None)
+        """
+        while heap:
+            priority, url, seq = heap[0]
+            entry = self.entries.get(url)
+            if entry is not None and entry[2] == seq:
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    def _drop(self, url):
+        _, domain, _ = self.entries.pop(url)
+        self.counts[domain] -= 1
+
+    def _compact(self, heap, live: int) -> list:
+        """
+        過期項目太多時重建 Heap，避免記憶體隨 Run 無限成長
+        """
+        if len(heap) <= 2 * live + 64:
+            return heap
+        heap = [e for e in heap if e[1] in self.entries and self.entries[e[1]][2] == e[2]]
+        heapq.heapify(heap)
+        return heap
+
+    def _keep(self, url, domain, priority):
+        """
+        保留一筆資料 (可能擠掉其他頁面)，回傳拒絕原因 (None 表示保留成功)
+        """
+        cap = self._cap_of(domain)
+        if cap <= 0 and self.shard_budget <= 0:
+            return None # 此 Domain 不受限制，也不需要追蹤
+        if url in self.entries:
+            self._drop(url) # 同一個 URL 重跑，以新的分數為準
+
+        heap = self.heaps[domain]
+        if cap > 0 and self.counts[domain] >= cap:
+            top = self._top(heap)
+            if (priority, url) <= top[:2]:
+                return self.REJECT_DOMAIN
+            heapq.heappop(heap)
+            self._drop(top[1])
+            self.evicted.append((top[1], self.EVICT_DOMAIN))
+
+        self.seq += 1
+        heapq.heappush(heap, (priority, url, self.seq))
+        self.entries[url] = (priority, domain, self.seq)
+        self.counts[domain] += 1
+        self.heaps[domain] = self._compact(heap, self.counts[domain])
+
+        if self.shard_budget > 0:
+            heapq.heappush(self.budget_heap, (priority, url, self.seq))
+            reason = self._enforce_budget(url)
+            self.budget_heap = self._compact(self.budget_heap, len(self.entries))
+            return reason
+        return None
+
+    def _enforce_budget(self, url):
+        while len(self.entries) > self.shard_budget:
+            _, victim, _ = self._top(self.budget_heap)
+            heapq.heappop(self.budget_heap)
+            # Domain Heap 裡的項目留著，之後碰到時才當作過期丟掉 (O(log K))
+            self._drop(victim)
+
+            if victim == url:
+                return self.REJECT_BUDGET
+            self.evicted.append((victim, self.EVICT_BUDGET))
+        return None
+
+    # --- Processors ---
+
+    def _check_domain_cap(self, data):
+        """
+        已經確定會被拒絕的 (比 Domain 內最小的還低) 直接擋下，不必跑 Ingestion
+        """
+        domain = data.domain or ""
+        cap = self._cap_of(domain)
+        if cap > 0 and self.counts[domain] >= cap and data.url not in self.entries:
+            top = self._top(self.heaps[domain])
+            if (data.index_priority or 0.0, data.url) <= top[:2]:
+                return self.REJECT_DOMAIN
+        return None
+
+    def _check_shard_budget(self, data):
+        domain = data.domain or ""
+        cap = self._cap_of(domain)
+        domain_full = cap > 0 and self.counts[domain] >= cap
+        # Domain 已滿時會替換掉同 Domain 的頁面，總數不變
+        if self.shard_budget > 0 and not domain_full and len(self.entries) >= self.shard_budget and data.url not in self.entries:
+            top = self._top(self.budget_heap)
+            if top is not None and (data.index_priority or 0.0, data.url) <= top[:2]:
+                return self.REJECT_BUDGET
+        return None
@@ -1,5 +1,6 @@
 from IndexSelection.Chain.Handler import Handler
 from IndexSelection.Chain.PipelineResult import PipelineResult
+from IndexSelection.Gazetteer.Gazetteer import get_gazetteer
 import re
 import datetime
 
@@ -12,18 +13,23 @@ class ExtractionJson(Handler):
     - content (str): 清洗後的內文
     - content_length (int): 內文長度
     - published_at (str): ISO 8601 時間字串
-    - entities (list): 簡單提取的實體列表 (模擬 NER)
+    - entities (list): Gazetteer 比對出的實體列表 (有指定 gazetteer_path 才會啟用)
     - domain_consistent (bool): 檢查 domain 與 canonical 是否一致
     """
-    def __init__(self):
+    def __init__(self, gazetteer_path: str = None):
+        """
+        :param gazetteer_path: 編譯後的 Gazetteer 檔 (見 Gazetteer.ensure_compiled)
+        """
         super().__init__()
         self.name = "Extraction"
+        self.gazetteer_path = gazetteer_path
         self.processors = [
             self._remove_boilerplate,
             self._normalize_date,
-            # self._extract_entities,
             # self._check_domain_consistency
         ]
+        if self.gazetteer_path:
+            self.processors.append(self._extract_entities)
 
     def canHandle(self, data):
         # 假設 raw content 裡有 type 欄位，或者預設都能處理
@@ -65,14 +71,11 @@ class ExtractionJson(Handler):
             data._index_content['published_at'] = datetime.datetime.now().isoformat()
 
     def _extract_entities(self, data):
+        # Aho-Corasick 多模式比對，每個 Process 只 mmap 一次
+        gazetteer = get_gazetteer(self.gazetteer_path)
+        title = data._index_content.get('title', '')
         content = data._index_content.get('content', '')
-        entities = []
-        # 模擬 NER
-        target_entities = ['Tesla', 'BMW', 'Apple', 'iPhone', 'Microsoft']
-        for ent in target_entities:
-            if ent in content:
-                entities.append(ent)
-        data._index_content['entities'] = list(set(entities))
+        data._index_content['entities'] = gazetteer.find(f"{title}\n{content}")
 
     def _check_domain_consistency(self, data):
         # 檢查 data.domain 與 meta 中的 canonical 是否衝突
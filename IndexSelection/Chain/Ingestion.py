@@ -38,8 +38,8 @@ class Ingestion(Handler):
             'published_at': ic.get('published_at'), # 這裡應該要是 int64 timestamp 比較好，暫用字串
             'popularity_score': data.index_priority, # 來自 Stage 4
             'inlink_count': data.inlink_count,
-            # 'entities': ic.get('entities', []),
-            # 'group_id': ic.get('diversity_group') # 來自 Stage 5
+            'entities': ic.get('entities'), # 來自 Stage 1 Gazetteer (用於 Faceting)
+            'group_id': ic.get('diversity_group') # 來自 Stage 5
         }
         
         # 移除 None 的欄位，Typesense 不喜歡 None
@@ -12,10 +12,13 @@ class Scoring(Handler):
     
     [更新 data (UrlStateMixin) 的欄位]:
     - index_priority: 最終計算出的分數
+
+    use_page_rank=True 時，連結分數改用 PageRankJob 寫入的 page_rank (沒有分數的頁面退回 inlink_count)
     """
-    def __init__(self):
+    def __init__(self, use_page_rank: bool = False):
         super().__init__()
         self.name = "Scoring"
+        self.use_page_rank = use_page_rank
         self.processors = [
             self._calculate_hybrid_score
         ]
@@ -38,10 +41,14 @@ class Scoring(Handler):
         inlinks = data.inlink_count if data.inlink_count else 0
         domain_score = data.domain_score if data.domain_score else 0.0
         content_len = data._index_content.get('content_length', 0)
+        page_rank = getattr(data, 'page_rank', None) if self.use_page_rank else None
         
         # 2. 歸一化與計算
-        # Inlinks 取 Log (避免大站獨大)
-        link_score = math.log(1 + inlinks)
+        # Inlinks / PageRank 取 Log (避免大站獨大)
+        if page_rank:
+            link_score = math.log(1 + page_rank)
+        else:
+            link_score = math.log(1 + inlinks)
         
         # Content Quality (簡單模擬: 長度越長分數越高，上限 1.0)
         quality_score = min(content_len / 3000.0, 1.0)
@@ -59,6 +66,7 @@ class Scoring(Handler):
         # 4. 紀錄詳細資訊供 Debug
         data._index_content['score_breakdown'] = {
             'link_score_raw': link_score,
+            'link_source': 'page_rank' if page_rank else 'inlink_count',
             'quality_score_raw': quality_score,
             'domain_score_raw': domain_score,
             'final': data.index_priority
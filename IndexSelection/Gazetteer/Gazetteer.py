@@ -0,0 +1,206 @@
+from bisect import bisect_left
+from collections import deque
+import mmap
+import os
+import struct
+
+MAGIC = b'GAZ2' # GAZ2: 改用 casefold 正規化
+HEADER = struct.Struct('<4sqqqq') # magic, n_states, n_edges, n_names, name_bytes
+
+# 每個 Process 只載入一次 (key: compiled path)
+_loaded = {}
+
+def compile_gazetteer(names_path: str, out_path: str):
+    """
+    將 Gazetteer 文字檔編譯成 Aho-Corasick 自動機並序列化成單一檔案。
+
+    names_path 每行一個名稱，可用 Tab 指定標準名稱 (別名對應):
+        Tesla
+        臺積電\tTSMC
+    比對一律使用小寫 (casefold)，輸出為標準名稱。
+
+    檔案格式 (little-endian int32 陣列，依序排列，可直接 mmap):
+        edge_offsets[n_states + 1], edge_chars[n_edges], edge_targets[n_edges],
+        fail[n_states], output[n_states], dict_link[n_states],
+        name_lengths[n_names], name_offsets[n_names + 1], name_bytes (UTF-8)
+    """
+    # 1. Trie (state 0 為 root)
+    children = [{}]
+    output = [-1]
+    names = []
+    name_lengths = []
+
+    with open(names_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line.strip():
+                continue
+            alias, _, canonical = line.partition('\t')
+            key = alias.strip().casefold()
+            if not key:
+                continue
+
+            state = 0
+            for ch in key:
+                nxt = children[state].get(ch)
+                if nxt is None:
+                    nxt = len(children)
+                    children[state][ch] = nxt
+                    children.append({})
+                    output.append(-1)
+                state = nxt
+
+            if output[state] == -1: # 重複的別名以第一筆為準
+                output[state] = len(names)
+                names.append((canonical or alias).strip())
+                name_lengths.append(len(key))
+
+    # 2. BFS 建立 fail link 與 dict link (沿 fail 鏈最近的輸出節點)
+    n_states = len(children)
+    fail = [0] * n_states
+    dict_link = [-1] * n_states
+    queue = deque(children[0].values())
+    while queue:
+        state = queue.popleft()
+        for ch, nxt in children[state].items():
+            f = fail[state]
+            while f and ch not in children[f]:
+                f = fail[f]
+            target = children[f].get(ch, 0)
+            fail[nxt] = target if target != nxt else 0
+            dict_link[nxt] = fail[nxt] if output[fail[nxt]] >= 0 else dict_link[fail[nxt]]
+            queue.append(nxt)
+
+    # 3. 展平成 CSR 形式 (每個 state 的邊依字元碼排序，查詢時二分搜尋)
+    edge_offsets = [0]
+    edge_chars = []
+    edge_targets = []
+    for state in range(n_states):
+        for ch, nxt in sorted(children[state].items(), key=lambda kv: ord(kv[0])):
+            edge_chars.append(ord(ch))
+            edge_targets.append(nxt)
+        edge_offsets.append(len(edge_chars))
+
+    encoded = [n.encode('utf-8') for n in names]
+    name_offsets = [0]
+    for b in encoded:
+        name_offsets.append(name_offsets[-1] + len(b))
+    name_bytes = b''.join(encoded)
+
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, n_states, len(edge_chars), len(names), len(name_bytes)))
+        for arr in (edge_offsets, edge_chars, edge_targets, fail, output, dict_link, name_lengths, name_offsets):
+            f.write(struct.pack(f'<{len(arr)}i', *arr))
+        f.write(name_bytes)
+    os.replace(tmp_path, out_path)
+
+    return len(names), n_states
+
+def _read_magic(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read(4)
+
+def ensure_compiled(names_path: str, out_path: str = None) -> str:
+    """
+    若編譯檔不存在或比原始檔舊就重新編譯，回傳編譯檔路徑。
+    請在建立 ProcessPoolExecutor 之前於主 Process 呼叫一次。
+    """
+    out_path = out_path or names_path + '.ac'
+    if not os.path.exists(out_path) or os.path.getmtime(out_path) < os.path.getmtime(names_path) \
+            or _read_magic(out_path) != MAGIC:
+        count, states = compile_gazetteer(names_path, out_path)
+        print(f"Gazetteer compiled: {count:,} names, {states:,} states -> {out_path}")
+    return out_path
+
+def get_gazetteer(compiled_path: str):
+    """
+    取得此 Process 的 Gazetteer (第一次呼叫時 mmap，之後重用)
+    """
+    gazetteer = _loaded.get(compiled_path)
+    if gazetteer is None:
+        gazetteer = Gazetteer(compiled_path)
+        _loaded[compiled_path] = gazetteer
+    return gazetteer
+
+
+class Gazetteer:
+    """
+    mmap 唯讀載入的 Aho-Corasick 自動機。
+    多個 Worker Process 開同一個檔案時共用 OS Page Cache，不會各自複製一份。
+    """
+    def __init__(self, compiled_path: str):
+        self._file = open(compiled_path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, n_states, n_edges, n_names, name_bytes = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a compiled gazetteer: {compiled_path}")
+
+        offset = HEADER.size
+        view = memoryview(self._mm)
+
+        def take(count):
+            nonlocal offset
+            arr = view[offset:offset + 4 * count].cast('i')
+            offset += 4 * count
+            return arr
+
+        self.edge_offsets = take(n_states + 1)
+        self.edge_chars = take(n_edges)
+        self.edge_targets = take(n_edges)
+        self.fail = take(n_states)
+        self.output = take(n_states)
+        self.dict_link = take(n_states)
+        self.name_lengths = take(n_names)
+        self.name_offsets = take(n_names + 1)
+        self.name_bytes = view[offset:offset + name_bytes]
+
+    def _goto(self, state, c):
+        lo, hi = self.edge_offsets[state], self.edge_offsets[state + 1]
+        i = bisect_left(self.edge_chars, c, lo, hi)
+        if i < hi and self.edge_chars[i] == c:
+            return self.edge_targets[i]
+        return -1
+
+    def name(self, name_id) -> str:
+        return bytes(self.name_bytes[self.name_offsets[name_id]:self.name_offsets[name_id + 1]]).decode('utf-8')
+
+    @staticmethod
+    def _is_word_char(ch):
+        # 只對 ASCII 英數判斷邊界 (中日文沒有空白斷詞)
+        return ch.isascii() and (ch.isalnum() or ch == '_')
+
+    def find(self, text: str) -> list:
+        """
+        回傳 text 中出現的標準名稱 (去重，依首次出現順序)
+        時間複雜度與 text 長度成線性 (加上命中數)
+        """
+        text = text.casefold()
+        n = len(text)
+        found = {}
+        state = 0
+
+        for i, ch in enumerate(text):
+            c = ord(ch)
+            while True:
+                nxt = self._goto(state, c)
+                if nxt >= 0:
+                    state = nxt
+                    break
+                if state == 0:
+                    break
+                state = self.fail[state]
+
+            out = state if self.output[state] >= 0 else self.dict_link[state]
+            while out > 0:
+                name_id = self.output[out]
+                start = i - self.name_lengths[name_id] + 1
+                left_ok = start == 0 or not (self._is_word_char(text[start - 1]) and self._is_word_char(text[start]))
+                right_ok = i + 1 == n or not (self._is_word_char(text[i + 1]) and self._is_word_char(ch))
+                if left_ok and right_ok and name_id not in found:
+                    found[name_id] = None
+                out = self.dict_link[out]
+
+        # 不同別名可能對應同一個標準名稱；dict 保留插入順序
+        return list(dict.fromkeys(self.name(name_id) for name_id in found))
@@ -0,0 +1,207 @@
+from Database.Database import Database
+from Database.ModelFactory.AppModelFactory import AppModelFactory
+from sqlalchemy import select, func, text, or_, bindparam, Float, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import json
+import os
+
+class DomainScoreJob:
+    """
+    domain_stats_NNN (+ url_state_NNN inlink 加總) -> domain_score
+
+    1. read:    平行讀取每個 Shard「上次執行後有變動」的 Domain 統計
+                (url_state 有新 URL 或新的抓取結果，以 first_seen / last_fetched 與各 Shard 的 watermark 比較)
+    2. score:   所有 Shard 串成一個 NumPy 陣列，一次算完
+    3. write:   set-based UPDATE 回寫 domain_stats_NNN 與 url_state_NNN (IS DISTINCT FROM 跳過沒變的列)
+
+    watermark 存在 state_path，只有成功寫回的 Shard 才會前進；第一次執行或 full=True 時讀取全部 Domain。
+    只影響 inlink 加總 (url_link) 的變動不會更新 watermark 範圍內的列，需定期以 full 重算。
+    """
+
+    # 權重 (總和為 1，分數落在 0.0 - 1.0)
+    W_RELIABILITY = 0.30
+    W_FAIL = 0.20
+    W_FRESHNESS = 0.10
+    W_SIZE = 0.15
+    W_AUTHORITY = 0.25
+
+    # log 正規化上限：超過視為滿分
+    SIZE_CAP = 1_000_000
+    INLINK_CAP = 10_000_000
+
+    def __init__(self, db: Database, modelFactory: AppModelFactory, table_range: int = 256,
+                 workers: int = 16, full: bool = False, state_path: str = 'result/domain_score_state.json',
+                 overlap: timedelta = timedelta(minutes=10)):
+        """
+        :param full: True 時忽略 watermark，全部重算 (例如調整權重之後)
+        :param state_path: 各 Shard watermark 的存檔位置
+        :param overlap: watermark 往前保留的時間，涵蓋執行期間還沒 commit 的寫入
+        """
+        self.db = db
+        self.modelFactory = modelFactory
+        self.table_range = table_range
+        self.workers = workers
+        self.full = full
+        self.state_path = state_path
+        self.overlap = overlap
+
+    def _load_watermarks(self) -> dict:
+        if self.full or not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, 'r', encoding='utf-8') as f:
+            return {int(k): datetime.fromisoformat(v) for k, v in json.load(f).get('watermarks', {}).items()}
+
+    def _save_watermarks(self, watermarks: dict):
+        if os.path.dirname(self.state_path):
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'watermarks': {str(k): v.isoformat() for k, v in sorted(watermarks.items())}}, f, indent=4)
+        os.replace(tmp_path, self.state_path)
+
+    def run(self):
+        started = datetime.now(timezone.utc)
+        watermarks = self._load_watermarks()
+        mode = "full" if not watermarks else "incremental"
+        print(f"📥 [1/3] Reading domain_stats ({mode}, {self.workers} threads)...")
+        shards = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._read_shard, i, watermarks.get(i)) for i in range(self.table_range)]
+            for future in as_completed(futures):
+                shard_id, columns = future.result()
+                shards[shard_id] = columns
+
+        print("🧮 [2/3] Computing scores...")
+        shard_ids = sorted(shards)
+        sizes = [len(shards[i]['domain']) for i in shard_ids]
+        stacked = {
+            key: np.concatenate([shards[i][key] for i in shard_ids]) if shard_ids else np.empty(0)
+            for key in ('fetch_ok', 'fetch_fail', 'failed_rate', 'update_rate', 'url_count', 'inlinks')
+        }
+        scores = self.compute_scores(stacked)
+        print(f"   Domains: {len(scores):,}")
+
+        print(f"💾 [3/3] Writing domains ({self.workers} threads)...")
+        offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        total_urls = 0
+        watermark = started - self.overlap
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {}
+            for k, shard_id in enumerate(shard_ids):
+                sl = slice(offsets[k], offsets[k + 1])
+                if sizes[k] == 0:
+                    watermarks[shard_id] = watermark
+                    continue
+                futures[executor.submit(self._write_shard, shard_id, shards[shard_id]['domain'], scores[sl].tolist())] = shard_id
+
+            for future in as_completed(futures):
+                shard_id = futures[future]
+                try:
+                    total_urls += future.result()
+                    watermarks[shard_id] = watermark
+                except Exception as e:
+                    print(f"   [Warning] Shard {shard_id:03} write failed (will be retried next run): {e}")
+
+        self._save_watermarks(watermarks)
+        print(f"✅ Scored {len(scores):,} domains, updated {total_urls:,} url_state rows.")
+
+    @classmethod
+    def compute_scores(cls, c: dict) -> np.ndarray:
+        """
+        c: dict of equal-length NumPy arrays
+           fetch_ok, fetch_fail, failed_rate, update_rate, url_count, inlinks
+        """
+        ok = c['fetch_ok'].astype(np.float64)
+        fail = c['fetch_fail'].astype(np.float64)
+
+        # Laplace smoothing：沒抓過的 Domain 為 0.5，不會因樣本少而暴衝
+        reliability = (ok + 1.0) / (ok + fail + 2.0)
+        fail_penalty = 1.0 - np.clip(c['failed_rate'], 0.0, 1.0)
+        freshness = np.clip(c['update_rate'], 0.0, 1.0)
+        size = np.clip(np.log1p(np.maximum(c['url_count'], 0)) / np.log1p(cls.SIZE_CAP), 0.0, 1.0)
+        authority = np.clip(np.log1p(np.maximum(c['inlinks'], 0)) / np.log1p(cls.INLINK_CAP), 0.0, 1.0)
+
+        score = cls.W_RELIABILITY * reliability \
+            + cls.W_FAIL * fail_penalty \
+            + cls.W_FRESHNESS * freshness \
+            + cls.W_SIZE * size \
+            + cls.W_AUTHORITY * authority
+        return np.round(score, 6)
+
+    def _read_shard(self, shard_id, since: datetime = None):
+        """
+        since 為 None 時讀取全部 Domain；否則只讀 url_state 在 since 之後有新 URL 或新抓取的 Domain
+        """
+        DomainStats = self.modelFactory.create_domain_stats_model(shard_id)
+        UrlState = self.modelFactory.create_url_state_model(shard_id)
+
+        inlinks = select(
+            UrlState.domain.label('domain'),
+            func.sum(UrlState.inlink_count).label('inlinks')
+        )
+
+        stmt = select(
+            DomainStats.domain,
+            func.coalesce(DomainStats.fetch_ok, 0),
+            func.coalesce(DomainStats.fetch_fail, 0),
+            func.coalesce(DomainStats.failed_rate, 0.0),
+            func.coalesce(DomainStats.update_rate, 0.0),
+            func.coalesce(DomainStats.url_count, 0)
+        )
+
+        if since is not None:
+            touched = select(UrlState.domain)\
+                .where(or_(UrlState.first_seen > since, UrlState.last_fetched > since))\
+                .distinct()
+            inlinks = inlinks.where(UrlState.domain.in_(touched))
+            stmt = stmt.where(DomainStats.domain.in_(touched))
+
+        inlinks = inlinks.group_by(UrlState.domain).subquery()
+        stmt = stmt.add_columns(func.coalesce(inlinks.c.inlinks, 0))\
+            .outerjoin(inlinks, inlinks.c.domain == DomainStats.domain)
+
+        with self.db.session() as session:
+            rows = session.execute(stmt).all()
+
+        columns = list(zip(*rows)) if rows else [()] * 7
+        return shard_id, {
+            'domain': list(columns[0]),
+            'fetch_ok': np.array(columns[1], dtype=np.int64),
+            'fetch_fail': np.array(columns[2], dtype=np.int64),
+            'failed_rate': np.array(columns[3], dtype=np.float64),
+            'update_rate': np.array(columns[4], dtype=np.float64),
+            'url_count': np.array(columns[5], dtype=np.int64),
+            'inlinks': np.array(columns[6], dtype=np.int64),
+        }
+
+    def _write_shard(self, shard_id, domains, scores) -> int:
+        params = {'domains': domains, 'scores': scores}
+        types = (
+            bindparam('domains', type_=ARRAY(String)),
+            bindparam('scores', type_=ARRAY(Float))
+        )
+
+        sql_domain = text(f"""
+            UPDATE domain_stats_{shard_id:03} AS d
+            SET domain_score = v.score
+            FROM unnest(:domains, :scores) AS v(domain, score)
+            WHERE d.domain = v.domain
+              AND d.domain_score IS DISTINCT FROM v.score
+        """).bindparams(*types)
+
+        sql_url = text(f"""
+            UPDATE url_state_{shard_id:03} AS u
+            SET domain_score = v.score
+            FROM unnest(:domains, :scores) AS v(domain, score)
+            WHERE u.domain = v.domain
+              AND u.domain_score IS DISTINCT FROM v.score
+        """).bindparams(*types)
+
+        with self.db.session() as session:
+            session.execute(sql_domain, params)
+            result = session.execute(sql_url, params)
+            session.commit()
+            return result.rowcount
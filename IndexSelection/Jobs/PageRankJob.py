@@ -0,0 +1,319 @@
+from Database.Database import Database
+from Database.ModelFactory.AppModelFactory import AppModelFactory
+from Database.CrawlerModels import Base as CrawlerBase
+from IndexSelection.Jobs.utils import hash_strings, lookup_sorted, merge_unique_runs
+from sqlalchemy import select, text, bindparam, Float, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import glob
+import json
+import os
+import time
+
+class PageRankJob:
+    """
+    url_link -> PageRank -> url_state_NNN.page_rank
+
+    流程 (每一步都會寫 checkpoint 到 work_dir，中斷後可從該步驟繼續):
+    1. edges:  以 server-side cursor 分批讀取 url_link，URL 轉成 64-bit Hash 後寫成 edges_NNNNN.npz
+    2. graph:  Hash -> 連續整數 ID，依 dst 排序去重 (External Merge)，建出 CSR (indptr / indices = src) 與 outdeg
+    3. rank:   Power Iteration，indices 以 memmap 分段讀取，每一輪結束都存 rank.npy
+    4. write:  每張 url_state_NNN 以 Hash 對應 ID，用 unnest 陣列做 set-based UPDATE
+
+    寫回的分數為 pr * N (平均值為 1)，Scoring 會取 log(1 + page_rank) 作為連結分數。
+    上一次已完整跑完 (stage = 'done') 時清掉 checkpoint 重新計算，排程重跑才會更新分數。
+    """
+    CHECKPOINT_PATTERNS = ('state.json', '*.npy', '*.npz', '*.bin')
+    def __init__(self, db_url: str, work_dir: str, chunk_size: int = 1_000_000,
+                 damping: float = 0.85, tol: float = 1e-6, max_iter: int = 50,
+                 table_range: int = 256, workers: int = 4):
+        self.db_url = db_url
+        self.work_dir = work_dir
+        self.chunk_size = chunk_size
+        self.damping = damping
+        self.tol = tol
+        self.max_iter = max_iter
+        self.table_range = table_range
+        self.workers = workers
+
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.state_path = os.path.join(self.work_dir, 'state.json')
+        self.state = self._load_state()
+
+    def run(self):
+        if self.state.get('stage') == 'done':
+            print(f"   Previous run in {self.work_dir} is complete, clearing checkpoints for a fresh run...")
+            self._clear_checkpoints()
+        if self.state.get('stage') is None:
+            self._dump_edges()
+        if self.state.get('stage') == 'edges':
+            self._build_graph()
+        if self.state.get('stage') == 'graph':
+            self._iterate()
+        if self.state.get('stage') == 'rank':
+            self._write_back()
+
+    # =================================================
+    # Checkpoint
+    # =================================================
+    def _load_state(self) -> dict:
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_state(self, **kwargs):
+        self.state.update(kwargs)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=4)
+        os.replace(tmp_path, self.state_path)
+
+    def _clear_checkpoints(self):
+        for pattern in self.CHECKPOINT_PATTERNS:
+            for path in glob.glob(self._path(pattern)):
+                os.remove(path)
+        self.state = {}
+
+    def _path(self, name):
+        return os.path.join(self.work_dir, name)
+
+    def _save_array(self, name, arr):
+        # 先寫暫存檔再 rename，避免中斷時留下壞掉的 checkpoint
+        tmp_path = self._path(name + '.tmp.npy')
+        np.save(tmp_path, arr)
+        os.replace(tmp_path, self._path(name + '.npy'))
+
+    # =================================================
+    # 1. Streaming url_link
+    # =================================================
+    def _dump_edges(self):
+        print(f"📥 [1/4] Streaming url_link (chunk: {self.chunk_size:,})...")
+        modelFactory = AppModelFactory(CrawlerBase, None)
+        UrlLink = modelFactory.create_url_link_model()
+        db = Database(self.db_url)
+
+        # 已寫好的 chunk 檔 (上次中斷) 直接略過
+        done_chunks = int(self.state.get('edge_chunks', 0))
+        total_edges = int(self.state.get('edge_count', 0))
+
+        with db.session() as session:
+            stmt = select(UrlLink.src_url, UrlLink.dst_url)\
+                .order_by(UrlLink.src_url, UrlLink.dst_url)\
+                .execution_options(yield_per=self.chunk_size)
+            result = session.execute(stmt)
+
+            for n, partition in enumerate(result.partitions()):
+                if n < done_chunks:
+                    continue
+
+                src_h = hash_strings(row[0] for row in partition)
+                dst_h = hash_strings(row[1] for row in partition)
+                keep = src_h != dst_h # 去掉 self-loop
+
+                np.savez(self._path(f'edges_{n:05}.npz'), src=src_h[keep], dst=dst_h[keep])
+                total_edges += int(keep.sum())
+                self._save_state(edge_chunks=n + 1, edge_count=total_edges)
+                print(f"   chunk {n:05}: {total_edges:,} edges")
+
+        self._save_state(stage='edges')
+
+    # =================================================
+    # 2. Compact integer-ID CSR
+    # =================================================
+    def _edge_files(self):
+        return sorted(glob.glob(self._path('edges_*.npz')))
+
+    def _build_graph(self):
+        """
+        節點與邊都用 External Merge 建立：每個 edge chunk 各自排序去重寫成 run 檔，再 k-way merge 成 memmap，
+        記憶體只和 chunk 大小與節點數 (indptr / outdeg) 有關，不隨邊數成長
+        """
+        print("🔧 [2/4] Building CSR graph...")
+        files = self._edge_files()
+
+        # A. 所有節點 Hash (排序後的位置即為整數 ID)
+        node_runs = []
+        for n, path in enumerate(files):
+            with np.load(path) as chunk:
+                run = np.unique(np.concatenate([chunk['src'], chunk['dst']]))
+            node_runs.append(self._path(f'nodes_run_{n:05}.npy'))
+            np.save(node_runs[-1], run)
+        n = merge_unique_runs(node_runs, self._path('nodes.npy'), np.uint64, self.chunk_size)
+        self._remove(node_runs)
+        if n >= 2 ** 31:
+            raise ValueError(f"Too many nodes for int32 ids: {n}")
+        nodes = np.load(self._path('nodes.npy'), mmap_mode='r')
+
+        # B. (dst, src) 打包成 int64，每個 chunk 排序去重後 merge (同一組連結可能有多個 anchor)
+        key_runs = []
+        for k, path in enumerate(files):
+            with np.load(path) as chunk:
+                src = np.searchsorted(nodes, chunk['src']).astype(np.int64)
+                dst = np.searchsorted(nodes, chunk['dst']).astype(np.int64)
+            key_runs.append(self._path(f'keys_run_{k:05}.npy'))
+            np.save(key_runs[-1], np.unique((dst << 32) | src))
+        m = merge_unique_runs(key_runs, self._path('edge_keys.npy'), np.int64, self.chunk_size)
+        self._remove(key_runs)
+        keys = np.load(self._path('edge_keys.npy'), mmap_mode='r')
+
+        # C. 分段寫出 indices (src id)，同時累計每個 dst 的 inlink 數與每個 src 的 outdeg
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        outdeg = np.zeros(n, dtype=np.int32)
+        tmp_indices = self._path('indices.tmp.npy')
+        if m == 0:
+            np.save(tmp_indices, np.empty(0, dtype=np.int32))
+        else:
+            indices = np.lib.format.open_memmap(tmp_indices, mode='w+', dtype=np.int32, shape=(m,))
+            for start in range(0, m, self.chunk_size):
+                block = np.asarray(keys[start:start + self.chunk_size])
+                src = (block & 0xFFFFFFFF).astype(np.int32)
+                dst = (block >> 32).astype(np.int64)
+                indices[start:start + len(block)] = src
+                # keys 依 dst 排序，同一個 block 的 dst 是連續區間
+                lo = int(dst[0])
+                indptr[lo + 1:int(dst[-1]) + 2] += np.bincount(dst - lo)
+                np.add.at(outdeg, src, 1)
+            indices.flush()
+            del indices
+        os.replace(tmp_indices, self._path('indices.npy'))
+        np.cumsum(indptr, out=indptr)
+        del keys
+        os.remove(self._path('edge_keys.npy'))
+
+        self._save_array('indptr', indptr)
+        self._save_array('outdeg', outdeg)
+        self._save_state(stage='graph', node_count=n, unique_edge_count=m, iteration=0)
+        print(f"   Nodes: {n:,}, Unique edges: {m:,}")
+
+    def _remove(self, paths):
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    # =================================================
+    # 3. Power Iteration
+    # =================================================
+    def _iterate(self):
+        print("🔁 [3/4] Power iteration...")
+        indptr = np.load(self._path('indptr.npy'))
+        indices = np.load(self._path('indices.npy'), mmap_mode='r')
+        outdeg = np.load(self._path('outdeg.npy'))
+        n = len(outdeg)
+        if n == 0:
+            self._save_array('rank', np.empty(0))
+            self._save_state(stage='rank')
+            return
+
+        iteration = int(self.state.get('iteration', 0))
+        if iteration > 0 and os.path.exists(self._path('rank.npy')):
+            rank = np.load(self._path('rank.npy'))
+            print(f"   Resume from iteration {iteration}")
+        else:
+            rank = np.full(n, 1.0 / n)
+
+        dangling = outdeg == 0
+        inv_outdeg = np.zeros(n)
+        inv_outdeg[~dangling] = 1.0 / outdeg[~dangling]
+
+        # 依邊數切 Row Block，讓每次只從 memmap 讀 chunk_size 條邊
+        num_edges = int(indptr[-1])
+        bounds = np.unique(np.concatenate([
+            [0],
+            np.searchsorted(indptr, np.arange(0, num_edges, self.chunk_size), side='right') - 1,
+            [n]
+        ]))
+
+        while iteration < self.max_iter:
+            start = time.time()
+            contrib = rank * inv_outdeg
+            new_rank = np.empty(n)
+
+            for r0, r1 in zip(bounds[:-1], bounds[1:]):
+                e0, e1 = indptr[r0], indptr[r1]
+                # 以 prefix sum 求每個 row 的加總 (可處理沒有 inlink 的空 row)
+                csum = np.zeros(e1 - e0 + 1)
+                np.cumsum(contrib[indices[e0:e1]], out=csum[1:])
+                new_rank[r0:r1] = csum[indptr[r0 + 1:r1 + 1] - e0] - csum[indptr[r0:r1] - e0]
+
+            dangling_mass = rank[dangling].sum()
+            new_rank = self.damping * (new_rank + dangling_mass / n) + (1.0 - self.damping) / n
+
+            delta = float(np.abs(new_rank - rank).sum())
+            rank = new_rank
+            iteration += 1
+
+            self._save_array('rank', rank)
+            self._save_state(iteration=iteration, delta=delta)
+            print(f"   iter {iteration:>3}: delta={delta:.3e} ({time.time() - start:.1f}s)")
+
+            if delta < self.tol:
+                break
+
+        self._save_state(stage='rank')
+
+    # =================================================
+    # 4. Write back per shard
+    # =================================================
+    def _write_back(self):
+        print(f"💾 [4/4] Writing page_rank to {self.table_range} tables ({self.workers} workers)...")
+        done = set(self.state.get('written_tables', []))
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(write_back_table, i, self.db_url, self.work_dir, self.chunk_size): i
+                for i in range(self.table_range) if i not in done
+            }
+            for future in as_completed(futures):
+                table_index = futures[future]
+                try:
+                    updated = future.result()
+                    done.add(table_index)
+                    self._save_state(written_tables=sorted(done))
+                    print(f"   url_state_{table_index:03}: {updated:,} rows")
+                except Exception as e:
+                    print(f"   url_state_{table_index:03} failed: {e}")
+
+        if len(done) >= self.table_range:
+            self._save_state(stage='done')
+
+
+def write_back_table(table_index: int, db_url: str, work_dir: str, chunk_size: int) -> int:
+    """
+    Worker Function: 將 PageRank 寫回單一 url_state_NNN
+    """
+    nodes = np.load(os.path.join(work_dir, 'nodes.npy'), mmap_mode='r')
+    rank = np.load(os.path.join(work_dir, 'rank.npy'), mmap_mode='r')
+    scale = len(rank)
+    if scale == 0:
+        # 沒有任何連結 (空圖)，沒有分數可寫
+        return 0
+
+    db = Database(db_url)
+    table_name = f'url_state_{table_index:03}'
+    UrlState = AppModelFactory(CrawlerBase, None).create_url_state_model(table_index)
+
+    sql_update = text(f"""
+        UPDATE {table_name} AS u
+        SET page_rank = v.score
+        FROM unnest(:urls, :scores) AS v(url, score)
+        WHERE u.url = v.url
+    """).bindparams(
+        bindparam('urls', type_=ARRAY(String)),
+        bindparam('scores', type_=ARRAY(Float))
+    )
+
+    updated = 0
+    with db.session() as read_session, db.session() as write_session:
+        stmt = select(UrlState.url).execution_options(yield_per=chunk_size)
+        for partition in read_session.execute(stmt).partitions():
+            urls = [row[0] for row in partition]
+            pos, found = lookup_sorted(hash_strings(urls), nodes)
+            scores = np.where(found, rank[pos] * scale, 0.0)
+
+            write_session.execute(sql_update, {'urls': urls, 'scores': scores.tolist()})
+            write_session.commit()
+            updated += len(urls)
+
+    return updated
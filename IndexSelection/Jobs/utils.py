@@ -0,0 +1,72 @@
+import hashlib
+import os
+import numpy as np
+
+def hash_strings(values) -> np.ndarray:
+    """
+    將字串 (URL / Domain) 轉成 64-bit 整數 Hash，方便用 NumPy 排序、searchsorted 與存檔。
+    以 Hash 取代字串 ID 表，數億筆資料時記憶體只需 8 bytes/筆。
+    """
+    values = list(values)
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(v.encode('utf-8'), digest_size=8).digest(), 'little') for v in values),
+        dtype=np.uint64,
+        count=len(values)
+    )
+
+def lookup_sorted(keys: np.ndarray, sorted_keys: np.ndarray):
+    """
+    在已排序的 sorted_keys 中查詢 keys 的位置
+    回傳 (positions, found_mask)，未找到的位置不可使用
+    """
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=np.int64), np.zeros(len(keys), dtype=bool)
+    pos = np.searchsorted(sorted_keys, keys)
+    pos = np.minimum(pos, len(sorted_keys) - 1)
+    return pos, sorted_keys[pos] == keys
+
+def merge_unique_runs(run_paths: list, out_path: str, dtype, block_size: int = 1 << 20) -> int:
+    """
+    External k-way merge：將多個已排序 (且各自去重) 的 .npy run 合併去重，寫成 out_path (.npy)
+    每個 run 以 memmap 分段讀取，同時只需要 k 個 block 在記憶體，不必把全部資料 concatenate。
+    回傳合併後的筆數
+    """
+    runs = [np.load(p, mmap_mode='r') for p in run_paths]
+    runs = [r for r in runs if len(r) > 0]
+    block = max(block_size // max(len(runs), 1), 4096)
+    pos = [0] * len(runs)
+
+    raw_path = out_path + '.merge.bin'
+    count = 0
+    with open(raw_path, 'wb') as f:
+        while True:
+            active = [i for i in range(len(runs)) if pos[i] < len(runs[i])]
+            if not active:
+                break
+            blocks = {i: runs[i][pos[i]:pos[i] + block] for i in active}
+            # 所有 <= bound 的值一定都在目前的 block 內 (每個 run 已排序)；至少有一個 run 的 block 會被取完
+            bound = min(b[-1] for b in blocks.values())
+            parts = []
+            for i, b in blocks.items():
+                k = int(np.searchsorted(b, bound, side='right'))
+                parts.append(np.asarray(b[:k]))
+                pos[i] += k
+            merged = np.unique(np.concatenate(parts)).astype(dtype, copy=False)
+            merged.tofile(f)
+            count += len(merged)
+    del runs
+
+    # raw -> .npy (分段複製，不整份載入)
+    tmp_path = out_path + '.tmp.npy'
+    if count == 0:
+        np.save(tmp_path, np.empty(0, dtype=dtype))
+    else:
+        raw = np.memmap(raw_path, dtype=dtype, mode='r', shape=(count,))
+        out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=(count,))
+        for start in range(0, count, block_size):
+            out[start:start + block_size] = raw[start:start + block_size]
+        out.flush()
+        del out, raw
+    os.replace(tmp_path, out_path)
+    os.remove(raw_path)
+    return count
@@ -0,0 +1,55 @@
+from sqlalchemy import or_
+
+class FailureClassifier:
+    """
+    將 PipelineResult.reason 分成三類：
+    - 永久 (Permanent): 由內容本身決定，重跑結果不會變 (e.g. "Content too short", "Soft 404", "Ingest Error")
+    - 暫時 (Transient): 讀檔失敗、程式例外等，稍後重試可能成功 (e.g. "read content error")
+    - 政策 (Policy):    DiversityCap 的上限 / 預算拒絕或擠出，內容沒有問題，上限調整後 --reset 會重新考慮
+
+    indexed 欄位對應：
+    -  1: 已進 Index
+    - -1: 永久失敗 (不再重試，--reset 也不會重跑)
+    - -2: 暫時失敗，排在 index_retry 等待重試
+    - -3: 被 DiversityCap 拒絕或擠出 (--reset 會重跑)
+    """
+
+    # 以 prefix 比對 (Handler 的例外訊息格式為 "Error: ...")
+    TRANSIENT_PREFIXES = (
+        "read content error",   # ContentRead
+        "Error: ",              # ExtractionJson / QualityFilter / Scoring 的未預期例外
+        "Unhandled error",      # indexSelection.py 最外層的例外
+    )
+
+    INDEXED_OK = 1
+    INDEXED_PERMANENT = -1
+    INDEXED_TRANSIENT = -2
+    INDEXED_POLICY = -3
+
+    # DiversityCap 的 REJECT_* / EVICT_*
+    POLICY_PREFIXES = (
+        "Domain cap",
+        "Index budget",
+    )
+
+    @classmethod
+    def is_transient(cls, reason: str) -> bool:
+        return bool(reason) and reason.startswith(cls.TRANSIENT_PREFIXES)
+
+    @classmethod
+    def is_policy(cls, reason: str) -> bool:
+        return bool(reason) and reason.startswith(cls.POLICY_PREFIXES)
+
+    @classmethod
+    def policy_clause(cls, column):
+        """
+        SQL 版本的 is_policy，用於篩選舊資料 (分類前寫入的 indexed = -1)
+        """
+        return or_(*[column.startswith(prefix, autoescape=True) for prefix in cls.POLICY_PREFIXES])
+
+    @classmethod
+    def transient_clause(cls, column):
+        """
+        SQL 版本的 is_transient，用於篩選舊資料 (分類前寫入的 indexed = -1)
+        """
+        return or_(*[column.startswith(prefix, autoescape=True) for prefix in cls.TRANSIENT_PREFIXES])
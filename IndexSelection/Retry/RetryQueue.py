@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+
+class RetryQueue:
+    """
+    暫時失敗的 Dead-Letter Queue (index_retry 表)，以指數退避排程重試。
+    第 n 次失敗後等待 base_delay * 2^(n-1)，上限 max_delay；超過 max_attempts 轉為永久失敗。
+    """
+    def __init__(self, IndexRetry, table_index: int,
+                 base_delay: timedelta = timedelta(minutes=10),
+                 max_delay: timedelta = timedelta(days=1),
+                 max_attempts: int = 5):
+        self.IndexRetry = IndexRetry
+        self.table_index = table_index
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+
+    def next_delay(self, attempts: int) -> timedelta:
+        return min(self.base_delay * (2 ** max(attempts - 1, 0)), self.max_delay)
+
+    def exhausted(self, attempts: int) -> bool:
+        return attempts >= self.max_attempts
+
+    def due(self, s, limit: int) -> dict:
+        """
+        取出已到期的項目 {url: attempts}
+        """
+        stmt = select(self.IndexRetry.url, self.IndexRetry.attempts)\
+            .where(self.IndexRetry.table_index == self.table_index)\
+            .where(self.IndexRetry.next_retry_at <= datetime.now(timezone.utc))\
+            .order_by(self.IndexRetry.next_retry_at.asc())\
+            .limit(limit)\
+            .with_for_update(skip_locked=True)
+        return {url: attempts for url, attempts in s.execute(stmt)}
+
+    def schedule(self, s, url: str, reason: str, attempts: int):
+        now = datetime.now(timezone.utc)
+        row = {
+            "url": url,
+            "table_index": self.table_index,
+            "reason": reason,
+            "attempts": attempts,
+            "last_failed_at": now,
+            "next_retry_at": now + self.next_delay(attempts),
+        }
+        stmt = insert(self.IndexRetry).values(row)
+        stmt = stmt.on_conflict_do_update(index_elements=['url'], set_=row)
+        s.execute(stmt)
+
+    def resolve(self, s, urls):
+        if urls:
+            s.execute(delete(self.IndexRetry).where(self.IndexRetry.url.in_(list(urls))))
+
+    def clear(self, s):
+        s.execute(delete(self.IndexRetry).where(self.IndexRetry.table_index == self.table_index))
@@ -0,0 +1,35 @@
+from argparse import ArgumentParser
+import time
+
+from Database.Database import Database
+from Database.CrawlerModels import Base as CrawlerBase
+from Database.ModelFactory.AppModelFactory import AppModelFactory
+from IndexSelection.Jobs.DomainScoreJob import DomainScoreJob
+
+def parseArgs():
+    parser = ArgumentParser()
+    parser.add_argument("--database", type=str, default='ws2.csie.ntu.edu.tw:22224', help="Database URL")
+    parser.add_argument("--range", type=int, default=256, help="Limit number of tables")
+    parser.add_argument("--workers", type=int, default=16, help="Parallel threads")
+    parser.add_argument("--full", action="store_true", help="Ignore the per-shard watermarks and rescore every domain")
+    parser.add_argument("--state", type=str, default='result/domain_score_state.json', help="Per-shard watermark file (incremental runs)")
+    return parser.parse_args()
+
+def main():
+    args = parseArgs()
+    DB_USER = "crawler"
+    DB_PASS = "crawler"
+    DB_NAME = "crawlerdb"
+    DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{args.database}/{DB_NAME}"
+
+    print(f"🚀 開始計算 domain_score (Workers: {args.workers})...")
+    start_time = time.time()
+
+    db = Database(DATABASE_URL)
+    modelFactory = AppModelFactory(CrawlerBase, None)
+    DomainScoreJob(db, modelFactory, table_range=args.range, workers=args.workers, full=args.full, state_path=args.state).run()
+
+    print(f"\n🎉 處理完成！耗時: {time.time() - start_time:.2f} 秒")
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,62 @@ from sqlalchemy import create_engine, text
 from argparse import ArgumentParser
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
+from Database.MetricModels import Base as MetricBase
+from Database.CrawlerModels import Base as CrawlerBase
+from Database.ModelFactory.AppModelFactory import AppModelFactory
+from Database.utils import createDB, createAllMetricModel, addMissingColumns
+from Metric.Query.BatchStats import BatchStats
+
+# 同一個 Batch 內重複的 keyword 合併到 id 最小的那筆 (tags 取聯集)，
+# 保留那筆的 URL (它沒有 URL 時改用 id 最小、有 URL 的重複 Query 的結果)，其餘的 Query / URL 刪除
+DEDUPE_QUERIES_SQL = [
+    """
+    CREATE TEMP TABLE dup_queries ON COMMIT DROP AS
+    SELECT id, keep_id, batch_id
+    FROM (
+        SELECT id, batch_id, min(id) OVER (PARTITION BY batch_id, keyword) AS keep_id
+        FROM metric_queries
+    ) AS q
+    WHERE id <> keep_id
+    """,
+    """
+    UPDATE metric_queries AS q
+    SET tags = t.tags
+    FROM (
+        SELECT g.keep_id, jsonb_agg(DISTINCT tag.value) AS tags
+        FROM (
+            SELECT keep_id, id FROM dup_queries
+            UNION
+            SELECT keep_id, keep_id FROM dup_queries
+        ) AS g
+        JOIN metric_queries AS m ON m.id = g.id
+        CROSS JOIN LATERAL jsonb_array_elements_text(coalesce(m.tags, '[]'::jsonb)) AS tag(value)
+        GROUP BY g.keep_id
+    ) AS t
+    WHERE q.id = t.keep_id
+    """,
+    """
+    UPDATE metric_url AS u
+    SET query_id = d.keep_id
+    FROM dup_queries AS d
+    WHERE u.query_id = d.id
+      AND NOT EXISTS (SELECT 1 FROM metric_url AS k WHERE k.query_id = d.keep_id)
+      AND d.id = (
+          SELECT min(d2.id)
+          FROM dup_queries AS d2
+          WHERE d2.keep_id = d.keep_id
+            AND EXISTS (SELECT 1 FROM metric_url AS u2 WHERE u2.query_id = d2.id)
+      )
+    """,
+    "DELETE FROM metric_url WHERE query_id IN (SELECT id FROM dup_queries)",
+    "DELETE FROM metric_queries WHERE id IN (SELECT id FROM dup_queries)",
+]
+
 def parseArgs():
     parser = ArgumentParser()
     parser.add_argument("--database", type=str, default='ws2.csie.ntu.edu.tw:22224', help="Database URL")
     parser.add_argument("--workers", type=int, default=16, help="Parallel workers")
+    parser.add_argument("--metric_database", type=str, default=None, help="Metric database URL (also migrate metric tables)")
     return parser.parse_args()
 
 def process_single_table(table_index, db_url):
@@ -25,15 +77,20 @@ def process_single_table(table_index, db_url):
     
     sql_alter = text(f"""
         ALTER TABLE {table_name} 
-        DROP COLUMN IF EXISTS reason;
+        DROP COLUMN IF EXISTS reason,
+        ADD COLUMN IF NOT EXISTS page_rank DOUBLE PRECISION DEFAULT 0.0;
     """)
 
+    # DomainScoreJob 以 first_seen > watermark 找出有新 URL 的 Domain
+    sql_index = text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table_name}_first_seen ON {table_name} (first_seen);")
+
     max_retries = 10
     for attempt in range(max_retries):
         try:
             with engine.connect() as conn:
                 conn.execute(sql_timeout) # 設定這次連線的超時
                 conn.execute(sql_alter)   # 執行修改
+                conn.execute(sql_index)
                 return f"✅ {table_name} 更新成功"
         except Exception as e:
             if "lock timeout" in str(e).lower():
@@ -43,6 +100,48 @@ def process_single_table(table_index, db_url):
             
     return f"⚠️ {table_name} 超時放棄 (可能爬蟲正在大量佔用)"
 
+def migrate_metric(metric_url):
+    """
+    MetricDB：建立缺少的表，並補上既有表缺少的欄位 (create_all 不會修改已存在的表)
+    """
+    modelFactory = AppModelFactory(CrawlerBase, MetricBase)
+    createAllMetricModel(modelFactory)
+    db = createDB("metric", "metric", metric_url, "metricdb", True, MetricBase)
+
+    for mapper in MetricBase.registry.mappers:
+        added = addMissingColumns(db, mapper.class_)
+        if added:
+            print(f"✅ {mapper.class_.__tablename__} 新增欄位: {', '.join(added)}")
+
+    dedupe_queries(db, modelFactory)
+    return db
+
+def dedupe_queries(db, modelFactory: AppModelFactory):
+    """
+    GoldenSetWriter 的 ON CONFLICT 需要 (batch_id, keyword) 唯一索引；舊資料可能已有重複的 keyword，
+    先合併重複的 Query 再建立索引 (同一個 Transaction)，並重算受影響 Batch 的 Metadata
+    """
+    with db.session() as session:
+        for sql in DEDUPE_QUERIES_SQL[:1]:
+            session.execute(text(sql))
+        batch_ids = session.execute(text("SELECT DISTINCT batch_id FROM dup_queries")).scalars().all()
+        removed = session.execute(text("SELECT count(*) FROM dup_queries")).scalar()
+        for sql in DEDUPE_QUERIES_SQL[1:]:
+            session.execute(text(sql))
+        session.execute(text("""
+            CREATE UNIQUE INDEX IF NOT EXISTS uq_metric_queries_batch_keyword
+            ON metric_queries (batch_id, keyword)
+        """))
+        session.commit()
+
+    if removed:
+        print(f"✅ metric_queries 合併重複 keyword: 刪除 {removed} 筆 (Batch: {', '.join(map(str, batch_ids))})")
+    stats = BatchStats(modelFactory)
+    for batch_id in batch_ids:
+        if batch_id is not None:
+            stats.refresh(db, batch_id)
+    print("✅ uq_metric_queries_batch_keyword 已建立")
+
 def main():
     args = parseArgs()
     DB_USER = "crawler"
@@ -76,5 +175,9 @@ def main():
     print(f"\n🎉 處理完成！耗時: {end_time - start_time:.2f} 秒")
     print(f"成功: {success_count}, 失敗/跳過: {fail_count}")
 
+    if args.metric_database:
+        print(f"🚀 更新 MetricDB ({args.metric_database})...")
+        migrate_metric(args.metric_database)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
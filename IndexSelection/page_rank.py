@@ -0,0 +1,50 @@
+from argparse import ArgumentParser
+import time
+
+from IndexSelection.Jobs.PageRankJob import PageRankJob
+from Database.Database import Database
+from Database.utils import missingColumns
+
+def parseArgs():
+    parser = ArgumentParser()
+    parser.add_argument("--database", type=str, default='ws2.csie.ntu.edu.tw:22224', help="Database URL")
+    parser.add_argument("--work_dir", type=str, default='result/pagerank', help="Checkpoint directory (rerun to resume; a completed run starts over)")
+    parser.add_argument("--chunk_size", type=int, default=1_000_000, help="Edges per loading / iteration chunk")
+    parser.add_argument("--damping", type=float, default=0.85, help="Damping factor")
+    parser.add_argument("--tol", type=float, default=1e-6, help="L1 convergence threshold")
+    parser.add_argument("--max_iter", type=int, default=50, help="Max power iterations")
+    parser.add_argument("--range", type=int, default=256, help="Limit number of tables")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel workers for write back")
+    return parser.parse_args()
+
+def main():
+    args = parseArgs()
+    DB_USER = "crawler"
+    DB_PASS = "crawler"
+    DB_NAME = "crawlerdb"
+    DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{args.database}/{DB_NAME}"
+
+    # 寫回需要 url_state_NNN.page_rank (由 migrate_db 新增)
+    missing = missingColumns(Database(DATABASE_URL).engine, "url_state_000", ["page_rank"])
+    if missing:
+        raise SystemExit(f"url_state tables are missing columns {missing}; run `python -m IndexSelection.migrate_db` first.")
+
+    print(f"🚀 開始計算 PageRank (work_dir: {args.work_dir})...")
+    start_time = time.time()
+
+    job = PageRankJob(
+        DATABASE_URL,
+        args.work_dir,
+        chunk_size=args.chunk_size,
+        damping=args.damping,
+        tol=args.tol,
+        max_iter=args.max_iter,
+        table_range=args.range,
+        workers=args.workers
+    )
+    job.run()
+
+    print(f"\n🎉 處理完成！耗時: {time.time() - start_time:.2f} 秒")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+import numpy as np
+
+MAGIC = b'BLM1'
+# magic, m_bits, k, capacity, count, watermark (first_seen epoch), refreshed_at (epoch)
+HEADER = struct.Struct('<4sQIQQdd')
+
+def hash_pairs(items) -> tuple:
+    """
+    每個字串取一次 128-bit Hash，拆成 (h1, h2) 兩個 uint64，之後以 double hashing 產生 k 個位置。
+    同一批 URL 查 256 個 Filter 時只需計算一次。
+    """
+    items = list(items)
+    digests = b''.join(hashlib.blake2b(s.encode('utf-8'), digest_size=16).digest() for s in items)
+    pairs = np.frombuffer(digests, dtype='<u8').reshape(-1, 2) if items else np.empty((0, 2), dtype=np.uint64)
+    return pairs[:, 0], pairs[:, 1] | np.uint64(1)
+
+
+class BloomFilter:
+    """
+    檔案型 Bloom Filter (mmap)，Header 之後即為 bit array。
+    watermark 記錄已收錄資料的最大 first_seen，供增量更新使用。
+    """
+    def __init__(self, path: str, writable: bool = False):
+        self.path = path
+        self._file = open(path, 'r+b' if writable else 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+
+        magic, self.m, self.k, self.capacity, self.count, self.watermark, self.refreshed_at = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a bloom filter file: {path}")
+
+        self.bits = np.frombuffer(self._mm, dtype=np.uint8, offset=HEADER.size, count=(self.m + 7) // 8)
+
+    @classmethod
+    def create(cls, path: str, capacity: int, fp_rate: float = 0.01):
+        capacity = max(int(capacity), 1000)
+        m = int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        k = max(1, int(round(m / capacity * math.log(2))))
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, m, k, capacity, 0, 0.0, 0.0))
+            f.truncate(HEADER.size + (m + 7) // 8)
+        os.replace(tmp_path, path)
+        return cls(path, writable=True)
+
+    def close(self):
+        self.bits = None
+        self._mm.close()
+        self._file.close()
+
+    def _positions(self, h1, h2) -> np.ndarray:
+        # (h1 + i * h2) mod m，uint64 溢位在建立與查詢時一致，不影響正確性
+        i = np.arange(self.k, dtype=np.uint64)
+        with np.errstate(over='ignore'):
+            return (h1[:, None] + i[None, :] * h2[:, None]) % np.uint64(self.m)
+
+    def add_hashes(self, h1, h2):
+        pos = self._positions(h1, h2).ravel()
+        np.bitwise_or.at(self.bits, (pos >> np.uint64(3)).astype(np.int64), (np.uint8(1) << (pos & np.uint64(7)).astype(np.uint8)))
+        self.count += len(h1)
+
+    def contains_hashes(self, h1, h2) -> np.ndarray:
+        if len(h1) == 0:
+            return np.zeros(0, dtype=bool)
+        pos = self._positions(h1, h2)
+        hit = self.bits[(pos >> np.uint64(3)).astype(np.int64)] & (np.uint8(1) << (pos & np.uint64(7)).astype(np.uint8))
+        return (hit != 0).all(axis=1)
+
+    def add(self, items):
+        self.add_hashes(*hash_pairs(items))
+
+    def might_contain(self, item: str) -> bool:
+        return bool(self.contains_hashes(*hash_pairs([item]))[0])
+
+    def save_header(self, watermark: float, refreshed_at: float):
+        self.watermark = watermark
+        self.refreshed_at = refreshed_at
+        HEADER.pack_into(self._mm, 0, MAGIC, self.m, self.k, self.capacity, self.count, self.watermark, self.refreshed_at)
+        self._mm.flush()
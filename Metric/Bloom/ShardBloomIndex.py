@@ -0,0 +1,154 @@
+from Database.Database import Database
+from Database.ModelFactory.AppModelFactory import AppModelFactory
+from Metric.Bloom.BloomFilter import BloomFilter, hash_pairs
+from sqlalchemy import select, func
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone, timedelta
+from tqdm import tqdm
+import os
+import time
+
+class ShardBloomIndex:
+    """
+    每張 url_state_NNN 一個 Bloom Filter 快照 (bloom_dir/url_state_NNN.bloom)
+
+    - refresh(): 沒有快照就全量建立；有的話只加入 first_seen > watermark 的新 URL；
+                 收錄數超過容量 (誤判率上升) 時自動重建
+    - route():   對每個 URL 只回傳「可能含有它」的 Shard；
+                 快照不存在或超過 max_age 未更新 (可能漏掉新 URL) 的 Shard 一律要查 (退回全掃)；
+                 第一次呼叫時開啟 (mmap) 全部快照，之後重複使用，用完以 close() 釋放
+    """
+    SHARD_NUM = 256
+    MAX_WORKERS = 16
+    OVERLAP = timedelta(minutes=10)
+
+    def __init__(self, modelFactory: AppModelFactory, crawlerDB: Database, bloom_dir: str,
+                 max_age: timedelta = timedelta(hours=24), fp_rate: float = 0.01, chunk_size: int = 100000):
+        self.modelFactory = modelFactory
+        self.crawlerDB: Database = crawlerDB
+        self.bloom_dir = bloom_dir
+        self.max_age = max_age
+        self.fp_rate = fp_rate
+        self.chunk_size = chunk_size
+        self._filters = None
+        os.makedirs(self.bloom_dir, exist_ok=True)
+
+    def _path(self, shard_id):
+        return os.path.join(self.bloom_dir, f'url_state_{shard_id:03}.bloom')
+
+    # =================================================
+    # Build / Refresh
+    # =================================================
+    def refresh(self):
+        # 快照會被替換，先放掉 route() 開著的舊 Handle
+        self.close()
+        print(f"🌸 Refreshing Bloom filters ({self.MAX_WORKERS} threads)...")
+        added = 0
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+            futures = [executor.submit(self.refresh_shard, i) for i in range(self.SHARD_NUM)]
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Bloom"):
+                added += future.result()
+        print(f"   Added {added:,} URLs.")
+
+    def refresh_shard(self, shard_id) -> int:
+        path = self._path(shard_id)
+        if not os.path.exists(path):
+            return self._build_shard(shard_id)
+
+        bloom = BloomFilter(path, writable=True)
+        try:
+            # 往回重疊一段時間，避免漏掉 first_seen 較早但較晚 commit 的 URL (重複加入不影響正確性)
+            since = datetime.fromtimestamp(bloom.watermark, tz=timezone.utc) - self.OVERLAP
+            added, watermark = self._add_urls(bloom, shard_id, since)
+            if bloom.count > bloom.capacity:
+                rebuild = True
+            else:
+                rebuild = False
+                bloom.save_header(max(watermark, bloom.watermark), time.time())
+        finally:
+            bloom.close()
+
+        if rebuild:
+            return self._build_shard(shard_id)
+        return added
+
+    def _build_shard(self, shard_id) -> int:
+        UrlState = self.modelFactory.create_url_state_model(shard_id)
+        with self.crawlerDB.session() as session:
+            total = session.execute(select(func.count()).select_from(UrlState)).scalar() or 0
+
+        # 預留 2 倍容量給之後的增量更新
+        bloom = BloomFilter.create(self._path(shard_id) + '.building', capacity=total * 2, fp_rate=self.fp_rate)
+        try:
+            added, watermark = self._add_urls(bloom, shard_id, None)
+            bloom.save_header(watermark, time.time())
+        finally:
+            bloom.close()
+        os.replace(self._path(shard_id) + '.building', self._path(shard_id))
+        return added
+
+    def _add_urls(self, bloom: BloomFilter, shard_id, since):
+        """
+        將 first_seen > since 的 URL 加進 Filter (since 為 None 時全部加入)
+        回傳 (筆數, 最大 first_seen epoch)
+        """
+        UrlState = self.modelFactory.create_url_state_model(shard_id)
+        stmt = select(UrlState.url, UrlState.first_seen)
+        if since is not None:
+            stmt = stmt.where(UrlState.first_seen > since)
+        stmt = stmt.execution_options(yield_per=self.chunk_size)
+
+        added = 0
+        watermark = 0.0
+        with self.crawlerDB.session() as session:
+            for partition in session.execute(stmt).partitions():
+                bloom.add_hashes(*hash_pairs(row[0] for row in partition))
+                added += len(partition)
+                seen = [row[1].timestamp() for row in partition if row[1] is not None]
+                if seen:
+                    watermark = max(watermark, max(seen))
+        return added, watermark
+
+    # =================================================
+    # Lookup
+    # =================================================
+    def _open(self) -> dict:
+        """
+        shard_id -> BloomFilter (快照不存在為 None)，整個 Run 只開一次
+        """
+        if self._filters is None:
+            self._filters = {
+                i: BloomFilter(self._path(i)) if os.path.exists(self._path(i)) else None
+                for i in range(self.SHARD_NUM)
+            }
+        return self._filters
+
+    def close(self):
+        if self._filters is None:
+            return
+        for bloom in self._filters.values():
+            if bloom is not None:
+                bloom.close()
+        self._filters = None
+
+    def route(self, urls) -> dict:
+        """
+        回傳 {shard_id: [url, ...]}，只包含可能含有該 URL 的 Shard (過期 / 缺少的 Shard 收到全部 URL)
+        """
+        urls = list(urls)
+        h1, h2 = hash_pairs(urls)
+        now = time.time()
+        shard_urls = {}
+        stale = []
+
+        for i, bloom in self._open().items():
+            if bloom is None or now - bloom.refreshed_at > self.max_age.total_seconds():
+                stale.append(i)
+                shard_urls[i] = urls
+                continue
+            hits = bloom.contains_hashes(h1, h2)
+            shard_urls[i] = [u for u, hit in zip(urls, hits) if hit]
+
+        if stale:
+            print(f"   [Warning] {len(stale)} Bloom filters missing or stale, those shards fall back to full scan.")
+        return shard_urls
@@ -0,0 +1,141 @@
+from Database.Database import Database
+from Database.ModelFactory.AppModelFactory import AppModelFactory
+from sqlalchemy import text
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tqdm import tqdm
+
+# 每種語句一個 Statement-level Trigger，透過 Transition Table 一次算出整個語句的增量。
+# Trigger 只 INSERT 增量列 (不更新同一列)，寫入 url_state 的 Transaction 之間不會互相卡鎖。
+TRIGGER_FUNCTIONS = """
+CREATE OR REPLACE FUNCTION url_state_counter_ins() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO url_state_counter (shard_id, discovered, crawled, indexed)
+    SELECT TG_ARGV[0]::int,
+           count(*),
+           count(*) FILTER (WHERE coalesce(fetch_ok, 0) > 0),
+           count(*) FILTER (WHERE coalesce(indexed, 0) > 0)
+    FROM new_rows
+    HAVING count(*) > 0;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION url_state_counter_upd() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO url_state_counter (shard_id, discovered, crawled, indexed)
+    SELECT TG_ARGV[0]::int, 0, sum(c), sum(i)
+    FROM (
+        SELECT (coalesce(fetch_ok, 0) > 0)::int AS c, (coalesce(indexed, 0) > 0)::int AS i FROM new_rows
+        UNION ALL
+        SELECT -(coalesce(fetch_ok, 0) > 0)::int, -(coalesce(indexed, 0) > 0)::int FROM old_rows
+    ) AS d
+    HAVING sum(c) <> 0 OR sum(i) <> 0;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION url_state_counter_del() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO url_state_counter (shard_id, discovered, crawled, indexed)
+    SELECT TG_ARGV[0]::int,
+           -count(*),
+           -count(*) FILTER (WHERE coalesce(fetch_ok, 0) > 0),
+           -count(*) FILTER (WHERE coalesce(indexed, 0) > 0)
+    FROM old_rows
+    HAVING count(*) > 0;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION url_state_counter_truncate() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM url_state_counter WHERE shard_id = TG_ARGV[0]::int;
+    INSERT INTO url_state_counter (shard_id, discovered, crawled, indexed, is_base) VALUES (TG_ARGV[0]::int, 0, 0, 0, true);
+    RETURN NULL;
+END $$;
+"""
+
+TRIGGERS = [
+    # (名稱後綴, 事件, REFERENCING 子句, Function)
+    ("ins", "INSERT", "REFERENCING NEW TABLE AS new_rows", "url_state_counter_ins"),
+    ("upd", "UPDATE", "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows", "url_state_counter_upd"),
+    ("del", "DELETE", "REFERENCING OLD TABLE AS old_rows", "url_state_counter_del"),
+    ("trunc", "TRUNCATE", "", "url_state_counter_truncate"),
+]
+
+class ShardCounter:
+    """
+    url_state_NNN 的 discovered / crawled / indexed 計數器 (存在 CrawlerDB 的 url_state_counter 表)
+
+    - install(): 建立計數表、Trigger Function，並在每張 url_state_NNN 掛上 Trigger
+    - seed():    鎖住 Shard 的寫入，用一次 count 建立基準列 (install 之後做一次即可)
+    - read():    把增量列合併回基準列後回傳，只需讀取 256 列左右
+    計數定義與原本的掃描相同：discovered = 全部，crawled = fetch_ok > 0，indexed = indexed > 0
+    """
+    SHARD_NUM = 256
+    MAX_WORKERS = 16
+
+    def __init__(self, modelFactory: AppModelFactory, crawlerDB: Database):
+        self.modelFactory = modelFactory
+        self.crawlerDB: Database = crawlerDB
+
+    def install(self):
+        print("🧮 Installing url_state counters...")
+        UrlStateCounter = self.modelFactory.create_url_state_counter_model()
+        UrlStateCounter.__table__.create(self.crawlerDB.engine, checkfirst=True)
+
+        with self.crawlerDB.session() as session:
+            session.execute(text(TRIGGER_FUNCTIONS))
+            for i in range(self.SHARD_NUM):
+                table = f"url_state_{i:03}"
+                for suffix, event, referencing, function in TRIGGERS:
+                    session.execute(text(f"DROP TRIGGER IF EXISTS url_state_counter_{suffix} ON {table}"))
+                    session.execute(text(f"""
+                        CREATE TRIGGER url_state_counter_{suffix}
+                        AFTER {event} ON {table} {referencing}
+                        FOR EACH STATEMENT EXECUTE FUNCTION {function}('{i}')
+                    """))
+            session.commit()
+
+    def seed(self):
+        print(f"🌱 Seeding url_state counters ({self.MAX_WORKERS} threads)...")
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+            futures = [executor.submit(self._seed_shard, i) for i in range(self.SHARD_NUM)]
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Seeding"):
+                future.result()
+
+    def _seed_shard(self, shard_id):
+        with self.crawlerDB.session() as session:
+            # SHARE 鎖：可讀不可寫，count 期間不會有漏算的寫入；Trigger 已掛上，之後的寫入都會記成增量
+            session.execute(text(f"LOCK TABLE url_state_{shard_id:03} IN SHARE MODE"))
+            session.execute(text("DELETE FROM url_state_counter WHERE shard_id = :shard_id"), {"shard_id": shard_id})
+            session.execute(text(f"""
+                INSERT INTO url_state_counter (shard_id, discovered, crawled, indexed, is_base)
+                SELECT :shard_id,
+                       count(*),
+                       count(*) FILTER (WHERE coalesce(fetch_ok, 0) > 0),
+                       count(*) FILTER (WHERE coalesce(indexed, 0) > 0),
+                       true
+                FROM url_state_{shard_id:03}
+            """), {"shard_id": shard_id})
+            session.commit()
+
+    def read(self) -> dict:
+        """
+        合併增量列並回傳 {shard_id: (discovered, crawled, indexed)}
+        沒有基準列 (尚未 seed) 的 Shard 不在結果中，由呼叫端退回掃描
+        """
+        # DELETE 只會看到語句開始前已 commit 的列，併發寫入的新增量會留到下次合併，不會遺失
+        stmt = text("""
+            WITH moved AS (
+                DELETE FROM url_state_counter
+                WHERE shard_id IN (SELECT shard_id FROM url_state_counter WHERE is_base)
+                RETURNING shard_id, discovered, crawled, indexed
+            )
+            INSERT INTO url_state_counter (shard_id, discovered, crawled, indexed, is_base, updated_at)
+            SELECT shard_id, sum(discovered), sum(crawled), sum(indexed), true, now()
+            FROM moved
+            GROUP BY shard_id
+            RETURNING shard_id, discovered, crawled, indexed
+        """)
+        with self.crawlerDB.session() as session:
+            rows = session.execute(stmt).all()
+            session.commit()
+        return {shard_id: (disc, crawl, idx) for shard_id, disc, crawl, idx in rows}
@@ -0,0 +1,127 @@
+from Database.Database import Database
+from Database.ModelFactory.AppModelFactory import AppModelFactory
+from Metric.Lookup.ShardLookup import ShardLookup
+from Metric.Lookup.InListShardLookup import InListShardLookup
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from tqdm import tqdm
+
+class DomainShardDirectory:
+    """
+    Domain -> Shard ID 目錄 (存在 MetricDB 的 domain_shard 表)
+
+    - build():   掃描全部 domain_stats_NNN 一次，建立完整目錄
+    - resolve(): 查目錄；查不到的 Domain 才去 Crawler Shards 探測 (只帶缺少的 Domain)，
+                 找到後寫回目錄，之後就不用再探測 (增量維護)；
+                 所有 Shard 都找不到的 Domain 以 shard_id = MISS 記錄，miss_ttl 內不再重複探測
+    """
+    SHARD_NUM = 256
+    MAX_WORKERS = 16
+    MISS = -1
+
+    def __init__(self, modelFactory: AppModelFactory, crawlerDB: Database, metricDB: Database, chunk_size: int = 10000,
+                 lookup: ShardLookup = None, miss_ttl: timedelta = timedelta(hours=24)):
+        """
+        :param lookup: 探測缺少的 Domain 時使用的 Shard 查詢策略 (預設 IN-list)
+        :param miss_ttl: 探測失敗 (Negative Cache) 的有效期限，過期後才會重新探測
+        """
+        self.modelFactory = modelFactory
+        self.crawlerDB: Database = crawlerDB
+        self.metricDB: Database = metricDB
+        self.chunk_size = chunk_size
+        self.miss_ttl = miss_ttl
+        self.shard_lookup: ShardLookup = lookup or InListShardLookup(modelFactory, crawlerDB)
+
+    def build(self):
+        """
+        全量重建：平行掃描所有 domain_stats_NNN，分批 Upsert 進目錄
+        """
+        print(f"🗂️  Building Domain -> Shard directory ({self.MAX_WORKERS} threads)...")
+        total = 0
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+            futures = [executor.submit(self._build_shard, i) for i in range(self.SHARD_NUM)]
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Directory"):
+                total += future.result()
+        print(f"   Directory built: {total:,} domains.")
+
+    def _build_shard(self, shard_id) -> int:
+        DomainStats = self.modelFactory.create_domain_stats_model(shard_id)
+        count = 0
+        with self.crawlerDB.session() as session:
+            stmt = select(DomainStats.domain).execution_options(yield_per=self.chunk_size)
+            for partition in session.execute(stmt).partitions():
+                mapping = {row[0]: shard_id for row in partition}
+                self.learn(mapping)
+                count += len(mapping)
+        return count
+
+    def _read(self, domains):
+        """
+        回傳 ({domain: shard_id}, 仍在 miss_ttl 內的 Negative Cache Domain)
+        """
+        DomainShard = self.modelFactory.create_domain_shard()
+        domains = list(domains)
+        found = {}
+        known_missing = set()
+        expire = datetime.now() - self.miss_ttl
+        with self.metricDB.session() as session:
+            for i in range(0, len(domains), self.chunk_size):
+                chunk = domains[i:i + self.chunk_size]
+                stmt = select(DomainShard.domain, DomainShard.shard_id, DomainShard.updated_at).where(DomainShard.domain.in_(chunk))
+                for domain, shard_id, updated_at in session.execute(stmt):
+                    if shard_id != self.MISS:
+                        found[domain] = shard_id
+                    elif updated_at is not None and updated_at >= expire:
+                        known_missing.add(domain)
+        return found, known_missing
+
+    def lookup(self, domains) -> dict:
+        """
+        只查目錄，回傳 {domain: shard_id} (查不到的不在結果中)
+        """
+        return self._read(domains)[0]
+
+    def resolve(self, domains) -> dict:
+        """
+        查目錄 + 對缺少的 Domain 做一次探測並學習 (找不到的記為 MISS)
+        """
+        domains = set(d for d in domains if d)
+        found, known_missing = self._read(domains)
+        missing = tuple(domains - found.keys() - known_missing)
+
+        if missing:
+            print(f"   Directory miss: {len(missing):,} domains, probing shards...")
+            learned = {}
+            with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+                chunk_size = self.SHARD_NUM // self.MAX_WORKERS + 1
+                shard_chunks = [range(i, min(i + chunk_size, self.SHARD_NUM)) for i in range(0, self.SHARD_NUM, chunk_size)]
+                futures = [executor.submit(self.shard_lookup.scan_domains, chunk, missing) for chunk in shard_chunks]
+                for future in as_completed(futures):
+                    learned.update(future.result())
+
+            # 所有 Shard 都沒有的 Domain 寫入 Negative Cache，TTL 內不再探測
+            self.learn({**{d: self.MISS for d in missing if d not in learned}, **learned})
+            found.update(learned)
+        return found
+
+    def learn(self, mapping: dict):
+        """
+        將 {domain: shard_id} Upsert 進目錄
+        """
+        if not mapping:
+            return
+        DomainShard = self.modelFactory.create_domain_shard()
+        now = datetime.now()
+        rows = [{"domain": d, "shard_id": s, "updated_at": now} for d, s in mapping.items()]
+
+        with self.metricDB.session() as session:
+            for i in range(0, len(rows), self.chunk_size):
+                stmt = insert(DomainShard).values(rows[i:i + self.chunk_size])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['domain'],
+                    set_={"shard_id": stmt.excluded.shard_id, "updated_at": stmt.excluded.updated_at}
+                )
+                session.execute(stmt)
+            session.commit()
@@ -0,0 +1,174 @@
+from datetime import date, timedelta
+from sqlalchemy import text
+import numpy as np
+import os
+
+# 一條 SQL 算出每個指標的逐日累計值 (Window Function)
+# fail_reasons 以 jsonb_each 展開，任意失敗原因都會成為 'reason:<key>' 指標
+PREFIX_SQL = """
+WITH base AS (
+    SELECT stat_date, 'fetch_ok' AS metric, coalesce(fetch_ok, 0)::bigint AS value
+    FROM {table} WHERE stat_date BETWEEN :start AND :end
+    UNION ALL
+    SELECT stat_date, 'fetch_fail', coalesce(fetch_fail, 0)::bigint
+    FROM {table} WHERE stat_date BETWEEN :start AND :end
+    UNION ALL
+    SELECT s.stat_date, 'reason:' || r.key, (r.value #>> '{{}}')::numeric::bigint
+    FROM {table} AS s, jsonb_each(coalesce(s.fail_reasons, '{{}}'::jsonb)) AS r
+    WHERE s.stat_date BETWEEN :start AND :end AND jsonb_typeof(r.value) = 'number'
+), daily AS (
+    SELECT metric, stat_date, sum(value) AS value
+    FROM base
+    GROUP BY metric, stat_date
+)
+SELECT metric, stat_date, sum(value) OVER (PARTITION BY metric ORDER BY stat_date) AS cumulative
+FROM daily
+"""
+
+class RollingAggregator:
+    """
+    每日流量統計 (fetch_ok / fetch_fail / fail_reasons) 的前綴和快取
+
+    - load():   從 summary_daily 或 domain_stats_daily_NNN 這類逐日表讀取 [start, end] 的累計值
+    - merge():  前綴和可以直接相加，多張表 (e.g. 多個 Shard) 合併成一份
+    - window(): 任意指標、任意結束日期與天數的加總，O(1)
+    - save() / load_cached(): 前綴和存成 .npz，下次只讀取快取之後的新日期
+
+    prefix[metric][k] = start 起前 k 天的總和 (prefix[metric][0] = 0)
+    """
+    WINDOWS = (1, 7, 30)
+    REASON_KEYS = {"http_error_404": "HttpError 404", "http_error_500": "HttpError 500"}
+    # 快取的最後幾天 (含快取結束日) 可能還有資料陸續寫入，一律重新讀取
+    REFRESH_DAYS = 2
+
+    def __init__(self, start: date, end: date):
+        self.start = start
+        self.end = end
+        self.days = (end - start).days + 1
+        self.prefix = {}
+
+    def _offset(self, day: date) -> int:
+        return (day - self.start).days
+
+    def load(self, session, table_name: str):
+        rows = session.execute(text(PREFIX_SQL.format(table=table_name)), {"start": self.start, "end": self.end}).all()
+
+        points = {}
+        for metric, stat_date, cumulative in rows:
+            points.setdefault(metric, []).append((self._offset(stat_date), int(cumulative)))
+
+        for metric, values in points.items():
+            # 沒有資料的日期沿用前一天的累計值 (forward fill)
+            dense = np.zeros(self.days + 1, dtype=np.int64)
+            has_value = np.zeros(self.days + 1, dtype=bool)
+            for offset, cumulative in values:
+                dense[offset + 1] = cumulative
+                has_value[offset + 1] = True
+            last = np.maximum.accumulate(np.where(has_value, np.arange(self.days + 1), 0))
+            self._add(metric, dense[last])
+        return self
+
+    def _add(self, metric, prefix: np.ndarray):
+        if metric in self.prefix:
+            self.prefix[metric] = self.prefix[metric] + prefix
+        else:
+            self.prefix[metric] = prefix
+
+    def merge(self, other: "RollingAggregator"):
+        if (other.start, other.end) != (self.start, self.end):
+            raise ValueError("Cannot merge aggregators with different date ranges")
+        for metric, prefix in other.prefix.items():
+            self._add(metric, prefix)
+        return self
+
+    def save(self, path: str):
+        metrics = list(self.prefix)
+        matrix = np.stack([self.prefix[m] for m in metrics]) if metrics else np.zeros((0, self.days + 1), dtype=np.int64)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, range=np.array([self.start.toordinal(), self.end.toordinal()]),
+                     metrics=np.array(metrics, dtype=str), prefix=matrix)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def restore(cls, path: str) -> "RollingAggregator":
+        with np.load(path) as data:
+            start, end = (date.fromordinal(int(x)) for x in data['range'])
+            aggregator = cls(start, end)
+            aggregator.prefix = {str(m): data['prefix'][i].copy() for i, m in enumerate(data['metrics'])}
+        return aggregator
+
+    def load_cached(self, cache_path: str, loader):
+        """
+        loader(start, end) -> RollingAggregator：讀取 [start, end] 的逐日資料
+        快取 (cache_path) 涵蓋的日期直接沿用 (最後 REFRESH_DAYS 天除外)，只對之後的日期呼叫 loader，完成後寫回快取。
+        cache_path 為 None 時等同直接讀取整個範圍
+        """
+        cached = None
+        if cache_path and os.path.exists(cache_path):
+            try:
+                cached = self.restore(cache_path)
+            except Exception as e:
+                print(f"   [Warning] Ignoring unreadable flow cache {cache_path}: {e}")
+
+        # 從 start 起沿用快取的天數
+        keep = 0
+        if cached is not None and cached.start <= self.start:
+            keep_last = min(cached.end - timedelta(days=self.REFRESH_DAYS), self.end)
+            keep = max((keep_last - self.start).days + 1, 0)
+
+        daily = {}
+        if keep:
+            lo = cached._offset(self.start)
+            for metric, prefix in cached.prefix.items():
+                daily[metric] = np.zeros(self.days, dtype=np.int64)
+                daily[metric][:keep] = np.diff(prefix[lo:lo + keep + 1])
+        if keep < self.days:
+            fresh = loader(self.start + timedelta(days=keep), self.end)
+            for metric, prefix in fresh.prefix.items():
+                daily.setdefault(metric, np.zeros(self.days, dtype=np.int64))[keep:] = np.diff(prefix)
+
+        self.prefix = {metric: np.concatenate(([0], np.cumsum(values))) for metric, values in daily.items()}
+        if cache_path:
+            self.save(cache_path)
+        return self
+
+    def reasons(self) -> list:
+        return sorted(m[len('reason:'):] for m in self.prefix if m.startswith('reason:'))
+
+    def window(self, metric: str, end_date: date, days: int) -> int:
+        """
+        end_date (含) 往前 days 天的加總；超出載入範圍的部分視為 0
+        """
+        prefix = self.prefix.get(metric)
+        if prefix is None:
+            return 0
+        hi = min(max(self._offset(end_date) + 1, 0), self.days)
+        lo = min(max(self._offset(end_date) + 1 - days, 0), self.days)
+        return int(prefix[hi] - prefix[lo])
+
+    def reason(self, reason: str, end_date: date, days: int) -> int:
+        return self.window(f"reason:{reason}", end_date, days)
+
+    def flow_stats(self, target_date: date) -> dict:
+        """
+        回傳 CrawlerStatMixin 的 fetch / error 欄位 (當日、7 天、30 天)
+        """
+        stats = {}
+        for days in self.WINDOWS:
+            suffix = "" if days == 1 else f"_{days}"
+            ok = self.window("fetch_ok", target_date, days)
+            fail = self.window("fetch_fail", target_date, days)
+            stats[f"fetch_ok{suffix}"] = ok
+            stats[f"fetch_fail{suffix}"] = fail
+            stats[f"fetch_total{suffix}"] = ok + fail
+            for field, reason in self.REASON_KEYS.items():
+                stats[f"{field}{suffix}"] = self.reason(reason, target_date, days)
+        return stats
+
+    @classmethod
+    def for_target(cls, target_date: date, history_days: int = 0):
+        """
+        涵蓋 target_date 的最長滾動窗口；history_days > 0 時再往前多載入，供回補歷史資料
+        """
+        return cls(target_date - timedelta(days=max(cls.WINDOWS) - 1 + history_days), target_date)
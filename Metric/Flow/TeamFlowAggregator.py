@@ -0,0 +1,74 @@
+from Database.Database import Database
+from Database.ModelFactory.AppModelFactory import AppModelFactory
+from Metric.Flow.RollingAggregator import RollingAggregator
+from sqlalchemy import text
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+from tqdm import tqdm
+import os
+
+class TeamFlowAggregator:
+    """
+    Team A / Team B 的每日流量統計 (fetch_ok / fetch_fail / fail_reasons)
+
+    SummaryDaily 是全域的，無法拆分 Team；改為平行讀取每張 domain_stats_daily_NNN
+    (只讀滾動窗口範圍內的日期，走 stat_date 索引)，各 Shard 的前綴和再依 Team 相加。
+    有 cache_dir 時每個 Team 的前綴和存成快取，之後只讀取新日期。
+    任何一個 Shard 讀取失敗就拋出 RuntimeError，不回傳 (也不快取) 只含部分 Shard 的總和。
+    """
+    SHARD_NUM = 256
+    MAX_WORKERS = 16
+    TEAMS = {"A": range(0, 128), "B": range(128, 256)}
+
+    def __init__(self, modelFactory: AppModelFactory, crawlerDB: Database, cache_dir: str = None):
+        self.modelFactory = modelFactory
+        self.crawlerDB: Database = crawlerDB
+        self.cache_dir = cache_dir
+
+    def ensure_indexes(self):
+        """
+        domain_stats_daily_NNN 的主鍵是 (domain, stat_date)，日期範圍查詢用不到；
+        補上 stat_date 索引 (CONCURRENTLY，不阻擋爬蟲寫入)
+        """
+        print("🗂️  Ensuring stat_date indexes on domain_stats_daily_*...")
+        with self.crawlerDB.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for i in tqdm(range(self.SHARD_NUM), desc="Indexes"):
+                table = f"domain_stats_daily_{i:03}"
+                conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_stat_date ON {table} (stat_date)"))
+
+    def _load_shard(self, shard_id, start: date, end: date):
+        aggregator = RollingAggregator(start, end)
+        DomainDaily = self.modelFactory.create_domain_daily_model(shard_id)
+        with self.crawlerDB.session() as session:
+            try:
+                aggregator.load(session, DomainDaily.__tablename__)
+            except Exception as e:
+                print(f"   [Warning] Shard {shard_id:03} flow stats failed: {e}")
+                return shard_id, None
+        return shard_id, aggregator
+
+    def _load_team(self, team: str, start: date, end: date) -> RollingAggregator:
+        total = RollingAggregator(start, end)
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+            futures = [executor.submit(self._load_shard, i, start, end) for i in self.TEAMS[team]]
+            for future in tqdm(as_completed(futures), total=len(futures), desc=f"Team {team} Flow"):
+                shard_id, aggregator = future.result()
+                if aggregator is None:
+                    failed.append(shard_id)
+                else:
+                    total.merge(aggregator)
+        if failed:
+            raise RuntimeError(f"Team {team} flow stats incomplete: {len(failed)} shards failed ({', '.join(f'{i:03}' for i in sorted(failed))})")
+        return total
+
+    def aggregate(self, target_date: date, history_days: int = 0) -> dict:
+        """
+        回傳 {team: RollingAggregator}
+        """
+        teams = {}
+        for team in self.TEAMS:
+            cache_path = os.path.join(self.cache_dir, f"team_flow_{team}.npz") if self.cache_dir else None
+            loader = lambda start, end, team=team: self._load_team(team, start, end)
+            teams[team] = RollingAggregator.for_target(target_date, history_days).load_cached(cache_path, loader)
+        return teams
@@ -0,0 +1,134 @@
+import numpy as np
+
+class IREvaluator:
+    """
+    向量化的搜尋品質評估 (所有 Query 一次算完)
+
+    Golden Set 與搜尋結果先轉成補齊長度的 NumPy 矩陣：
+    - gains: (Q, K)  搜尋結果第 j 名的相關度 (不在 Golden Set 為 0)
+    - ideal: (Q, K)  Golden Set 依相關度排序後的理想相關度 (nDCG 分母)
+    - n_rel: (Q,)    每個 Query 的 Golden URL 數 (Recall 分母)
+    相關度由 Golden 排名 (MetricURL.rank) 而來：graded 時第 r 名為 n_rel - r + 1，否則為 1；
+    P@k / R@k / MRR 只看是否命中。
+
+    信賴區間使用 Poisson Bootstrap (每個單位的權重 ~ Poisson(1))，重抽樣化為矩陣乘法，不必為每次重抽複製資料；
+    Query 數超過 max_units 時先隨機分成 max_units 組 (組內加總)，再對組做 Bootstrap，
+    成本從 O(B x Q) 降為 O(Q + B x max_units)。這是近似：重抽的期望值不變，組數夠多時區間寬度接近逐筆重抽，
+    但組內的 Query 一起進出，區間並不完全相同；max_units=None 時不分組 (逐筆重抽，較慢)。
+    """
+    def __init__(self, ks=(1, 5, 10), graded: bool = True):
+        self.ks = tuple(sorted(set(ks)))
+        self.k_max = self.ks[-1]
+        self.graded = graded
+
+    def build(self, golden: list, results: list):
+        """
+        :param golden: 每個 Query 的 [(url, rank), ...]
+        :param results: 每個 Query 搜尋結果的 URL 列表 (依排名)
+        回傳 (gains, ideal, n_rel)
+        """
+        q = len(golden)
+        gains = np.zeros((q, self.k_max), dtype=np.float32)
+        ideal = np.zeros((q, self.k_max), dtype=np.float32)
+        n_rel = np.zeros(q, dtype=np.int32)
+
+        for i, (pairs, urls) in enumerate(zip(golden, results)):
+            n = len(pairs)
+            if n == 0:
+                continue
+            if self.graded:
+                rel = {url: float(max(n - (rank or n) + 1, 1)) for url, rank in pairs}
+            else:
+                rel = {url: 1.0 for url, _ in pairs}
+            # Golden Set 中重複的 URL 只算一個 (Recall 分母)
+            n_rel[i] = len(rel)
+
+            top = sorted(rel.values(), reverse=True)[:self.k_max]
+            ideal[i, :len(top)] = top
+
+            seen = set()
+            for j, url in enumerate((urls or [])[:self.k_max]):
+                # 搜尋結果重複出現的 URL 只算第一次
+                if url in rel and url not in seen:
+                    gains[i, j] = rel[url]
+                    seen.add(url)
+        return gains, ideal, n_rel
+
+    def per_query(self, gains: np.ndarray, ideal: np.ndarray, n_rel: np.ndarray) -> dict:
+        """
+        回傳 {metric: (Q,) 每個 Query 的值}
+        沒有 Golden URL 的 Query 不參與評估 (呼叫端應先排除)
+        """
+        hits = (gains > 0).astype(np.float32)
+        cum_hits = np.cumsum(hits, axis=1)
+        discount = 1.0 / np.log2(np.arange(2, self.k_max + 2, dtype=np.float32))
+        cum_dcg = np.cumsum(gains * discount, axis=1)
+        cum_idcg = np.cumsum(ideal * discount, axis=1)
+        denom_rel = np.maximum(n_rel, 1).astype(np.float32)
+
+        values = {}
+        for k in self.ks:
+            values[f"precision@{k}"] = cum_hits[:, k - 1] / k
+            values[f"recall@{k}"] = cum_hits[:, k - 1] / denom_rel
+            idcg = cum_idcg[:, k - 1]
+            values[f"ndcg@{k}"] = np.divide(cum_dcg[:, k - 1], idcg, out=np.zeros_like(idcg), where=idcg > 0)
+
+        # MRR：第一個命中的名次倒數 (前 k_max 名都沒命中為 0)
+        first = hits.argmax(axis=1)
+        values["mrr"] = np.where(hits.any(axis=1), 1.0 / (first + 1), 0.0).astype(np.float32)
+        return values
+
+    def bootstrap(self, values: dict, n_boot: int = 1000, confidence: float = 0.95, seed: int = 0,
+                  max_units: int = 2000, chunk: int = 100) -> dict:
+        """
+        回傳 {metric: (ci_low, ci_high)}
+        :param max_units: Query 數超過時先分組再重抽 (近似)；None 表示一律逐筆重抽
+        """
+        names = list(values)
+        matrix = np.stack([values[n] for n in names], axis=1).astype(np.float64)   # (Q, M)
+        q = matrix.shape[0]
+        if q == 0:
+            return {n: (None, None) for n in names}
+
+        rng = np.random.default_rng(seed)
+        if max_units is not None and q > max_units:
+            groups = rng.permutation(q) % max_units
+            sums = np.zeros((max_units, matrix.shape[1]))
+            np.add.at(sums, groups, matrix)
+            counts = np.bincount(groups, minlength=max_units).astype(np.float64)
+        else:
+            sums = matrix
+            counts = np.ones(q)
+
+        means = []
+        for start in range(0, n_boot, chunk):
+            b = min(chunk, n_boot - start)
+            weights = rng.poisson(1.0, size=(b, len(counts))).astype(np.float64)
+            totals = np.maximum(weights @ counts, 1.0)[:, None]
+            means.append(weights @ sums / totals)
+        means = np.concatenate(means, axis=0)   # (B, M)
+
+        alpha = (1 - confidence) / 2
+        low, high = np.quantile(means, [alpha, 1 - alpha], axis=0)
+        return {n: (float(low[i]), float(high[i])) for i, n in enumerate(names)}
+
+    def evaluate(self, golden: list, results: list, n_boot: int = 1000, confidence: float = 0.95, seed: int = 0,
+                 max_units: int = 2000) -> dict:
+        """
+        回傳 {metric: {"value", "ci_low", "ci_high", "queries"}}
+        """
+        gains, ideal, n_rel = self.build(golden, results)
+        mask = n_rel > 0
+        gains, ideal, n_rel = gains[mask], ideal[mask], n_rel[mask]
+
+        values = self.per_query(gains, ideal, n_rel)
+        cis = self.bootstrap(values, n_boot, confidence, seed, max_units) if n_boot > 0 else {n: (None, None) for n in values}
+        return {
+            name: {
+                "value": float(v.mean()) if len(v) else None,
+                "ci_low": cis[name][0],
+                "ci_high": cis[name][1],
+                "queries": int(len(v))
+            }
+            for name, v in values.items()
+        }
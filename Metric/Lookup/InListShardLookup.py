@@ -0,0 +1,41 @@
+from Metric.Lookup.ShardLookup import ShardLookup
+from sqlalchemy import select
+
+class InListShardLookup(ShardLookup):
+    """
+    每張表送一個 WHERE url IN (...) 查詢 (URL 少時最簡單)
+    """
+    def scan_urls(self, tasks) -> list:
+        found_data = [] # List of (url, fetch_ok, indexed, table_id)
+        
+        with self.crawlerDB.session() as session:
+            for i, url_tuple in tasks:
+                try:
+                    UrlState = self.modelFactory.create_url_state_model(i)
+                    # 判斷 URL 是否存在於該分片
+                    stmt = select(
+                        UrlState.url, 
+                        UrlState.fetch_ok, 
+                        UrlState.indexed
+                    ).where(UrlState.url.in_(url_tuple))
+
+                    result = session.execute(stmt)
+                    for row in result:
+                        found_data.append((row.url, row.fetch_ok, row.indexed, i))
+                except Exception:
+                    pass
+        return found_data
+
+    def scan_domains(self, shard_ids, domain_tuple) -> dict:
+        found_map = {}
+        with self.crawlerDB.session() as session:
+            for i in shard_ids:
+                try:
+                    DomainStats = self.modelFactory.create_domain_stats_model(i)
+                    stmt = select(DomainStats.domain).where(DomainStats.domain.in_(domain_tuple))
+                    result = session.execute(stmt).scalars()
+                    for domain in result:
+                        found_map[domain] = i
+                except Exception:
+                    pass
+        return found_map
@@ -0,0 +1,23 @@
+from Database.Database import Database
+from Database.ModelFactory.AppModelFactory import AppModelFactory
+
+class ShardLookup:
+    """
+    Golden URL / Domain 在 Crawler Shards 中的查詢策略
+    """
+    def __init__(self, modelFactory: AppModelFactory, crawlerDB: Database):
+        self.modelFactory = modelFactory
+        self.crawlerDB: Database = crawlerDB
+
+    def scan_urls(self, tasks) -> list:
+        """
+        tasks: list of (shard_id, url_tuple)
+        回傳 list of (url, fetch_ok, indexed, shard_id)
+        """
+        raise NotImplementedError
+
+    def scan_domains(self, shard_ids, domain_tuple) -> dict:
+        """
+        回傳 {domain: shard_id}
+        """
+        raise NotImplementedError
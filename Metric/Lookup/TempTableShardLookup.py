@@ -0,0 +1,100 @@
+from Metric.Lookup.ShardLookup import ShardLookup
+from Database.utils import copyRows
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from contextlib import contextmanager
+
+class TempTableShardLookup(ShardLookup):
+    """
+    每條連線先把 Golden URL / Domain COPY 進 Session 暫存表，再讓每張 Shard 與暫存表 JOIN。
+    SQL 本身固定不變，不會隨 Golden Set 大小重新解析 / 規劃，也不用每張表重送一次 URL 清單。
+
+    暫存表每條連線只建立一次 (記在 Connection.info，連線重建時自動清空)，之後每次呼叫只 TRUNCATE 再 COPY，
+    不用每次重建表 / 索引而讓 Catalog 膨脹。掃描的 Transaction 結束時 rollback，資料不會殘留在 Connection Pool。
+    """
+    TABLES = {
+        "golden_url": (
+            "CREATE TEMP TABLE IF NOT EXISTS golden_url (url TEXT NOT NULL, shard_id INTEGER NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS golden_url_url_idx ON golden_url (url)",
+        ),
+        "golden_domain": (
+            "CREATE TEMP TABLE IF NOT EXISTS golden_domain (domain TEXT PRIMARY KEY)",
+        ),
+    }
+
+    @contextmanager
+    def _session(self, table: str):
+        """
+        在固定的一條連線上開 Session，確保暫存表已建立且為空
+        """
+        with self.crawlerDB.engine.connect() as conn:
+            created = conn.info.setdefault("temp_tables", set())
+            with Session(bind=conn) as session:
+                if table not in created:
+                    for ddl in self.TABLES[table]:
+                        session.execute(text(ddl))
+                    session.commit()
+                    created.add(table)
+                session.execute(text(f"TRUNCATE {table}"))
+                yield session
+
+    def scan_urls(self, tasks) -> list:
+        if not tasks:
+            return []
+
+        # url -> 需要查詢的 shard；若所有 task 都要查這個 URL，就記成 -1 (萬用)，避免重複寫入
+        shard_ids = [i for i, _ in tasks]
+        url_shards = {}
+        for i, url_tuple in tasks:
+            for url in url_tuple:
+                url_shards.setdefault(url, []).append(i)
+
+        rows = []
+        for url, shards in url_shards.items():
+            if len(shards) == len(shard_ids):
+                rows.append((url, -1))
+            else:
+                rows.extend((url, i) for i in shards)
+
+        found_data = []
+        with self._session("golden_url") as session:
+            copyRows(session, "golden_url", ["url", "shard_id"], rows)
+            session.execute(text("ANALYZE golden_url"))
+
+            for i in shard_ids:
+                stmt = text(f"""
+                    SELECT s.url, s.fetch_ok, s.indexed
+                    FROM url_state_{i:03} AS s
+                    JOIN golden_url AS g ON g.url = s.url
+                    WHERE g.shard_id IN (:shard_id, -1)
+                """)
+                try:
+                    with session.begin_nested(): # 單一 Shard 出錯不影響同一 Transaction 的其他 Shard
+                        for row in session.execute(stmt, {"shard_id": i}):
+                            found_data.append((row.url, row.fetch_ok, row.indexed, i))
+                except Exception:
+                    pass
+        return found_data
+
+    def scan_domains(self, shard_ids, domain_tuple) -> dict:
+        if not domain_tuple:
+            return {}
+
+        found_map = {}
+        with self._session("golden_domain") as session:
+            copyRows(session, "golden_domain", ["domain"], [(d,) for d in domain_tuple])
+            session.execute(text("ANALYZE golden_domain"))
+
+            for i in shard_ids:
+                stmt = text(f"""
+                    SELECT d.domain
+                    FROM domain_stats_{i:03} AS d
+                    JOIN golden_domain AS g ON g.domain = d.domain
+                """)
+                try:
+                    with session.begin_nested():
+                        for domain in session.execute(stmt).scalars():
+                            found_map[domain] = i
+                except Exception:
+                    pass
+        return found_map
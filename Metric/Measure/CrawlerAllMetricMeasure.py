@@ -1,82 +1,83 @@
 from Metric.Measure.Measure import Measure
 from Database.Database import Database
 from Database.ModelFactory.AppModelFactory import AppModelFactory
-from sqlalchemy import select, func, and_
+from Metric.Directory.DomainShardDirectory import DomainShardDirectory
+from Metric.Lookup.ShardLookup import ShardLookup
+from Metric.Lookup.InListShardLookup import InListShardLookup
+from Metric.Bloom.ShardBloomIndex import ShardBloomIndex
+from Metric.Status.UrlStatusTable import UrlStatusTable
+from Metric.utils import get_domain
+from Database.utils import copyRows
+from sqlalchemy import select, func, and_, or_, text
 from sqlalchemy.dialects.postgresql import insert
 from tqdm import tqdm
-import tldextract
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from datetime import datetime
 
 class CrawlerAllMetricMeasure(Measure):
-    def __init__(self, modelFactory: AppModelFactory, crawlerDB: Database, metricDB: Database, batch_id: int, tag: str):
+    def __init__(self, modelFactory: AppModelFactory, crawlerDB: Database, metricDB: Database, batch_id: int, tag,
+                 directory: DomainShardDirectory = None, lookup: ShardLookup = None, bloom: ShardBloomIndex = None,
+                 chunk_size: int = 10000, write_chunk_size: int = 100000):
         """
         初始化 CrawlerAllMetricMeasure
         :param modelFactory: 模型工廠
         :param crawlerDB: 爬蟲資料庫 (讀取 Shard 狀態)
         :param metricDB: 指標資料庫 (讀取 Golden URL / 寫入覆蓋率)
         :param batch_id: 指定要評估的 MetricBatch ID
-        :param tag: 指定 Metric 標籤 (例如 'head', 'random')，用來篩選 Golden URLs
+        :param tag: 指定 Metric 標籤 (例如 'head', 'random')，用來篩選 Golden URLs；
+                    傳入多個標籤 (e.g. ['random', 'head']) 時只掃描一次 Shards，再依標籤分別統計
+        :param directory: Domain -> Shard 目錄；有的話每個 URL 只查它所屬的 Shard，不再 256 張表全掃
+        :param lookup: Shard 查詢策略 (預設 IN-list；Golden Set 很大時可用 TempTableShardLookup)
+        :param bloom: 每個 Shard 的 Bloom Filter 快照；有的話只查可能含有該 URL 的 Shard
+        :param chunk_size: Golden URL 串流讀取的批次大小 (每批讀完就送去掃描)
+        :param write_chunk_size: MetricURL 狀態回寫每批 COPY / UPDATE 的筆數
         """
         super().__init__()
         self.modelFactory = modelFactory
         self.crawlerDB: Database = crawlerDB
         self.metricDB: Database = metricDB
         self.batch_id = batch_id
-        self.tag = tag
-        
-        # 初始化 TLD Extractor (關閉快取避免權限問題)
-        self.extractor = tldextract.TLDExtract(cache_dir=False)
+        self.tags = [tag] if isinstance(tag, str) else list(dict.fromkeys(tag))
+        self.tag = ", ".join(self.tags)
+        self.directory = directory
+        self.lookup: ShardLookup = lookup or InListShardLookup(modelFactory, crawlerDB)
+        self.bloom: ShardBloomIndex = bloom
+        self.chunk_size = chunk_size
+        self.write_chunk_size = write_chunk_size
     
     def get_domain(self, url: str) -> str:
-        try:
-            extracted = self.extractor(url)
-            if extracted.domain and extracted.suffix:
-                return f"{extracted.domain}.{extracted.suffix}"
-            return ""
-        except:
-            return ""
+        # 共用的離線 PSL + LRU (見 Metric/utils.py)
+        return get_domain(url)
 
-    def _scan_domain_shard(self, shard_ids, domain_tuple):
-        """
-        掃描 CrawlerDB 的 Domain Tables，建立 Domain -> Shard ID 的映射
+    def _plan_shards(self, urls, domain_shard_map) -> dict:
         """
-        found_map = {}
-        with self.crawlerDB.session() as session:
-            for i in shard_ids:
-                try:
-                    DomainStats = self.modelFactory.create_domain_stats_model(i)
-                    stmt = select(DomainStats.domain).where(DomainStats.domain.in_(domain_tuple))
-                    result = session.execute(stmt).scalars()
-                    for domain in result:
-                        found_map[domain] = i
-                except Exception:
-                    pass
-        return found_map
-
-    def _scan_url_shard(self, shard_ids, url_tuple):
+        規劃一批 URL 要送到哪些 URL Table，回傳 {shard_id: [url, ...]}
+        有目錄時：URL 只送到它 Domain 所屬的 Shard。
+        resolve() 已對目錄缺少的 Domain 探測過 domain_stats，仍找不到代表爬蟲沒見過該 Domain，URL 不可能被發現；
+        只有抽不出 Domain 的 URL (e.g. IP) 需要全掃
+        有 Bloom Filter 時：需要全掃的 URL 改成只送到「可能含有它」的 Shard
         """
-        掃描 CrawlerDB 的 Url State Tables，取得 URL 的發現/爬取/索引狀態
-        """
-        found_data = [] # List of (url, fetch_ok, indexed, table_id)
-        
-        with self.crawlerDB.session() as session:
-            for i in shard_ids:
-                try:
-                    UrlState = self.modelFactory.create_url_state_model(i)
-                    # 判斷 URL 是否存在於該分片
-                    stmt = select(
-                        UrlState.url, 
-                        UrlState.fetch_ok, 
-                        UrlState.indexed
-                    ).where(UrlState.url.in_(url_tuple))
+        shard_urls = {}
+        if self.directory:
+            unrouted = []
+            for url_str in urls:
+                domain = self.get_domain(url_str)
+                if not domain:
+                    unrouted.append(url_str)
+                elif domain in domain_shard_map:
+                    shard_urls.setdefault(domain_shard_map[domain], []).append(url_str)
+        else:
+            unrouted = urls
 
-                    result = session.execute(stmt)
-                    for row in result:
-                        found_data.append((row.url, row.fetch_ok, row.indexed, i))
-                except Exception:
-                    pass
-        return found_data
+        if unrouted:
+            if self.bloom:
+                candidates = self.bloom.route(unrouted)
+            else:
+                candidates = {i: unrouted for i in range(256)}
+            for i, shard_list in candidates.items():
+                if shard_list:
+                    shard_urls.setdefault(i, []).extend(shard_list)
+        return shard_urls
 
     def test(self):
         """
@@ -85,148 +86,107 @@ class CrawlerAllMetricMeasure(Measure):
         print(f'🚀 Start Measuring Crawler Coverage (Batch: {self.batch_id}, Tag: {self.tag})')
         today_date = datetime.now().date()
         
-        # 對應 MetricCoverage 的 Set Type (例如 "head" -> "HeadSet")
-        set_type = f"{self.tag.capitalize()}Set"
-
         # ==========================================
-        # 1. 從 MetricDB 讀取 Golden URLs
+        # 1. 從 MetricDB 串流讀取 Golden URLs，同時並行掃描 CrawlerDB (Shards)
         # ==========================================
         MetricURL = self.modelFactory.create_metric_url()
         MetricQuery = self.modelFactory.create_metric_queries()
         
-        # 結構: url_str -> list of MetricURL ID
-        url_id_map = {} 
+        # 欄式狀態表：URL interning + NumPy 狀態欄位 (見 UrlStatusTable)
+        table = UrlStatusTable(self.tags)
         all_golden_domains = set()
-        
-        print(f"📥 Loading Golden URLs with tag '{self.tag}'...")
-        with self.metricDB.session() as session:
-            # 透過 Join 篩選：
-            # 1. MetricQuery.batch_id 符合
-            # 2. MetricQuery.tags 包含指定的 tag (使用 JSONB @> 操作符)
-            stmt = select(MetricURL)\
-                .join(MetricQuery)\
-                .where(
-                    and_(
-                        MetricQuery.batch_id == self.batch_id,
-                        MetricQuery.tags.contains([self.tag])
-                    )
-                )
-            
-            
-            results = session.execute(stmt).scalars().all()
-            
-            if not results:
-                print(f"⚠️ No URLs found for Batch {self.batch_id} with tag '{self.tag}'. Exiting.")
-                return
-
-            for m_url in results:
-                url_str = m_url.url
-                
-                if url_str not in url_id_map:
-                    url_id_map[url_str] = []
-                
-                url_id_map[url_str].append(m_url.id)
-
-                domain = self.get_domain(url_str)
-                if domain:
-                    all_golden_domains.add(domain)
-
-        # 準備掃描用的 Tuple
-        url_list = list(url_id_map.keys())
-        domain_list = list(all_golden_domains)
-        url_tuple = tuple(url_list)
-        domain_tuple = tuple(domain_list)
-        
-        print(f"   Loaded {len(url_list)} unique URLs from {len(domain_list)} domains.")
+        domain_shard_map = {}
 
-        # ==========================================
-        # 2. 並行掃描 CrawlerDB (Shards)
-        # ==========================================
         MAX_WORKERS = 16
         chunk_size = 256 // MAX_WORKERS + 1
         shard_chunks = [range(i, min(i + chunk_size, 256)) for i in range(0, 256, chunk_size)]
 
-        # A. 掃描 Domain Tables (為了確定 Shard ID / Team)
-        domain_shard_map = {}
-        print(f"🔍 Scanning Domain Tables ({MAX_WORKERS} threads)...")
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = [executor.submit(self._scan_domain_shard, chunk, domain_tuple) for chunk in shard_chunks]
-            for future in tqdm(as_completed(futures), total=len(futures), desc="Domains"):
-                domain_shard_map.update(future.result())
+        # 串流讀取 + 掃描管線：
+        # 每讀完一批 Golden URL (server-side cursor, yield_per) 就立刻規劃並送出該批的 Shard 掃描，
+        # 讀取與掃描重疊進行；同時在途的掃描工作有上限，記憶體只和批次大小有關
+        pending = set()
+        max_pending = MAX_WORKERS * 2
+        progress = tqdm(desc="URLs", unit="task")
 
-        # B. 掃描 URL Tables (為了確定 Status)
-        # 初始化 URL 狀態
-        url_status_map = {
-            u: {'discovered': False, 'crawled': False, 'indexed': False, 'shard_id': -1} 
-            for u in url_list
-        }
-        
-        print(f"🔍 Scanning URL Tables ({MAX_WORKERS} threads)...")
+        def collect(done):
+            for future in done:
+                for (url, fetch_ok, indexed, shard_id) in future.result():
+                    table.set_status(url, fetch_ok, indexed, shard_id)
+                progress.update(1)
+
+        print(f"📥 Streaming Golden URLs with tag '{self.tag}' and scanning URL Tables ({MAX_WORKERS} threads)...")
         with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = [executor.submit(self._scan_url_shard, chunk, url_tuple) for chunk in shard_chunks]
-            for future in tqdm(as_completed(futures), total=len(futures), desc="URLs"):
-                results = future.result()
-                for (url, fetch_ok, indexed, shard_id) in results:
-                    if url in url_status_map:
-                        url_status_map[url]['discovered'] = True
-                        url_status_map[url]['crawled'] = (fetch_ok > 0)
-                        url_status_map[url]['indexed'] = (indexed == 1)
-                        url_status_map[url]['shard_id'] = shard_id
+            with self.metricDB.session() as session:
+                # 透過 Join 篩選：
+                # 1. MetricQuery.batch_id 符合
+                # 2. MetricQuery.tags 包含任一指定的 tag (使用 JSONB @> 操作符)
+                # 多個標籤一次查完，同一個 URL 不論屬於幾個標籤都只掃描一次；只取需要的欄位，不建立 ORM 物件
+                stmt = select(MetricURL.id, MetricURL.url, MetricQuery.tags)\
+                    .join(MetricQuery)\
+                    .where(
+                        and_(
+                            MetricQuery.batch_id == self.batch_id,
+                            or_(*[MetricQuery.tags.contains([t]) for t in self.tags])
+                        )
+                    )\
+                    .execution_options(yield_per=self.chunk_size)
+
+                for partition in session.execute(stmt).partitions():
+                    new_urls = [url_str for m_id, url_str, query_tags in partition if table.add(m_id, url_str, query_tags or [])]
+                    if not new_urls:
+                        continue
+
+                    new_domains = set(d for d in map(self.get_domain, new_urls) if d) - all_golden_domains
+                    all_golden_domains.update(new_domains)
+                    if self.directory and new_domains:
+                        domain_shard_map.update(self.directory.resolve(new_domains))
+
+                    shard_urls = self._plan_shards(new_urls, domain_shard_map)
+                    for chunk in shard_chunks:
+                        tasks = [(i, tuple(shard_urls[i])) for i in chunk if shard_urls.get(i)]
+                        if tasks:
+                            pending.add(executor.submit(self.lookup.scan_urls, tasks))
+
+                    # Backpressure：在途工作太多時先等一部分完成
+                    while len(pending) > max_pending:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+
+            if len(table) == 0:
+                progress.close()
+                print(f"⚠️ No URLs found for Batch {self.batch_id} with tag '{self.tag}'. Exiting.")
+                return
+
+            # 沒有目錄時，Team 判斷需要的 Domain -> Shard 在讀取結束後一起掃
+            if not self.directory:
+                domain_tuple = tuple(all_golden_domains)
+                domain_futures = [executor.submit(self.lookup.scan_domains, chunk, domain_tuple) for chunk in shard_chunks]
+
+            done, _ = wait(pending)
+            collect(done)
+            progress.close()
+
+            if not self.directory:
+                for future in tqdm(as_completed(domain_futures), total=len(domain_futures), desc="Domains"):
+                    domain_shard_map.update(future.result())
+
+        url_list = table.urls
+        print(f"   Loaded {len(url_list):,} unique URLs from {len(all_golden_domains):,} domains.")
 
         # ==========================================
         # 3. 聚合統計與分組 (Team A / Team B)
         # ==========================================
         print("🔄 Aggregating Stats...")
         
-        # 統計容器：分別統計 Total, Team A, Team B
-        stats = {
-            "Total": {"total": 0, "disc": 0, "crawl": 0, "idx": 0},
-            "A":     {"total": 0, "disc": 0, "crawl": 0, "idx": 0},
-            "B":     {"total": 0, "disc": 0, "crawl": 0, "idx": 0},
-        }
-        
-        bulk_update_mappings = []
-
-        for url_str, ids in url_id_map.items():
-            status = url_status_map.get(url_str, {})
-            
-            is_disc = status.get('discovered', False)
-            is_crawl = status.get('crawled', False)
-            is_idx = status.get('indexed', False)
-            shard_id = status.get('shard_id', -1)
-            
-            # 如果 URL table 沒找到，嘗試用 Domain table 找 Team
-            if shard_id == -1:
-                domain = self.get_domain(url_str)
-                shard_id = domain_shard_map.get(domain, -1)
-
-            # 判斷 Team
-            team_key = None
-            if 0 <= shard_id <= 127:
-                team_key = "A"
-            elif 128 <= shard_id <= 255:
-                team_key = "B"
-            
-            # 準備批量更新 MetricURL 的資料
-            for m_id in ids:
-                bulk_update_mappings.append({
-                    "id": m_id,
-                    "is_discovered": is_disc,
-                    "is_crawled": is_crawl,
-                    "is_indexed": is_idx,
-                    "shard_id": shard_id # 記錄找到的 shard，-1 表示未找到
-                })
+        # 如果 URL table 沒找到，嘗試用 Domain table 找 Team
+        unresolved = table.unresolved()
+        fallback = [(i, domain_shard_map.get(self.get_domain(url_list[i]), -1)) for i in unresolved.tolist()]
+        fallback = [(i, shard_id) for i, shard_id in fallback if shard_id != -1]
+        if fallback:
+            table.set_shard(*zip(*fallback))
 
-            # 累加統計 (Team A/B 與 Total)
-            target_groups = ["Total"]
-            if team_key:
-                target_groups.append(team_key)
-            
-            for g in target_groups:
-                stats[g]["total"] += 1
-                if is_disc: stats[g]["disc"] += 1
-                if is_crawl: stats[g]["crawl"] += 1
-                if is_idx:  stats[g]["idx"] += 1
+        # 每個標籤的 Total / Team A / Team B (遮罩加總)
+        tag_stats = table.aggregate()
 
         # ==========================================
         # 4. 寫入 MetricDB
@@ -234,15 +194,16 @@ class CrawlerAllMetricMeasure(Measure):
         print(f"💾 Saving results to MetricDB...")
         
         with self.metricDB.session() as session:
-            # A. 更新 MetricURL 詳細狀態
-            if bulk_update_mappings:
-                session.bulk_update_mappings(MetricURL, bulk_update_mappings)
+            # A. 更新 MetricURL 詳細狀態 (COPY 進暫存表 + set-based UPDATE)
+            self._write_back(session, table)
             
-            # B. 寫入 MetricCoverage 統計表 (Total, A, B)
+            # B. 寫入每個標籤的 MetricCoverage 統計表 (Total, A, B)
             suffixes = ["Total", "A", "B"]
             
-            for suffix in suffixes:
-                d = stats[suffix]
+            for tag, suffix in ((t, s) for t in self.tags for s in suffixes):
+                # 對應 MetricCoverage 的 Set Type (例如 "head" -> "HeadSet")
+                set_type = f"{tag.capitalize()}Set"
+                d = tag_stats[tag][suffix]
                 total_count = d["total"]
                 
                 try:
@@ -259,9 +220,8 @@ class CrawlerAllMetricMeasure(Measure):
                     "crawled_num": d["crawl"],
                     "crawled_rate": d["crawl"] / total_count if total_count > 0 else 0.0,
                     "indexed_num": d["idx"],
-                    "indexed_rate": d["idx"] / total_count if total_count > 0 else 0.0,
-                    "ranked_num": 0,
-                    "ranked_rate": 0.0
+                    "indexed_rate": d["idx"] / total_count if total_count > 0 else 0.0
+                    # ranked_num / ranked_rate 由 TypesenseRankMeasure 寫入，這裡不覆蓋
                 }
 
                 stmt = insert(ModelClass).values(row_data)
@@ -277,11 +237,60 @@ class CrawlerAllMetricMeasure(Measure):
         # ==========================================
         # 5. 輸出報告
         # ==========================================
-        self._print_report(stats)
+        for tag in self.tags:
+            self._print_report(tag, tag_stats[tag])
+
+    def _write_back(self, session, table: UrlStatusTable):
+        """
+        將每筆 MetricURL 的 (id, is_discovered, is_crawled, is_indexed, shard_id) 分批 COPY 進暫存表，
+        每批以一條 UPDATE ... FROM 套用 (shard_id 為 -1 表示未找到)。
+        在呼叫端的 Transaction 內執行，與 Coverage 統計一起 commit。
+        """
+        ids, is_disc, is_crawl, is_idx, shard_ids = table.metric_columns()
+        if len(ids) == 0:
+            return
+
+        session.execute(text("""
+            CREATE TEMP TABLE metric_url_status (
+                id BIGINT PRIMARY KEY,
+                is_discovered BOOLEAN NOT NULL,
+                is_crawled BOOLEAN NOT NULL,
+                is_indexed BOOLEAN NOT NULL,
+                shard_id INTEGER NOT NULL
+            ) ON COMMIT DROP
+        """))
+        update = text("""
+            UPDATE metric_url AS m
+            SET is_discovered = t.is_discovered,
+                is_crawled = t.is_crawled,
+                is_indexed = t.is_indexed,
+                shard_id = t.shard_id
+            FROM metric_url_status AS t
+            WHERE m.id = t.id
+              AND (m.is_discovered, m.is_crawled, m.is_indexed, m.shard_id)
+                  IS DISTINCT FROM (t.is_discovered, t.is_crawled, t.is_indexed, t.shard_id)
+        """)
+
+        updated = 0
+        with tqdm(total=len(ids), desc="Write-back", unit="url") as progress:
+            for start in range(0, len(ids), self.write_chunk_size):
+                sl = slice(start, start + self.write_chunk_size)
+                rows = zip(
+                    ids[sl].tolist(),
+                    ('t' if v else 'f' for v in is_disc[sl].tolist()),
+                    ('t' if v else 'f' for v in is_crawl[sl].tolist()),
+                    ('t' if v else 'f' for v in is_idx[sl].tolist()),
+                    shard_ids[sl].tolist()
+                )
+                count = copyRows(session, "metric_url_status", ["id", "is_discovered", "is_crawled", "is_indexed", "shard_id"], rows)
+                updated += session.execute(update).rowcount
+                session.execute(text("TRUNCATE metric_url_status"))
+                progress.update(count)
+        print(f"   MetricURL rows changed: {updated:,} / {len(ids):,}")
 
-    def _print_report(self, stats):
+    def _print_report(self, tag, stats):
         print("\n" + "="*60)
-        print(f"📊 Coverage Report - Tag: {self.tag}")
+        print(f"📊 Coverage Report - Tag: {tag}")
         print("="*60)
         
         headers = f"{'Group':<12} | {'Total':>8} | {'Disc %':>10} | {'Crawl %':>10} | {'Index %':>10}"
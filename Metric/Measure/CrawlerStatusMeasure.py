@@ -1,19 +1,48 @@
 from Metric.Measure.Measure import Measure
 from Database.Database import Database
 from Database.ModelFactory.AppModelFactory import AppModelFactory
+from Metric.Counter.ShardCounter import ShardCounter
+from Metric.Flow.RollingAggregator import RollingAggregator
+from Metric.Flow.TeamFlowAggregator import TeamFlowAggregator
 from datetime import datetime, timedelta, date
-from sqlalchemy import func, case, select, and_
+from sqlalchemy import func, case, select, text
 from sqlalchemy.dialects.postgresql import insert
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
-from collections import defaultdict
+from statistics import NormalDist
+import math
+import os
+import numpy as np
 
 class CrawlerStatusMeasure(Measure):
-    def __init__(self, modelFactory: AppModelFactory, crawlerDB: Database, metricDB: Database):
+    # 小於此列數的 Shard 在估計模式下仍直接 count (抽樣反而不準)
+    EXACT_THRESHOLD = 100000
+
+    def __init__(self, modelFactory: AppModelFactory, crawlerDB: Database, metricDB: Database, counter: ShardCounter = None,
+                 approx: bool = False, sample_rate: float = 0.01, confidence: float = 0.95, team_flow: bool = True,
+                 history_days: int = 0, flow_cache_dir: str = None):
+        """
+        :param counter: Trigger 維護的 Shard 計數器；有的話直接讀計數，只有尚未 seed 的 Shard 才掃描
+        :param approx: 估計模式：discovered / crawled / indexed 皆由 TABLESAMPLE SYSTEM 抽樣估計 (含信賴區間)，pg_class.reltuples 只用來判斷是否為小表
+        :param sample_rate: 估計模式的抽樣比例 (0.01 = 1% 的 Page)
+        :param confidence: 信賴區間的信心水準
+        :param team_flow: 是否從 domain_stats_daily_NNN 計算 Team A / B 的流量統計 (否則補 0)
+        :param history_days: 回補前 N 天 crawler_stat_* 的流量欄位 (fetch / error)，Snapshot 欄位無法回補
+        :param flow_cache_dir: 流量前綴和的快取目錄 (RollingAggregator.load_cached)，下次只讀新日期
+        """
         super().__init__()
         self.crawlerDB: Database = crawlerDB
         self.metricDB: Database = metricDB
         self.modelFactory: AppModelFactory = modelFactory
+        self.counter: ShardCounter = counter
+        self.approx = approx
+        self.sample_rate = sample_rate
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.history_days = history_days
+        self.flow_cache_dir = flow_cache_dir
+        if flow_cache_dir:
+            os.makedirs(flow_cache_dir, exist_ok=True)
+        self.team_flow: TeamFlowAggregator = TeamFlowAggregator(modelFactory, crawlerDB, flow_cache_dir) if team_flow else None
     
     def _scan_shard(self, shard_id):
         """
@@ -30,70 +59,67 @@ class CrawlerStatusMeasure(Measure):
                 )
                 
                 result = session.execute(stmt).one()
-                return shard_id, result[0], result[1], result[1]
+                return shard_id, result[0], result[1], result[2]
                 
             except Exception as e:
                 return shard_id, 0, 0, 0
 
-    def _get_daily_summary_stats(self, target_date: date):
+    def _estimate_shard(self, shard_id):
         """
-        從 SummaryDaily 計算 1天, 7天, 30天 的統計數據
-        回傳 dict: 包含所有 CrawlerStatMixin 需要的 fetch 與 error 欄位
+        估計單一分片的 Snapshot 狀態
+        回傳 (shard_id, discovered, crawled, indexed, (var_discovered, var_crawled, var_indexed))
         """
-        stats_data = defaultdict(int)
-        
-        # 定義時間範圍
-        start_date_30 = target_date - timedelta(days=29) # 含今天共30天
-        
-        SummaryDaily = self.modelFactory.create_summary_model()
-        
+        table = f"url_state_{shard_id:03}"
         with self.crawlerDB.session() as session:
-            # 一次撈取過去 30 天的資料
-            rows = session.query(SummaryDaily).filter(
-                and_(SummaryDaily.stat_date >= start_date_30, SummaryDaily.stat_date <= target_date)
-            ).all()
-            
-            # 在記憶體中進行聚合計算 (Python loop)
-            # 這樣處理 JSONB 的 key 累加比寫複雜 SQL 容易維護
-            for row in rows:
-                # 計算該列與目標日期的差距
-                delta_days = (target_date - row.stat_date).days
-                
-                # 基礎數值
-                f_ok = row.fetch_ok or 0
-                f_fail = row.fetch_fail or 0
-                f_total = f_ok + f_fail
-                
-                # 解析 fail_reasons (JSONB)
-                reasons = row.fail_reasons if row.fail_reasons else {}
-                err_404 = reasons.get("HttpError 404", 0)
-                err_500 = reasons.get("HttpError 500", 0) # 依據你的需求 HttpError 505
-                
-                # 1. 當日數據 (delta_days == 0)
-                if delta_days == 0:
-                    stats_data["fetch_ok"] = f_ok
-                    stats_data["fetch_fail"] = f_fail
-                    stats_data["fetch_total"] = f_total
-                    stats_data["http_error_404"] = err_404
-                    stats_data["http_error_500"] = err_500
-
-                # 2. 7天滾動數據 (0 <= delta_days < 7)
-                if delta_days < 7:
-                    stats_data["fetch_ok_7"] += f_ok
-                    stats_data["fetch_fail_7"] += f_fail
-                    stats_data["fetch_total_7"] += f_total
-                    stats_data["http_error_404_7"] += err_404
-                    stats_data["http_error_500_7"] += err_500
-
-                # 3. 30天滾動數據 (0 <= delta_days < 30)
-                if delta_days < 30:
-                    stats_data["fetch_ok_30"] += f_ok
-                    stats_data["fetch_fail_30"] += f_fail
-                    stats_data["fetch_total_30"] += f_total
-                    stats_data["http_error_404_30"] += err_404
-                    stats_data["http_error_500_30"] += err_500
-                    
-        return stats_data
+            try:
+                # reltuples 是上次 ANALYZE 時的列數，只用來判斷是否為小表
+                reltuples = session.execute(text("""
+                    SELECT c.reltuples
+                    FROM pg_class c
+                    WHERE c.oid = to_regclass(:table)
+                """), {"table": table}).one()[0]
+            except Exception:
+                return shard_id, 0, 0, 0, (0.0, 0.0, 0.0)
+
+            # 從未 ANALYZE (reltuples = -1) 或是小表：直接 count
+            if reltuples < 0 or reltuples < self.EXACT_THRESHOLD:
+                return (*self._scan_shard(shard_id), (0.0, 0.0, 0.0))
+
+            # SYSTEM 抽樣是每個 Page 以機率 pi 獨立抽出 (Cluster Sampling)，以 Page 分組計數
+            rows = session.execute(text(f"""
+                SELECT count(*),
+                       count(*) FILTER (WHERE coalesce(fetch_ok, 0) > 0),
+                       count(*) FILTER (WHERE coalesce(indexed, 0) > 0)
+                FROM {table} TABLESAMPLE SYSTEM (:pct)
+                GROUP BY (ctid::text::point)[0]
+            """), {"pct": self.sample_rate * 100}).all()
+
+        if not rows:
+            return (*self._scan_shard(shard_id), (0.0, 0.0, 0.0))
+
+        # Horvitz-Thompson：Y = sum(y) / pi，Var = (1 - pi) / pi^2 * sum(y^2)
+        # 沒抽到列的 Page 不會出現在 GROUP BY 結果中，但其 y = 0，對估計值與變異數都沒有貢獻
+        sample = np.array(rows, dtype=np.float64)
+        pi = self.sample_rate
+        estimates = sample.sum(axis=0) / pi
+        variances = (1.0 - pi) / pi ** 2 * (sample ** 2).sum(axis=0)
+        discovered, crawled, indexed = (int(round(v)) for v in estimates)
+        return shard_id, discovered, crawled, indexed, tuple(float(v) for v in variances)
+
+    def _get_daily_summary_stats(self, target_date: date) -> RollingAggregator:
+        """
+        從 SummaryDaily 取回涵蓋 target_date (與回補日期) 的前綴和，
+        之後 flow_stats(day) 即為 CrawlerStatMixin 需要的 fetch 與 error 欄位
+        """
+        SummaryDaily = self.modelFactory.create_summary_model()
+
+        # 一條 SQL 取回逐日前綴和 (含所有 fail_reasons)，各窗口在記憶體中 O(1) 算出
+        def loader(start, end):
+            with self.crawlerDB.session() as session:
+                return RollingAggregator(start, end).load(session, SummaryDaily.__tablename__)
+
+        cache_path = os.path.join(self.flow_cache_dir, f"{SummaryDaily.__tablename__}.npz") if self.flow_cache_dir else None
+        return RollingAggregator.for_target(target_date, self.history_days).load_cached(cache_path, loader)
 
     def test(self):
         # 設定日期 (使用 date 物件)
@@ -111,29 +137,62 @@ class CrawlerStatusMeasure(Measure):
 
         print(f'🚀 Start Measuring Status - {date_str}')
         
-        # 2. [Snapshot] 平行掃描 Shards
-        print("   [1/3] Scanning UrlState Shards...")
-        MAX_WORKERS = 16
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = [executor.submit(self._scan_shard, i) for i in range(256)]
+        # 2. [Snapshot] 估計模式：平行抽樣估計；否則讀取計數器，沒有計數的 Shard 才平行掃描
+        shard_results = []
+        snapshot_variance = {g: {"discovered": 0.0, "crawled": 0.0, "indexed": 0.0} for g in snapshot_stats}
+        if self.approx:
+            print(f"   [1/3] Estimating UrlState Shards (sample {self.sample_rate:.2%})...")
+            MAX_WORKERS = 16
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                futures = [executor.submit(self._estimate_shard, i) for i in range(256)]
+                for future in tqdm(as_completed(futures), total=len(futures), desc="Estimating Shards"):
+                    shard_id, disc, crawl, idx, variance = future.result()
+                    shard_results.append((shard_id, disc, crawl, idx))
+                    # 各 Shard 獨立抽樣，變異數直接相加
+                    team_key = "A" if 0 <= shard_id <= 127 else "B"
+                    for key, var in zip(("discovered", "crawled", "indexed"), variance):
+                        snapshot_variance[team_key][key] += var
+                        snapshot_variance["Total"][key] += var
+        elif self.counter:
+            print("   [1/3] Reading UrlState Counters...")
+            counts = self.counter.read()
+            shard_results = [(shard_id, *counts[shard_id]) for shard_id in range(256) if shard_id in counts]
+        scan_ids = [] if self.approx else [i for i in range(256) if not self.counter or i not in counts]
+
+        if scan_ids:
+            print(f"   [1/3] Scanning {len(scan_ids)} UrlState Shards...")
+            MAX_WORKERS = 16
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                futures = [executor.submit(self._scan_shard, i) for i in scan_ids]
+                for future in tqdm(as_completed(futures), total=len(futures), desc="Scanning Shards"):
+                    shard_results.append(future.result())
+
+        for shard_id, disc, crawl, idx in shard_results:
+            # 分類 Team A / Team B
+            if 0 <= shard_id <= 127:
+                team_key = "A"
+            else:
+                team_key = "B"
             
-            for future in tqdm(as_completed(futures), total=256, desc="Scanning Shards"):
-                shard_id, disc, crawl, idx = future.result()
-                
-                # 分類 Team A / Team B
-                if 0 <= shard_id <= 127:
-                    team_key = "A"
-                else:
-                    team_key = "B"
-                
-                # 累加 (Team & Total)
-                for key, val in [("discovered", disc), ("crawled", crawl), ("indexed", idx)]:
-                    snapshot_stats[team_key][key] += val
-                    snapshot_stats["Total"][key] += val
+            # 累加 (Team & Total)
+            for key, val in [("discovered", disc), ("crawled", crawl), ("indexed", idx)]:
+                snapshot_stats[team_key][key] += val
+                snapshot_stats["Total"][key] += val
 
         # 3. [Flow] 計算 SummaryDaily 統計 (Fetch & Errors & Rolling)
         print("   [2/3] Calculating Daily & Rolling Stats...")
-        daily_flow_stats = self._get_daily_summary_stats(today_date)
+        summary_flow = self._get_daily_summary_stats(today_date)
+        daily_flow_stats = summary_flow.flow_stats(today_date)
+        team_flows = {}
+        team_flow_failed = False
+        if self.team_flow:
+            try:
+                team_flows = self.team_flow.aggregate(today_date, self.history_days)
+            except RuntimeError as e:
+                # 不寫入只含部分 Shard 的 Team 總和；A / B 的流量欄位維持原值
+                print(f"   [Warning] {e}; Team A / B flow columns are left unchanged.")
+                team_flow_failed = True
+        team_flow_stats = {team: aggregator.flow_stats(today_date) for team, aggregator in team_flows.items()}
         
         # 4. 寫入 MetricDB
         print(f"   [3/3] Saving to MetricDB...")
@@ -150,12 +209,20 @@ class CrawlerStatusMeasure(Measure):
                     "discovered": snapshot_stats[suffix]["discovered"],
                     "crawled":    snapshot_stats[suffix]["crawled"],
                     "indexed":    snapshot_stats[suffix]["indexed"],
+                    "is_estimate": self.approx,
                 }
+                # 信賴區間半寬 (只有估計模式才有)
+                for key in ("discovered", "crawled", "indexed"):
+                    row_data[f"{key}_ci"] = self.z * math.sqrt(snapshot_variance[suffix][key]) if self.approx else None
                 
                 # 如果是 Total 表，我們要填入完整的 SummaryDaily 統計數據
-                # (因為 SummaryDaily 是全域的，無法拆分 A/B，除非有額外邏輯)
+                # (SummaryDaily 是全域的，無法拆分 A/B；A / B 改由各 Team 的 domain_stats_daily_NNN 加總)
                 if suffix == "Total":
                     row_data.update(daily_flow_stats)
+                elif suffix in team_flow_stats:
+                    row_data.update(team_flow_stats[suffix])
+                elif team_flow_failed:
+                    pass
                 else:
                     # 對於 A 和 B，若無數據來源，則補 0 以防資料庫 Null constraint (如果欄位沒設 default)
                     # 或是維持 None 讓 DB default 運作。
@@ -179,13 +246,26 @@ class CrawlerStatusMeasure(Measure):
                 )
                 
                 session.execute(stmt)
-            
+
+            # 回補前 history_days 天的流量欄位 (只更新 fetch / error，不動當天的 Snapshot)
+            for offset in range(1, self.history_days + 1):
+                day = today_date - timedelta(days=offset)
+                flows = {"Total": summary_flow, **team_flows}
+                for suffix, aggregator in flows.items():
+                    ModelClass = self.modelFactory.create_crawler_stat_model(suffix)
+                    flow_data = aggregator.flow_stats(day)
+                    stmt = insert(ModelClass).values({"stat_date": day, **flow_data})
+                    stmt = stmt.on_conflict_do_update(index_elements=['stat_date'], set_=flow_data)
+                    session.execute(stmt)
+            if self.history_days:
+                print(f"   Backfilled flow stats for {self.history_days} days.")
+
             session.commit()
 
         # 5. 輸出報告
-        self._print_report(date_str, snapshot_stats, daily_flow_stats)
+        self._print_report(date_str, snapshot_stats, daily_flow_stats, snapshot_variance)
 
-    def _print_report(self, date_str, snapshot_stats, flow_stats):
+    def _print_report(self, date_str, snapshot_stats, flow_stats, snapshot_variance=None):
         print("\n" + "="*50)
         print(f"📊 Crawler Status Report: {date_str}")
         print("="*50)
@@ -197,6 +277,9 @@ class CrawlerStatusMeasure(Measure):
         for group in ["A", "B", "Total"]:
             d = snapshot_stats[group]
             print(f"{group:<8} | {d['discovered']:>12,} | {d['crawled']:>12,} | {d['indexed']:>12,}")
+            if self.approx and snapshot_variance:
+                ci = {k: self.z * math.sqrt(v) for k, v in snapshot_variance[group].items()}
+                print(f"{'  ± CI':<8} | {ci['discovered']:>12,.0f} | {ci['crawled']:>12,.0f} | {ci['indexed']:>12,.0f}")
             
         print("-" * 50)
         # Flow Report (Total Only)
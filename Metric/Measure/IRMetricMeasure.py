@@ -0,0 +1,102 @@
+from Metric.Measure.TypesenseRankMeasure import TypesenseRankMeasure
+from Metric.IR.IREvaluator import IREvaluator
+from Database.Database import Database
+from Database.ModelFactory.AppModelFactory import AppModelFactory
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime
+import time
+
+class IRMetricMeasure(TypesenseRankMeasure):
+    """
+    搜尋品質 (precision@k / recall@k / MRR / nDCG@k) 與 Bootstrap 信賴區間
+
+    搜尋結果沿用 TypesenseRankMeasure 的 multi_search 批次查詢，Golden Set 的排名 (MetricURL.rank) 作為相關度；
+    指標由 IREvaluator 以矩陣一次算完，依 Batch / 標籤 / 日期寫入 metric_ir
+    """
+    def __init__(self, modelFactory: AppModelFactory, metricDB: Database, batch_id: int, tag, url: str,
+                 ks=(1, 5, 10), n_boot: int = 1000, confidence: float = 0.95, seed: int = 0,
+                 batch_size: int = 50, workers: int = 8, **kwargs):
+        """
+        :param ks: 要計算的 k (搜尋結果取 max(ks) 筆)
+        :param n_boot: Bootstrap 次數 (0 表示不算信賴區間)
+        """
+        self.evaluator = IREvaluator(ks)
+        super().__init__(modelFactory, metricDB, batch_id, tag, url, per_page=self.evaluator.k_max,
+                         batch_size=batch_size, workers=workers, **kwargs)
+        self.n_boot = n_boot
+        self.confidence = confidence
+        self.seed = seed
+
+    def test(self):
+        print(f'🚀 Start Measuring IR Metrics (Batch: {self.batch_id}, Tag: {self.tag}, Typesense: {self.url})')
+        today_date = datetime.now().date()
+
+        queries = self._load_golden()
+        if not queries:
+            print(f"⚠️ No URLs found for Batch {self.batch_id} with tag '{self.tag}'. Exiting.")
+            return
+
+        query_ids = list(queries)
+        results = self._search_all(queries, "Search")
+
+        reports = {}
+        for tag in self.tags:
+            tagged = [q for q in query_ids if any(tag in tags for _, _, _, tags, _ in queries[q][1])]
+            golden = [[(url, rank) for _, url, _, _, rank in queries[q][1]] for q in tagged]
+            engine = [results[q] for q in tagged]
+
+            start = time.perf_counter()
+            reports[tag] = self.evaluator.evaluate(golden, engine, self.n_boot, self.confidence, self.seed)
+            print(f"   [{tag}] evaluated {len(tagged):,} queries in {time.perf_counter() - start:.3f}s")
+
+        if self.dry_run:
+            print("🧪 Dry run: MetricDB not updated.")
+        else:
+            self._save_ir(today_date, reports)
+
+        for tag, report in reports.items():
+            self._print_report(tag, report)
+
+    def _save_ir(self, today_date, reports: dict):
+        """
+        依 Batch / 標籤 / 日期 / 指標 Upsert 進 metric_ir
+        """
+        print("💾 Saving results to MetricDB...")
+        MetricIR = self.modelFactory.create_metric_ir()
+        with self.metricDB.session() as session:
+            for tag, report in reports.items():
+                rows = [
+                    {
+                        "batch_id": self.batch_id,
+                        "tag": tag,
+                        "stat_date": today_date,
+                        "metric": name,
+                        "value": r["value"],
+                        "ci_low": r["ci_low"],
+                        "ci_high": r["ci_high"],
+                        "queries": r["queries"],
+                        "updated_at": datetime.now()
+                    }
+                    for name, r in report.items()
+                ]
+                stmt = insert(MetricIR).values(rows)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['batch_id', 'tag', 'stat_date', 'metric'],
+                    set_={c: stmt.excluded[c] for c in ("value", "ci_low", "ci_high", "queries", "updated_at")}
+                )
+                session.execute(stmt)
+            session.commit()
+            print("✅ MetricDB Updated Successfully.")
+
+    def _print_report(self, tag, report: dict):
+        print("\n" + "="*60)
+        print(f"📊 IR Report - Tag: {tag} ({int(self.confidence * 100)}% CI)")
+        print("="*60)
+        for name, r in report.items():
+            if r["value"] is None:
+                print(f"{name:<14} | {'-':>8}")
+            elif r["ci_low"] is None:
+                print(f"{name:<14} | {r['value']:>8.4f}")
+            else:
+                print(f"{name:<14} | {r['value']:>8.4f} | [{r['ci_low']:.4f}, {r['ci_high']:.4f}]")
+        print("="*60 + "\n")
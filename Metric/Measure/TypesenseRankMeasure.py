@@ -1,66 +1,239 @@
 from Metric.Measure.Measure import Measure
-# from Metric.Dataset.Dataset import Dataset
-import typesense
+from Database.Database import Database
+from Database.ModelFactory.AppModelFactory import AppModelFactory
+from Database.utils import copyRows
+from sqlalchemy import select, and_, or_, text
+from sqlalchemy.dialects.postgresql import insert
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from tqdm import tqdm
+import threading
+import typesense
 import os
 
 class TypesenseRankMeasure(Measure):
-    def __init__(self):
+    """
+    Golden URL 是否出現在 Typesense 搜尋結果的前 per_page 名 (ranked)
+
+    - 每 batch_size 個關鍵字合成一個 multi_search 請求
+    - 多個 Thread 並行送出，每個 Thread 有自己的 Client (requests Session 不跨 Thread 共用)
+    - 結果寫回 metric_url.is_ranked，並更新 Coverage 表的 ranked_num / ranked_rate (Total / A / B)
+    - 任何一個搜尋失敗都會中止寫回，避免把失敗的查詢當成「未上榜」寫進 MetricDB
+    - dry_run (e.g. 對 FakeTypesenseServer 的離線壓測) 只輸出報告，不寫入 MetricDB
+    """
+    SUFFIXES = ("Total", "A", "B")
+
+    def __init__(self, modelFactory: AppModelFactory, metricDB: Database, batch_id: int, tag, url: str,
+                 collection: str = "webpages", query_by: str = "content", per_page: int = 10,
+                 batch_size: int = 50, workers: int = 8, api_key: str = None, dry_run: bool = False):
+        """
+        :param tag: Metric 標籤 (例如 'head')，或多個標籤的 list
+        :param url: Typesense host:port
+        :param batch_size: 每個 multi_search 請求包含的關鍵字數 (Typesense 預設上限 50)
+        :param workers: 同時在途的 multi_search 請求數
+        :param dry_run: 只輸出報告，不寫入 MetricDB (搜尋結果不是真實的 Typesense 時使用)
+        """
         super().__init__()
-    
+        if not url:
+            raise ValueError("Typesense url is required (--typesense_url or --fake_typesense)")
+        self.modelFactory = modelFactory
+        self.metricDB: Database = metricDB
+        self.batch_id = batch_id
+        self.tags = [tag] if isinstance(tag, str) else list(dict.fromkeys(tag))
+        self.tag = ", ".join(self.tags)
+        self.url = url
+        self.collection = collection
+        self.query_by = query_by
+        self.per_page = per_page
+        self.batch_size = batch_size
+        self.workers = workers
+        self.api_key = api_key or os.getenv("TYPESENSE_API_KEY", "apiapiapi")
+        self.dry_run = dry_run
+        self._local = threading.local()
+
+    def _client(self) -> typesense.Client:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            parts = self.url.split(':', 1)
+            client = typesense.Client({
+                'nodes': [{
+                    'host': os.getenv("TYPESENSE_HOST", parts[0]),
+                    'port': os.getenv("TYPESENSE_PORT", int(parts[1])),
+                    'protocol': "http",
+                }],
+                'api_key': self.api_key,
+                'connection_timeout_seconds': 10
+            })
+            self._local.client = client
+        return client
+
+    def _search_batch(self, keywords: list) -> list:
+        """
+        回傳與 keywords 對應的結果 URL 列表 (依排名；失敗的搜尋為 None)
+        """
+        searches = [{'collection': self.collection, 'q': keyword} for keyword in keywords]
+        common_params = {
+            'query_by': self.query_by,
+            'sort_by': '_text_match:desc',
+            'per_page': self.per_page,
+            'include_fields': 'url',
+        }
+        try:
+            response = self._client().multi_search.perform({'searches': searches}, common_params)
+        except Exception as e:
+            print(f"   [Warning] multi_search failed ({len(keywords)} queries): {e}")
+            return [None] * len(keywords)
+
+        found = []
+        for result in response.get('results', []):
+            if 'error' in result:
+                found.append(None)
+                continue
+            found.append([hit['document'].get('url') for hit in result.get('hits', [])])
+
+        # 回傳筆數與請求不符時無法對應回關鍵字，整批視為失敗
+        if len(found) != len(keywords):
+            print(f"   [Warning] multi_search returned {len(found)} results for {len(keywords)} queries")
+            return [None] * len(keywords)
+        return found
+
+    def _search_all(self, queries: dict, desc: str) -> dict:
+        """
+        以 multi_search 批次並行查詢所有關鍵字，回傳 query_id -> 結果 URL 列表
+
+        有任何查詢失敗時拋出 RuntimeError (呼叫端不會寫回任何結果)
+        """
+        query_ids = list(queries)
+        batches = [query_ids[i:i + self.batch_size] for i in range(0, len(query_ids), self.batch_size)]
+        results = {}
+
+        print(f"🔎 {len(query_ids):,} queries in {len(batches)} multi_search requests ({self.workers} threads)...")
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self._search_batch, [queries[q][0] for q in batch]): batch for batch in batches}
+            with tqdm(total=len(query_ids), desc=desc, unit="query") as pbar:
+                for future in as_completed(futures):
+                    batch = futures[future]
+                    results.update(zip(batch, future.result()))
+                    pbar.update(len(batch))
+
+        failed = sum(1 for hits in results.values() if hits is None)
+        if failed:
+            raise RuntimeError(f"{failed:,} / {len(query_ids):,} Typesense queries failed; MetricDB not updated")
+        return results
+
+    def _load_golden(self) -> dict:
+        """
+        query_id -> (keyword, [(metric_url_id, url, shard_id, tags, golden rank), ...])
+        """
+        MetricURL = self.modelFactory.create_metric_url()
+        MetricQuery = self.modelFactory.create_metric_queries()
+        queries = {}
+        with self.metricDB.session() as session:
+            stmt = select(MetricQuery.id, MetricQuery.keyword, MetricQuery.tags, MetricURL.id, MetricURL.url, MetricURL.shard_id, MetricURL.rank)\
+                .join(MetricURL, MetricURL.query_id == MetricQuery.id)\
+                .where(
+                    and_(
+                        MetricQuery.batch_id == self.batch_id,
+                        or_(*[MetricQuery.tags.contains([t]) for t in self.tags])
+                    )
+                )\
+                .execution_options(yield_per=10000)
+            for query_id, keyword, tags, url_id, url, shard_id, rank in session.execute(stmt):
+                queries.setdefault(query_id, (keyword, []))[1].append((url_id, url, shard_id, tags or [], rank))
+        return queries
+
     def test(self):
-        return
-    # def __init__(self, dataset: Dataset, url, resultDataset: Dataset):
-    #     super().__init__()
-    #     self.dataset = dataset
-    #     self.url = url
-    #     self.resultDataset = resultDataset
-    #     self.resultDataset.clear()
-    
-    # def test(self):
-    #     correct = 0
-    #     total = 0
-    #     parts = self.url.split(':', 1)
-    #     client = typesense.Client({
-    #         'nodes': [{
-    #             'host': os.getenv("TYPESENSE_HOST", parts[0]),
-    #             'port': os.getenv("TYPESENSE_PORT", int(parts[1])),
-    #             'protocol': "http",
-    #         }],
-    #         'api_key': os.getenv("TYPESENSE_API_KEY", "apiapiapi"),
-    #         'connection_timeout_seconds': 10
-    #     })
-
-    #     print(f'Start Measuring Rank, dataset: {self.dataset.path}')
-    #     pbar = tqdm(total=len(self.dataset.getKeys()))
-
-    #     for keyword in self.dataset.getKeys():
-    #         search_parameters = {
-    #             'q': keyword,             # **核心參數：您要搜尋的關鍵詞 (keyword)**
-    #             'query_by': 'content', # **核心參數：要在哪些欄位中搜尋？**
-    #             'sort_by': '_text_match:desc',       # 可選：按某個欄位排序，例如點閱數降序
-    #             'per_page': 10,                    # 可選：每頁結果數
-    #         }
-
-    #         search_result = client.collections["webpages"].documents.search(search_parameters)
-    #         for goldenurl in self.dataset.get(keyword)['url']:
-    #             total += 1
-    #             find = False
-    #             for hit in search_result['hits']:
-    #                 document_data = hit['document']['url']
-    #                 if document_data == goldenurl:
-    #                     correct += 1
-    #                     find = True
-    #                     break
-    #             if self.resultDataset.get(keyword) == None:
-    #                 self.resultDataset.store(keyword, [{'url': goldenurl, 'rank_find': find}])
-    #             else:
-    #                 self.resultDataset.get(keyword).append({'url': goldenurl, 'rank_find': find})
-    #         pbar.update(1)
-    #     pbar.close()
-    #     print(f'Rank Performance: {correct} / {total}')
-    #     self.resultDataset.store("__total__", {
-    #         "rank_find": correct,
-    #         "total": total
-    #     })
-    #     self.resultDataset.dump()
\ No newline at end of file
+        print(f'🚀 Start Measuring Rank (Batch: {self.batch_id}, Tag: {self.tag}, Typesense: {self.url})')
+        today_date = datetime.now().date()
+
+        queries = self._load_golden()
+        if not queries:
+            print(f"⚠️ No URLs found for Batch {self.batch_id} with tag '{self.tag}'. Exiting.")
+            return
+
+        results = self._search_all(queries, "Rank")
+
+        # url_id -> is_ranked；每個標籤的 Total / A / B 統計
+        ranked = {}
+        stats = {tag: {s: {"total": 0, "ranked": 0} for s in self.SUFFIXES} for tag in self.tags}
+        for query_id, hits in results.items():
+            for url_id, url, shard_id, tags, _ in queries[query_id][1]:
+                is_ranked = url in hits
+                ranked[url_id] = is_ranked
+
+                groups = ["Total"]
+                if shard_id is not None and 0 <= shard_id < 128:
+                    groups.append("A")
+                elif shard_id is not None and 128 <= shard_id < 256:
+                    groups.append("B")
+                for tag in self.tags:
+                    if tag not in tags:
+                        continue
+                    for g in groups:
+                        stats[tag][g]["total"] += 1
+                        stats[tag][g]["ranked"] += is_ranked
+
+        if self.dry_run:
+            print("🧪 Dry run: MetricDB not updated.")
+        else:
+            self._save(today_date, ranked, stats)
+
+        for tag in self.tags:
+            print("\n" + "="*60)
+            print(f"📊 Rank Report - Tag: {tag} (Top {self.per_page})")
+            print("="*60)
+            for suffix in self.SUFFIXES:
+                d = stats[tag][suffix]
+                rate = d["ranked"] / d["total"] * 100 if d["total"] > 0 else 0.0
+                print(f"{suffix:<12} | {d['ranked']:>8} / {d['total']:<8} | {rate:>9.2f}%")
+            print("="*60 + "\n")
+
+    def _save(self, today_date, ranked: dict, stats: dict):
+        """
+        寫回 metric_url.is_ranked，並 Upsert 各標籤 Coverage 表的 ranked_num / ranked_rate
+        """
+        print("💾 Saving results to MetricDB...")
+        with self.metricDB.session() as session:
+            self._write_back(session, ranked)
+
+            for tag, suffix in ((t, s) for t in self.tags for s in self.SUFFIXES):
+                set_type = f"{tag.capitalize()}Set"
+                d = stats[tag][suffix]
+                try:
+                    ModelClass = self.modelFactory.create_metric_coverage_model(set_type, suffix)
+                except Exception as e:
+                    print(f"   [Warning] Could not create model for {set_type}_{suffix}: {e}")
+                    continue
+
+                # 只更新 ranked 欄位，不覆蓋 CrawlerAllMetricMeasure 寫入的覆蓋率
+                ranked_data = {
+                    "ranked_num": d["ranked"],
+                    "ranked_rate": d["ranked"] / d["total"] if d["total"] > 0 else 0.0
+                }
+                stmt = insert(ModelClass).values({"stat_date": today_date, **ranked_data})
+                stmt = stmt.on_conflict_do_update(index_elements=['stat_date'], set_=ranked_data)
+                session.execute(stmt)
+
+            session.commit()
+            print("✅ MetricDB Updated Successfully.")
+
+    def _write_back(self, session, ranked: dict):
+        """
+        (id, is_ranked) COPY 進暫存表後以一條 UPDATE ... FROM 套用 (在呼叫端的 Transaction 內)
+        """
+        if not ranked:
+            return
+        session.execute(text("""
+            CREATE TEMP TABLE metric_url_rank (
+                id BIGINT PRIMARY KEY,
+                is_ranked BOOLEAN NOT NULL
+            ) ON COMMIT DROP
+        """))
+        copyRows(session, "metric_url_rank", ["id", "is_ranked"], ((url_id, 't' if v else 'f') for url_id, v in ranked.items()))
+        updated = session.execute(text("""
+            UPDATE metric_url AS m
+            SET is_ranked = t.is_ranked
+            FROM metric_url_rank AS t
+            WHERE m.id = t.id AND m.is_ranked IS DISTINCT FROM t.is_ranked
+        """)).rowcount
+        print(f"   MetricURL rows changed: {updated:,} / {len(ranked):,}")
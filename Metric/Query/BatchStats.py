@@ -0,0 +1,103 @@
+from Database.ModelFactory.AppModelFactory import AppModelFactory
+from sqlalchemy import text
+
+# 一條 SQL 算出 Batch 內每個 tag 的 Query / URL 數與總數
+# 先把 URL 數聚合到每個 Query，再展開 tags；tag 為 NULL 的那一列是整個 Batch 的總數
+STATS_SQL = text("""
+    WITH q AS (
+        SELECT q.id, q.tags, coalesce(u.n, 0) AS urls
+        FROM metric_queries AS q
+        LEFT JOIN (
+            SELECT u.query_id, count(*) AS n
+            FROM metric_url AS u
+            JOIN metric_queries AS mq ON mq.id = u.query_id
+            WHERE mq.batch_id = :batch_id
+            GROUP BY u.query_id
+        ) AS u ON u.query_id = q.id
+        WHERE q.batch_id = :batch_id
+    )
+    SELECT tag, count(*) AS queries, coalesce(sum(urls), 0) AS urls
+    FROM (
+        SELECT t.tag, q.urls
+        FROM q CROSS JOIN LATERAL jsonb_array_elements_text(coalesce(q.tags, '[]'::jsonb)) AS t(tag)
+        UNION ALL
+        SELECT NULL, q.urls FROM q
+    ) AS x
+    GROUP BY tag
+""")
+
+class BatchStats:
+    """
+    MetricBatch 的 Metadata (meta_tag_stats / meta_total_queries / meta_total_urls)
+
+    - refresh():     一條 SQL 全部重算並寫回
+    - apply_delta(): 由 GoldenSetWriter 在每次寫入的同一個 Transaction 內增量更新，不必重算
+    """
+    def __init__(self, modelFactory: AppModelFactory):
+        self.modelFactory = modelFactory
+
+    @staticmethod
+    def empty_delta() -> dict:
+        return {"queries": 0, "urls": 0, "tags": {}}
+
+    @staticmethod
+    def record(delta: dict, old, new):
+        """
+        記錄一個 Query 的變化
+        old / new: (tags, url 數)；old 為 None 表示新的 Query
+        """
+        new_tags, new_urls = new
+        old_tags, old_urls = old if old is not None else ([], 0)
+        if old is None:
+            delta["queries"] += 1
+        delta["urls"] += new_urls - old_urls
+
+        for tag, queries, urls in [(t, -1, -old_urls) for t in old_tags] + [(t, 1, new_urls) for t in new_tags]:
+            tag_delta = delta["tags"].setdefault(tag, {"queries": 0, "urls": 0})
+            tag_delta["queries"] += queries
+            tag_delta["urls"] += urls
+
+    def compute(self, session, batch_id: int) -> dict:
+        stats = {"queries": 0, "urls": 0, "tags": {}}
+        for tag, queries, urls in session.execute(STATS_SQL, {"batch_id": batch_id}):
+            if tag is None:
+                stats["queries"] = int(queries)
+                stats["urls"] = int(urls)
+            else:
+                stats["tags"][tag] = {"queries": int(queries), "urls": int(urls)}
+        return stats
+
+    def write(self, session, batch_id: int, stats: dict):
+        MetricBatch = self.modelFactory.create_metric_batches()
+        batch = session.get(MetricBatch, batch_id, with_for_update=True)
+        if not batch:
+            return
+        batch.meta_tag_stats = stats["tags"]
+        batch.meta_total_queries = stats["queries"]
+        batch.meta_total_urls = stats["urls"]
+
+    def refresh(self, db, batch_id: int) -> dict:
+        with db.session() as session:
+            stats = self.compute(session, batch_id)
+            self.write(session, batch_id, stats)
+            session.commit()
+        return stats
+
+    def apply_delta(self, session, batch_id: int, delta: dict):
+        """
+        鎖住 Batch 列後把增量加上去 (呼叫端負責 commit，與資料寫入同一個 Transaction)
+        """
+        MetricBatch = self.modelFactory.create_metric_batches()
+        batch = session.get(MetricBatch, batch_id, with_for_update=True)
+        if not batch:
+            return
+
+        tag_stats = {tag: dict(v) for tag, v in (batch.meta_tag_stats or {}).items()}
+        for tag, d in delta["tags"].items():
+            current = tag_stats.setdefault(tag, {"queries": 0, "urls": 0})
+            current["queries"] = current.get("queries", 0) + d["queries"]
+            current["urls"] = current.get("urls", 0) + d["urls"]
+
+        batch.meta_tag_stats = tag_stats
+        batch.meta_total_queries = (batch.meta_total_queries or 0) + delta["queries"]
+        batch.meta_total_urls = (batch.meta_total_urls or 0) + delta["urls"]
@@ -0,0 +1,162 @@
+from Database.Database import Database
+from Database.ModelFactory.AppModelFactory import AppModelFactory
+from Metric.Query.BatchStats import BatchStats
+from sqlalchemy import select, delete, update, text, case, func
+from sqlalchemy.dialects.postgresql import insert
+
+class GoldenSetWriter:
+    """
+    Golden Set 批次寫入器
+
+    - 開始時一次讀出 Batch 內既有的 keyword (-> id, tags)
+    - 每 commit_every 個關鍵字寫入一次：
+        1. MetricQuery 以 INSERT ... ON CONFLICT (batch_id, keyword) Upsert，既有的只合併 tag
+        2. 一條 DELETE 清掉這批 Query 的舊 URL
+        3. MetricURL 以 multi-row INSERT 寫入
+      並在同一個 Transaction 內 commit
+    - 有 stats 時，同一個 Transaction 內以增量更新 Batch Metadata (不必事後重算)
+    - 資料庫沒有 (batch_id, keyword) 唯一索引時 (舊資料有重複、尚未執行 migrate_db)，
+      改以 preload 的 keyword 判斷 INSERT 或只合併 tag 的 UPDATE
+    """
+    def __init__(self, db: Database, modelFactory: AppModelFactory, batch_id: int, tag: str, commit_every: int = 50,
+                 stats: BatchStats = None):
+        self.db = db
+        self.modelFactory = modelFactory
+        self.batch_id = batch_id
+        self.tag = tag
+        self.commit_every = commit_every
+        self.stats: BatchStats = stats
+
+        self.MetricQuery = self.modelFactory.create_metric_queries()
+        self.MetricURL = self.modelFactory.create_metric_url()
+
+        self._buffer = {}
+        self.existing = {}
+        self.written = 0
+
+        self.unique_index = self.ensure_index()
+        self.preload()
+
+    def ensure_index(self) -> bool:
+        """
+        ON CONFLICT 需要 (batch_id, keyword) 的唯一索引，由 migrate_db 合併重複的 Query 後建立；
+        這裡只檢查是否存在 (寫入流程不做 DDL)，沒有的話回傳 False 改用逐筆判斷的寫法
+        """
+        with self.db.session() as session:
+            exists = session.execute(text("SELECT to_regclass('uq_metric_queries_batch_keyword')")).scalar() is not None
+        if not exists:
+            print("   [Warning] uq_metric_queries_batch_keyword is missing; "
+                  "run `python -m IndexSelection.migrate_db --metric_database ...`. Falling back to per-keyword upsert.")
+        return exists
+
+    def preload(self):
+        """
+        existing: keyword -> (query_id, tags, url 數)
+        """
+        MetricQuery = self.MetricQuery
+        MetricURL = self.MetricURL
+        with self.db.session() as session:
+            stmt = select(MetricQuery.keyword, MetricQuery.id, MetricQuery.tags, func.count(MetricURL.id))\
+                .outerjoin(MetricURL, MetricURL.query_id == MetricQuery.id)\
+                .where(MetricQuery.batch_id == self.batch_id)\
+                .group_by(MetricQuery.id)
+            self.existing = {
+                keyword: (query_id, list(tags or []), url_num)
+                for keyword, query_id, tags, url_num in session.execute(stmt)
+            }
+
+    def add(self, item: dict, urls: list):
+        """
+        item: RawData 的一筆 (keyword, frequency, geo)
+        同一個關鍵字重複加入時以第一筆為準
+        """
+        keyword = item['keyword']
+        if keyword in self._buffer:
+            return
+        self._buffer[keyword] = (item, urls)
+        if len(self._buffer) >= self.commit_every:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        MetricURL = self.MetricURL
+
+        query_rows = [
+            {
+                "batch_id": self.batch_id,
+                "keyword": keyword,
+                "geo": item.get('geo', []),
+                "frequency": item['frequency'],
+                "tags": [self.tag]
+            }
+            for keyword, (item, _) in self._buffer.items()
+        ]
+
+        with self.db.session() as session:
+            returned = self._upsert_queries(session, query_rows)
+            query_ids = {keyword: query_id for keyword, query_id, _ in returned}
+
+            # 重跑時先清掉這批 Query 舊的 URL，避免重複
+            session.execute(delete(MetricURL).where(MetricURL.query_id.in_(list(query_ids.values()))))
+
+            url_rows = [
+                {"query_id": query_ids[keyword], "url": u, "rank": idx + 1}
+                for keyword, (_, urls) in self._buffer.items()
+                for idx, u in enumerate(urls)
+            ]
+            if url_rows:
+                session.execute(insert(MetricURL), url_rows)
+
+            if self.stats:
+                delta = BatchStats.empty_delta()
+                for keyword, _, tags in returned:
+                    old = self.existing.get(keyword)
+                    BatchStats.record(delta, (old[1], old[2]) if old else None, (list(tags or []), len(self._buffer[keyword][1])))
+                self.stats.apply_delta(session, self.batch_id, delta)
+
+            session.commit()
+
+        for keyword, query_id, tags in returned:
+            self.existing[keyword] = (query_id, list(tags or []), len(self._buffer[keyword][1]))
+        self.written += len(self._buffer)
+        self._buffer = {}
+
+    def _upsert_queries(self, session, query_rows: list) -> list:
+        """
+        回傳 [(keyword, id, tags), ...]；既有的 Query 只合併 tag (不重複)，geo / frequency 維持原值
+        """
+        MetricQuery = self.MetricQuery
+        returning = (MetricQuery.keyword, MetricQuery.id, MetricQuery.tags)
+        if self.unique_index:
+            stmt = insert(MetricQuery).values(query_rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['batch_id', 'keyword'],
+                set_={
+                    "tags": case(
+                        (MetricQuery.tags.contains([self.tag]), MetricQuery.tags),
+                        else_=MetricQuery.tags.op('||')(stmt.excluded.tags)
+                    )
+                }
+            ).returning(*returning)
+            return session.execute(stmt).all()
+
+        returned = []
+        new_rows = [row for row in query_rows if row["keyword"] not in self.existing]
+        old_ids = [self.existing[row["keyword"]][0] for row in query_rows if row["keyword"] in self.existing]
+        if new_rows:
+            returned += session.execute(insert(MetricQuery).values(new_rows).returning(*returning)).all()
+        if old_ids:
+            stmt = update(MetricQuery)\
+                .where(MetricQuery.id.in_(old_ids))\
+                .values(tags=case(
+                    (MetricQuery.tags.contains([self.tag]), MetricQuery.tags),
+                    else_=MetricQuery.tags.op('||')(func.jsonb_build_array(self.tag))
+                ))\
+                .returning(*returning)\
+                .execution_options(synchronize_session=False)
+            returned += session.execute(stmt).all()
+        return returned
+
+    def close(self):
+        self.flush()
@@ -1,14 +1,32 @@
-from serpapi import GoogleSearch
+from Metric.Query.Search.AsyncSearchClient import AsyncSearchClient
+from Metric.Query.Search.SerpCache import SerpCache
 import time
 import os
 
 class QueryStrategy:
-    def __init__(self, rawData: list, keywordNums: int):
+    def __init__(self, rawData: list, keywordNums: int, searchClient: AsyncSearchClient = None, cache: SerpCache = None):
+        """
+        :param searchClient: 並行搜尋客戶端；沒有的話逐筆呼叫 getQuery
+        :param cache: SERP 快取 (getQuery 使用；並行模式由 searchClient 自己的快取處理)
+        """
         self.rawData: list = rawData
         self.keywordNums: int = keywordNums
+        self.searchClient: AsyncSearchClient = searchClient
+        self.cache: SerpCache = cache
 
     def getGoldenSet(self):
         pass
+
+    def getQueries(self, keywords: list, nums=10):
+        """
+        依完成順序 yield (index, urls)，index 為 keywords 中的位置
+        有 searchClient 時並行查詢 (受 API 速率上限控制)，否則逐筆呼叫 getQuery
+        """
+        if self.searchClient:
+            yield from self.searchClient.iter_results(enumerate(keywords), nums)
+            return
+        for i, keyword in enumerate(keywords):
+            yield i, self.getQuery(keyword, nums)
     
     def getQuery(self, query, nums=10, max_retries=3, initial_delay=15):
         """
@@ -16,6 +34,13 @@ class QueryStrategy:
             max_retries (int): 最大重試次數
             initial_delay (int): 初始等待秒數 (會隨著重試次數增加)
         """
+        from serpapi import GoogleSearch
+
+        if self.cache:
+            cached = self.cache.get("google", query, nums)
+            if cached is not None:
+                return cached
+
         for attempt in range(max_retries):
             try:
                 params = {
@@ -34,6 +59,8 @@ class QueryStrategy:
 
                 # 成功取得資料
                 urls = [r["link"] for r in results.get("organic_results", []) if "link" in r]
+                if self.cache:
+                    self.cache.put("google", query, urls, nums)
                 return urls
 
             except Exception as e:
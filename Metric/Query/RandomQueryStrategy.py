@@ -1,128 +1,61 @@
 from Metric.Query.QueryStrategy import QueryStrategy
+from Metric.Query.GoldenSetWriter import GoldenSetWriter
+from Metric.Query.BatchStats import BatchStats
+from Metric.Query.ReservoirSampler import ReservoirSampler
 from tqdm import tqdm
 import random
-from sqlalchemy import func
 
 class RandomQueryStrategy(QueryStrategy):
-    def __init__(self, db, modelFactory, batch_id, rawData, keywordNums):
+    def __init__(self, db, modelFactory, batch_id, rawData, keywordNums, searchClient=None, cache=None, sampler: ReservoirSampler = None):
         """
         :param db: Database instance
         :param modelFactory: AppModelFactory instance
         :param batch_id: 當前執行的 MetricBatch ID
         :param rawData: 原始資料列表
         :param keywordNums: 要隨機選取的數量
+        :param searchClient: 並行搜尋客戶端 (可選)
+        :param cache: SERP 快取 (可選，與其他 Strategy 共用)
+        :param sampler: 串流分層水庫抽樣 (可選)；有的話直接從 DB 串流 Batch 內的 Query 抽樣，不使用 rawData
         """
         # dataset 傳 None
-        super().__init__(rawData, keywordNums)
+        super().__init__(rawData, keywordNums, searchClient, cache)
         self.db = db
         self.modelFactory = modelFactory
         self.batch_id = batch_id
+        self.sampler: ReservoirSampler = sampler
     
     def getGoldenSet(self):
         # 1. 隨機採樣
-        # 注意：如果 rawData 數量小於 keywordNums，sample 會報錯，需做防呆
-        target_num = min(len(self.rawData), self.keywordNums)
-        sample_data = random.sample(self.rawData, target_num)
+        if self.sampler:
+            sample_data = self.sampler.sample_batch(self.db, self.modelFactory, self.batch_id)
+            target_num = len(sample_data)
+        else:
+            # 注意：如果 rawData 數量小於 keywordNums，sample 會報錯，需做防呆
+            target_num = min(len(self.rawData), self.keywordNums)
+            sample_data = random.sample(self.rawData, target_num)
 
         # 準備 Models
-        MetricQuery = self.modelFactory.create_metric_queries()
-        MetricURL = self.modelFactory.create_metric_url()
         MetricBatch = self.modelFactory.create_metric_batches()
 
         print(f"Processing Random Strategy for Batch {self.batch_id} (Target: {target_num})...")
         pbar = tqdm(total=target_num)
 
-        with self.db.session() as session:
-            for s in sample_data:
-                key = s['keyword']
-                
-                # A. 呼叫 SerpApi 取得 URL
-                url_list = self.getQuery(key)
-                
-                # B. 處理 MetricQuery (Upsert Logic)
-                query_obj = session.query(MetricQuery).filter_by(
-                    batch_id=self.batch_id, 
-                    keyword=key
-                ).first()
-
-                if query_obj:
-                    # 情境 1: 關鍵字已存在
-                    # 更新 tags：如果 "random" 不在裡面，就加進去
-                    current_tags = list(query_obj.tags)
-                    if "random" not in current_tags:
-                        current_tags.append("random")
-                        query_obj.tags = current_tags
-                else:
-                    # 情境 2: 關鍵字不存在
-                    query_obj = MetricQuery(
-                        batch_id=self.batch_id,
-                        keyword=key,
-                        geo=s.get('geo', []),
-                        frequency=s['frequency'],
-                        tags=["random"] # 標記為 random
-                    )
-                    session.add(query_obj)
-                    session.flush() # 取得 ID
-                
-                # C. 處理 MetricURL
-                # 先清空舊 URL (防重複執行)
-                session.query(MetricURL).filter_by(query_id=query_obj.id).delete()
+        # 批次寫入：每 commit_every 個關鍵字 Upsert 一次 Query / URL 並 commit
+        # Batch Metadata 在每次寫入時增量更新，不再事後重算
+        writer = GoldenSetWriter(self.db, self.modelFactory, self.batch_id, "random", stats=BatchStats(self.modelFactory))
 
-                # 寫入新 URL
-                for idx, u in enumerate(url_list):
-                    url_obj = MetricURL(
-                        query_id=query_obj.id,
-                        url=u,
-                        rank=idx + 1
-                    )
-                    session.add(url_obj)
+        # A. 呼叫 SerpApi 取得 URL (並行查詢時依完成順序處理)
+        # 注意：這裡會消耗 API 額度與時間
+        for i, url_list in self.getQueries([s['keyword'] for s in sample_data]):
+            # B. / C. 交給 writer 處理 MetricQuery (Upsert + tag 合併) 與 MetricURL (先刪舊的再批次寫入)
+            writer.add(sample_data[i], url_list)
+            pbar.update(1)
+        writer.close()
 
-                # Commit 每筆交易
-                session.commit()
-                pbar.update(1)
-
-            # D. 最後更新 Batch Metadata
-            self._update_batch_stats(session, MetricBatch, MetricQuery, MetricURL)
+        # D. Batch Metadata 已由 writer 更新，這裡只讀出來顯示
+        with self.db.session() as session:
+            batch = session.get(MetricBatch, self.batch_id)
+            d = (batch.meta_tag_stats or {}).get("random", {}) if batch else {}
+        print(f"Batch {self.batch_id} Stats Updated: Random Queries={d.get('queries', 0)}, Random URLs={d.get('urls', 0)}")
             
         pbar.close()
-
-    def _update_batch_stats(self, session, MetricBatch, MetricQuery, MetricURL):
-        """
-        重新計算並更新 Batch 的 Metadata
-        """
-        batch = session.get(MetricBatch, self.batch_id)
-        if not batch:
-            return
-
-        # 1. 計算 Random Set 的統計數據
-        random_q_count = session.query(MetricQuery).filter(
-            MetricQuery.batch_id == self.batch_id,
-            MetricQuery.tags.contains(["random"])
-        ).count()
-
-        random_u_count = session.query(MetricURL).join(MetricQuery).filter(
-            MetricQuery.batch_id == self.batch_id,
-            MetricQuery.tags.contains(["random"])
-        ).count()
-
-        # 2. 更新 meta_tag_stats
-        # 必須先讀取現有的 dict，再更新 random 的部分，以免覆蓋掉 head 的數據
-        current_stats = dict(batch.meta_tag_stats) if batch.meta_tag_stats else {}
-        
-        current_stats['random'] = {
-            "queries": random_q_count,
-            "urls": random_u_count
-        }
-        batch.meta_tag_stats = current_stats
-
-        # 3. 更新全域總量 (Total Stats)
-        total_q = session.query(MetricQuery).filter_by(batch_id=self.batch_id).count()
-        total_u = session.query(MetricURL).join(MetricQuery).filter(
-            MetricQuery.batch_id == self.batch_id
-        ).count()
-
-        batch.meta_total_queries = total_q
-        batch.meta_total_urls = total_u
-
-        session.commit()
-        print(f"Batch {self.batch_id} Stats Updated: Random Queries={random_q_count}, Random URLs={random_u_count}")
\ No newline at end of file
@@ -0,0 +1,106 @@
+from Database.Database import Database
+from Database.ModelFactory.AppModelFactory import AppModelFactory
+from sqlalchemy import select
+import math
+import random
+
+class ReservoirSampler:
+    """
+    串流分層水庫抽樣 (Reservoir Sampling, Algorithm R)
+
+    - 每個分層 (主要 geo / 頻率級距) 各保留一個容量 k 的水庫，記憶體只跟分層數有關，不隨候選數量成長
+    - 結束時依各分層的實際數量按比例分配 k 個名額 (最大餘數法)，再從各水庫中均勻抽出
+    - 同樣的 seed 與同樣的輸入順序會得到同樣的結果
+    """
+    STRATA = ("geo", "band")
+
+    def __init__(self, k: int, seed: int = None, stratify=("geo", "band")):
+        """
+        :param k: 要抽出的數量
+        :param stratify: 分層依據，可為 "geo" (第一個 geo)、"band" (頻率的 10 的次方級距)；空的表示不分層
+        """
+        unknown = set(stratify) - set(self.STRATA)
+        if unknown:
+            raise ValueError(f"Unknown strata: {sorted(unknown)}")
+        self.k = k
+        self.stratify = tuple(stratify)
+        self.random = random.Random(seed)
+        self.reservoirs = {}
+        self.counts = {}
+
+    def _stratum(self, item: dict) -> tuple:
+        key = []
+        for s in self.stratify:
+            if s == "geo":
+                geo = item.get('geo') or []
+                key.append(geo if isinstance(geo, str) else (geo[0] if geo else None))
+            elif s == "band":
+                key.append(int(math.log10(max(item.get('frequency') or 0, 1))))
+        return tuple(key)
+
+    def add(self, item: dict):
+        stratum = self._stratum(item)
+        reservoir = self.reservoirs.setdefault(stratum, [])
+        n = self.counts.get(stratum, 0) + 1
+        self.counts[stratum] = n
+
+        if len(reservoir) < self.k:
+            reservoir.append(item)
+        else:
+            j = self.random.randrange(n)
+            if j < self.k:
+                reservoir[j] = item
+
+    def _allocate(self) -> dict:
+        """
+        依各分層數量按比例分配名額；某分層水庫不足時，剩下的名額讓給其他分層
+        """
+        total = sum(self.counts.values())
+        target = min(self.k, total)
+        if target == 0:
+            return {}
+
+        exact = {s: target * n / total for s, n in self.counts.items()}
+        quota = {s: min(int(v), len(self.reservoirs[s])) for s, v in exact.items()}
+        # 依小數部分由大到小補齊 (同分時依分層排序，保持可重現)
+        order = sorted(exact, key=lambda s: (-(exact[s] - int(exact[s])), repr(s)))
+        while sum(quota.values()) < target:
+            progressed = False
+            for s in order:
+                if sum(quota.values()) >= target:
+                    break
+                if quota[s] < len(self.reservoirs[s]):
+                    quota[s] += 1
+                    progressed = True
+            if not progressed:
+                break
+        return quota
+
+    def result(self) -> list:
+        samples = []
+        for stratum, quota in sorted(self._allocate().items(), key=lambda x: repr(x[0])):
+            samples.extend(self.random.sample(self.reservoirs[stratum], quota))
+        self.random.shuffle(samples)
+        return samples
+
+    def sample(self, items) -> list:
+        for item in items:
+            self.add(item)
+        return self.result()
+
+    def sample_batch(self, db: Database, modelFactory: AppModelFactory, batch_id: int, chunk_size: int = 10000) -> list:
+        """
+        以 Server-side Cursor 串流讀取 Batch 內的候選 Query (依 id 排序，確保可重現)，不把整個 Batch 載入記憶體
+        """
+        MetricQuery = modelFactory.create_metric_queries()
+        stmt = select(MetricQuery.keyword, MetricQuery.frequency, MetricQuery.geo)\
+            .where(MetricQuery.batch_id == batch_id)\
+            .order_by(MetricQuery.id)\
+            .execution_options(yield_per=chunk_size)
+
+        with db.session() as session:
+            for keyword, frequency, geo in session.execute(stmt):
+                self.add({"keyword": keyword, "frequency": frequency, "geo": geo})
+
+        print(f"Reservoir sampled {sum(self.counts.values())} candidates in {len(self.counts)} strata")
+        return self.result()
@@ -0,0 +1,123 @@
+from Metric.Query.Search.SearchBackend import SearchBackend, SearchError
+from Metric.Query.Search.TokenBucket import TokenBucket
+from Metric.Query.Search.SerpCache import SerpCache
+import asyncio
+import queue
+import random
+import threading
+
+_DONE = object()
+
+class AsyncSearchClient:
+    """
+    並行搜尋客戶端
+
+    - Token Bucket 限制每秒請求數 (API 速率上限)
+    - Semaphore 限制同時在途的請求數
+    - 失敗時以 Full Jitter 指數退避重試，不可重試的錯誤直接放棄
+    整體吞吐量由 API 速率上限決定，不再受單次請求延遲影響。
+    """
+    def __init__(self, backend: SearchBackend, rate: float = 1.0, burst: int = 1, concurrency: int = 8,
+                 max_retries: int = 3, base_delay: float = 2.0, max_delay: float = 60.0, cache: SerpCache = None):
+        """
+        :param rate: 每秒最多送出幾個請求
+        :param burst: Token Bucket 容量 (允許的瞬間突發量)
+        :param concurrency: 同時在途的請求上限
+        :param max_retries: 最多嘗試次數
+        :param base_delay: 退避的基準秒數 (第 n 次重試最多等 base_delay * 2^n)
+        :param cache: SERP 快取；命中時直接回傳，不佔用速率額度
+        """
+        self.backend = backend
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.cache: SerpCache = cache
+
+    async def _search_one(self, bucket: TokenBucket, semaphore: asyncio.Semaphore, query: str, num: int) -> list:
+        # SerpCache 是同步的 SQLite I/O，丟到 Thread Pool 執行，不阻塞 Event Loop 上的其他請求
+        loop = asyncio.get_running_loop()
+        if self.cache:
+            cached = await loop.run_in_executor(None, self.cache.get, self.backend.name, query, num)
+            if cached is not None:
+                return cached
+
+        for attempt in range(self.max_retries):
+            async with semaphore:
+                await bucket.acquire()
+                try:
+                    urls = await self.backend.search(query, num)
+                except SearchError as e:
+                    error = e
+                except Exception as e:
+                    error = SearchError(str(e))
+                else:
+                    if self.cache:
+                        await loop.run_in_executor(None, self.cache.put, self.backend.name, query, urls, num)
+                    return urls
+
+            print(f"[Attempt {attempt + 1}/{self.max_retries}] '{query}' failed: {error}")
+            if not error.retryable or attempt == self.max_retries - 1:
+                break
+            # 退避期間不佔用 Semaphore，讓其他請求繼續進行
+            await asyncio.sleep(random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt))))
+
+        print(f"'{query}' gave up. Returning empty list.")
+        return []
+
+    async def search_all(self, items, num: int = 10):
+        """
+        items: iterable of (key, query)
+        以完成順序 yield (key, urls)
+        """
+        bucket = TokenBucket(self.rate, self.burst)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(key, query):
+            return key, await self._search_one(bucket, semaphore, query, num)
+
+        tasks = [asyncio.create_task(run(key, query)) for key, query in items]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def iter_results(self, items, num: int = 10):
+        """
+        同步版本：Event Loop 在背景 Thread 執行，呼叫端 (e.g. 寫 DB 的 Strategy) 依完成順序逐筆取得 (key, urls)
+        """
+        results = queue.Queue()
+        stop = threading.Event()
+        items = list(items)
+
+        async def produce():
+            async for item in self.search_all(items, num):
+                if stop.is_set():
+                    break
+                results.put(item)
+
+        def worker():
+            try:
+                asyncio.run(produce())
+            except BaseException as e:
+                results.put(e)
+            finally:
+                results.put(_DONE)
+
+        thread = threading.Thread(target=worker, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = results.get()
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            thread.join()
@@ -0,0 +1,31 @@
+from Metric.Query.Search.SearchBackend import SearchBackend, SearchError
+import asyncio
+import hashlib
+import random
+
+class FakeSearchBackend(SearchBackend):
+    """
+    本機假後端 (不連網、不耗額度)，用於測試與壓測 Golden Set 流程
+    同一個 query 永遠回傳相同的 URL；可模擬延遲與暫時性失敗
+    """
+    name = "fake"
+
+    def __init__(self, latency: float = 0.2, failure_rate: float = 0.0, domains: int = 50, seed: int = 0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.domains = domains
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    async def search(self, query: str, num: int = 10) -> list:
+        self.calls += 1
+        await asyncio.sleep(self.random.uniform(0.5, 1.5) * self.latency)
+        if self.random.random() < self.failure_rate:
+            raise SearchError("Fake transient failure")
+
+        digest = hashlib.blake2b(query.encode('utf-8'), digest_size=8).hexdigest()
+        urls = []
+        for rank in range(num):
+            domain = int(digest[rank % 16], 16) * 7 + rank
+            urls.append(f"https://site{domain % self.domains}.example.com/{digest}/{rank + 1}")
+        return urls
@@ -0,0 +1,20 @@
+class SearchError(Exception):
+    """
+    搜尋失敗；retryable 為 False 時 (e.g. API Key 錯誤、額度用完) 不再重試
+    """
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class SearchBackend:
+    """
+    搜尋後端 (Strategy)：AsyncSearchClient 透過它取得搜尋結果
+    """
+    name = "base"
+
+    async def search(self, query: str, num: int = 10) -> list:
+        """
+        回傳結果 URL 列表 (依排名)，失敗時丟出 SearchError
+        """
+        raise NotImplementedError
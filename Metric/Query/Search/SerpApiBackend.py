@@ -0,0 +1,45 @@
+from Metric.Query.Search.SearchBackend import SearchBackend, SearchError
+import asyncio
+import os
+
+# 這些錯誤重試也不會成功
+FATAL_ERRORS = ("Invalid API key", "run out of searches", "account has been")
+
+class SerpApiBackend(SearchBackend):
+    """
+    SerpApi Google Search
+    serpapi 套件是同步的，放到 Thread 執行，不會卡住 Event Loop
+    """
+    name = "google"
+
+    def __init__(self, api_key: str = None, engine: str = "google"):
+        self.api_key = api_key or os.environ.get('SERPAPI_KEY')
+        self.engine = engine
+        self.name = engine
+
+    def _search(self, query: str, num: int) -> list:
+        from serpapi import GoogleSearch
+
+        params = {
+            "engine": self.engine,
+            "q": query,
+            "num": num,
+            "api_key": self.api_key
+        }
+        try:
+            results = GoogleSearch(params).get_dict()
+        except Exception as e:
+            raise SearchError(f"SerpApi request failed: {e}")
+
+        # SerpApi 有時會回傳 200 OK 但內容包含 error 欄位
+        if "error" in results:
+            error = str(results["error"])
+            # 沒有結果不是錯誤
+            if "hasn't returned any results" in error:
+                return []
+            raise SearchError(f"SerpApi Error: {error}", retryable=not any(e in error for e in FATAL_ERRORS))
+
+        return [r["link"] for r in results.get("organic_results", []) if "link" in r]
+
+    async def search(self, query: str, num: int = 10) -> list:
+        return await asyncio.to_thread(self._search, query, num)
@@ -0,0 +1,106 @@
+from datetime import datetime, timezone, timedelta
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+class SerpCache:
+    """
+    SerpApi 回應的磁碟快取 (SQLite)
+
+    Key = (engine, query, num, geo, 日期區間)：同一區間內的重跑與 Head / Random 之間重疊的關鍵字都不再呼叫 API
+    - ttl:       超過存活時間的項目視為不存在，寫入時順便清除
+    - max_bytes: 總大小超過上限時，依最後存取時間淘汰 (LRU)
+    只快取成功的回應，失敗不寫入。
+    """
+    def __init__(self, path: str, ttl: timedelta = timedelta(days=7), bucket_days: int = 1, max_bytes: int = 256 * 1024 * 1024):
+        """
+        :param bucket_days: 日期區間長度 (天)；跨區間就會重新查詢，確保結果不會比區間更舊
+        """
+        self.path = path
+        self.ttl = ttl
+        self.bucket_days = max(1, bucket_days)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 搜尋客戶端在背景 Thread 使用，同一條連線以 Lock 保護
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS serp_cache (
+                key TEXT PRIMARY KEY,
+                engine TEXT NOT NULL,
+                query TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_serp_cache_accessed_at ON serp_cache (accessed_at)")
+        self._conn.commit()
+
+    def _bucket(self) -> int:
+        return (datetime.now(timezone.utc).date().toordinal()) // self.bucket_days
+
+    def _key(self, engine, query, num, geo) -> str:
+        raw = json.dumps([engine, query, num, geo, self._bucket()], ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, engine: str, query: str, num=None, geo=None):
+        """
+        回傳快取的內容，沒有或已過期回傳 None
+        """
+        key = self._key(engine, query, num, geo)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM serp_cache WHERE key = ? AND created_at >= ?",
+                (key, now - self.ttl.total_seconds())
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE serp_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, engine: str, query: str, value, num=None, geo=None):
+        key = self._key(engine, query, num, geo)
+        payload = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO serp_cache (key, engine, query, payload, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, engine, query, payload, len(payload), now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM serp_cache WHERE created_at < ?", (now - self.ttl.total_seconds(),))
+        total = self._conn.execute("SELECT coalesce(sum(size), 0) FROM serp_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # 淘汰到上限的 90%，避免每次寫入都觸發
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM serp_cache ORDER BY accessed_at"):
+            if freed >= target:
+                break
+            victims.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM serp_cache WHERE key = ?", victims)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
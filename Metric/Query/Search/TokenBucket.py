@@ -0,0 +1,30 @@
+import asyncio
+import time
+
+class TokenBucket:
+    """
+    asyncio Token Bucket：每秒補充 rate 個 Token，最多累積 burst 個
+    acquire() 在 Token 不足時等待，呼叫端不需自行 sleep
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        # 持有 Lock 等待，確保取得 Token 的順序與呼叫順序一致 (FIFO)
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
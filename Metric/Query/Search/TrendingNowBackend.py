@@ -0,0 +1,45 @@
+from Metric.Query.Search.SearchBackend import SearchBackend, SearchError
+from Metric.Query.Search.SerpApiBackend import FATAL_ERRORS
+import asyncio
+import os
+
+class TrendingNowBackend(SearchBackend):
+    """
+    SerpApi Google Trends Trending Now
+    query 為國家代碼 (geo)，num 為時間範圍 (hours)；回傳 [{keyword, frequency, started, geo}, ...]
+    """
+    name = "google_trends_trending_now"
+
+    def __init__(self, api_key: str = None):
+        self.api_key = api_key or os.environ.get('SERPAPI_KEY')
+
+    def _search(self, geo: str, hours: int) -> list:
+        from serpapi import GoogleSearch
+
+        params = {
+            "engine": self.name,
+            "geo": geo,
+            "api_key": self.api_key,
+            "hours": hours
+        }
+        try:
+            results = GoogleSearch(params).get_dict()
+        except Exception as e:
+            raise SearchError(f"SerpApi request failed: {e}")
+
+        if "error" in results:
+            error = str(results["error"])
+            raise SearchError(f"SerpApi Error: {error}", retryable=not any(e in error for e in FATAL_ERRORS))
+
+        trending_list = []
+        for row in results.get("trending_searches", []):
+            trending_list.append({
+                "keyword": row.get("query"),
+                "frequency": row.get("search_volume") or 0,
+                "started": row.get("start_timestamp"),
+                "geo": geo # 這裡回傳 string，merge 時會轉 list
+            })
+        return trending_list
+
+    async def search(self, query: str, num: int = 168) -> list:
+        return await asyncio.to_thread(self._search, query, num)
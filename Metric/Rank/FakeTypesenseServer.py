@@ -0,0 +1,157 @@
+from Database.Database import Database
+from Database.ModelFactory.AppModelFactory import AppModelFactory
+from sqlalchemy import select
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from collections import defaultdict
+from urllib.parse import parse_qsl
+import json
+import random
+import re
+import threading
+import time
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def tokenize(text: str) -> list:
+    return TOKEN_RE.findall((text or "").lower())
+
+
+class FakeTypesenseServer:
+    """
+    本機假 Typesense (不需要真的搜尋引擎)，用於離線測試與壓測 TypesenseRankMeasure
+
+    只實作 POST /multi_search：以 query_by 欄位的詞彙重疊數排序，回傳 per_page 筆 hits
+    回應格式與 Typesense 相同 ({"results": [{"found", "hits": [{"document": {...}}]}]})；
+    latency 模擬每個 HTTP 請求的來回延遲
+    """
+    def __init__(self, documents: list, collection: str = "webpages", api_key: str = None,
+                 host: str = "127.0.0.1", port: int = 0, latency: float = 0.05):
+        """
+        :param documents: [{"url": ..., "content": ...}, ...]
+        :param port: 0 表示由系統分配
+        """
+        self.documents = documents
+        self.collection = collection
+        self.api_key = api_key
+        self.latency = latency
+        self.requests = 0
+
+        # 每個欄位一份倒排索引：field -> token -> [doc index]
+        self.index = defaultdict(lambda: defaultdict(list))
+        for i, doc in enumerate(documents):
+            for field, value in doc.items():
+                if isinstance(value, str):
+                    for token in set(tokenize(value)):
+                        self.index[field][token].append(i)
+
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    def search(self, params: dict) -> dict:
+        if params.get("collection", self.collection) != self.collection:
+            return {"code": 404, "error": f"Not found: collection {params.get('collection')}"}
+
+        per_page = int(params.get("per_page", 10))
+        scores = defaultdict(int)
+        for field in str(params.get("query_by", "content")).split(","):
+            postings = self.index.get(field.strip(), {})
+            for token in set(tokenize(params.get("q", ""))):
+                for i in postings.get(token, ()):
+                    scores[i] += 1
+
+        ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+        return {
+            "found": len(ranked),
+            "page": 1,
+            "hits": [{"document": self.documents[i], "text_match": score} for i, score in ranked[:per_page]]
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, code: int, body: dict):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if self.path.startswith("/health"):
+                    self._reply(200, {"ok": True})
+                else:
+                    self._reply(404, {"message": "Not Found"})
+
+            def do_POST(self):
+                if server.api_key and self.headers.get("X-TYPESENSE-API-KEY") != server.api_key:
+                    self._reply(401, {"message": "Forbidden - a valid `x-typesense-api-key` header must be sent."})
+                    return
+                if not self.path.startswith("/multi_search"):
+                    self._reply(404, {"message": "Not Found"})
+                    return
+
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                # 共用參數在 query string (Typesense common params)
+                common = {}
+                if "?" in self.path:
+                    common = dict(parse_qsl(self.path.split("?", 1)[1]))
+
+                server.requests += 1
+                time.sleep(server.latency)
+                results = [server.search({**common, **s}) for s in body.get("searches", [])]
+                self._reply(200, {"results": results})
+
+        return Handler
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        print(f"🧪 Fake Typesense listening on {self.url} ({len(self.documents):,} documents)")
+        return self.url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def documents_from_batch(db: Database, modelFactory: AppModelFactory, batch_id: int,
+                             indexed_rate: float = 0.7, noise: int = 5, seed: int = 0) -> list:
+        """
+        由 Batch 的 Golden Set 產生假文件：
+        - 每個 Golden URL 以 indexed_rate 的機率被「索引」，內容為其關鍵字
+        - 每個關鍵字另外產生 noise 筆只含部分詞彙的干擾文件，讓排名不是必中
+        """
+        MetricQuery = modelFactory.create_metric_queries()
+        MetricURL = modelFactory.create_metric_url()
+        rng = random.Random(seed)
+        documents = []
+
+        stmt = select(MetricQuery.keyword, MetricURL.url)\
+            .join(MetricURL, MetricURL.query_id == MetricQuery.id)\
+            .where(MetricQuery.batch_id == batch_id)
+        seen = set()
+        with db.session() as session:
+            for keyword, url in session.execute(stmt):
+                if rng.random() < indexed_rate:
+                    documents.append({"url": url, "content": keyword})
+                if keyword not in seen:
+                    seen.add(keyword)
+                    tokens = tokenize(keyword)
+                    for n in range(noise):
+                        content = " ".join(rng.sample(tokens, max(1, len(tokens) - 1))) if tokens else ""
+                        documents.append({"url": f"https://noise.example.com/{len(documents)}/{n}", "content": content})
+
+        rng.shuffle(documents)
+        return documents
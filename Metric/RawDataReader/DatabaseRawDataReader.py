@@ -1,22 +1,27 @@
 from Metric.RawDataReader.RawDataReader import RawDataReader
-from serpapi import GoogleSearch
+from Metric.Query.Search.SerpCache import SerpCache
+from Metric.Query.Search.AsyncSearchClient import AsyncSearchClient
+from Metric.Query.Search.TrendingNowBackend import TrendingNowBackend
 from datetime import datetime
-from sqlalchemy import desc
-import time
-import os
+from sqlalchemy import desc, insert
 from collections import defaultdict
 
 class DatabaseRawDataReader(RawDataReader):
-    def __init__(self, db, modelFactory, update_day=14):
+    HOURS = 168
+
+    def __init__(self, db, modelFactory, update_day=14, cache: SerpCache = None, searchClient: AsyncSearchClient = None):
         """
         :param db: Database instance (含有 session context manager)
         :param modelFactory: AppModelFactory instance
         :param update_day: 資料快取天數
+        :param cache: SERP 快取 (Trending Now 回應)
+        :param searchClient: Trending Now 的並行客戶端 (backend 需為 TrendingNowBackend)；未指定時每國家一個併發、每秒 1 個請求
         """
         super().__init__()
         self.db = db
         self.modelFactory = modelFactory
         self.update_day = update_day
+        self.cache: SerpCache = cache
         
         self.countries = [
             {"geo": "US", "Country": "United States"},
@@ -30,6 +35,9 @@ class DatabaseRawDataReader(RawDataReader):
             {"geo": "FR", "Country": "France"},
             {"geo": "TW", "Country": "Taiwan"}
         ]
+        self.searchClient: AsyncSearchClient = searchClient or AsyncSearchClient(
+            TrendingNowBackend(), rate=1.0, concurrency=len(self.countries), cache=cache
+        )
     
     def readData(self) -> list:
         """
@@ -38,10 +46,28 @@ class DatabaseRawDataReader(RawDataReader):
         2. 有且未過期 -> 從 DB 讀取
         3. 無或過期 -> 爬取 API -> 存入 DB -> 回傳
         """
+        batch_id = self._fresh_batch_id()
+        if batch_id is not None:
+            return self._fetch_from_db(batch_id)
+
+        # 2. 資料過期或不存在，執行爬蟲並存檔
+        print("Fetch Trending Query from SerpApi...")
+        return self._fetch_from_api_process_and_store()
+
+    def ensureBatch(self):
+        """
+        與 readData 相同的過期判斷，但未過期時不把整個 Batch 讀進記憶體 (e.g. 水庫抽樣直接串流讀取 DB)
+        """
+        if self._fresh_batch_id() is None:
+            print("Fetch Trending Query from SerpApi...")
+            self._fetch_from_api_process_and_store()
+
+    def _fresh_batch_id(self):
+        """
+        最新且未過期 (created_at 在 update_day 內) 的 Batch ID，沒有則回傳 None
+        """
         MetricBatch = self.modelFactory.create_metric_batches()
-        
-        latest_batch = None
-        
+
         # 1. 檢查資料庫最新紀錄
         with self.db.session() as session:
             # 假設 Batch 用於紀錄 trending 來源，我們可以透過 meta_geo_counts 判斷，
@@ -49,17 +75,14 @@ class DatabaseRawDataReader(RawDataReader):
             latest_batch = session.query(MetricBatch)\
                 .order_by(desc(MetricBatch.created_at))\
                 .first()
-            
+
             # 如果有找到資料，且資料夠新 (Created time < update_day)
             if latest_batch:
                 delta = datetime.now() - latest_batch.created_at
                 if delta.days < self.update_day:
                     print(f'Use cached trending data from DB (Batch ID: {latest_batch.id}, Date: {latest_batch.created_at})')
-                    return self._fetch_from_db(latest_batch.id)
-
-        # 2. 資料過期或不存在，執行爬蟲並存檔
-        print("Fetch Trending Query from SerpApi...")
-        return self._fetch_from_api_process_and_store()
+                    return latest_batch.id
+        return None
 
     def _fetch_from_db(self, batch_id: int) -> list:
         """
@@ -85,17 +108,32 @@ class DatabaseRawDataReader(RawDataReader):
     def _fetch_from_api_process_and_store(self) -> list:
         """
         從 API 獲取 -> 去重合併 -> 存入 DB -> 回傳
+        所有國家並行查詢 (共用同一個速率限制)，依完成順序邊收邊合併；
+        總耗時取決於最慢的國家，而不是所有國家相加
         """
-        # 1. 獲取原始資料
-        all_data = []
-        for country in self.countries:
-            trending = self._fetch_trending_now(country["geo"])
-            all_data.extend(trending)
-            # country["query nums"] = len(trending) # 這行在 DB 模式下暫時用不到，統計會存到 Batch metadata
-            
-        # 2. Dedup & Merge Logic
+        # 1. 並行獲取，邊收邊合併 (Dedup & Merge)
         merged_dict = {}
-        for item in all_data:
+        geos = [country["geo"] for country in self.countries]
+        for geo, trending in self.searchClient.iter_results(((geo, geo) for geo in geos), self.HOURS):
+            if trending:
+                print(f'Fetch {geo} Trending Query Success ({len(trending)})')
+            else:
+                print(f'Fetch {geo} Trending Query returned nothing')
+            self._merge(merged_dict, trending)
+
+        dedup_data = list(merged_dict.values())
+
+        # 2. 排序
+        sorted_data = sorted(dedup_data, key=lambda x: x['frequency'], reverse=True)
+
+        # 3. 存入資料庫
+        self._save_to_database(sorted_data)
+        
+        return sorted_data
+
+    @staticmethod
+    def _merge(merged_dict: dict, items: list):
+        for item in items:
             kw = item['keyword']
             
             if kw not in merged_dict:
@@ -108,7 +146,7 @@ class DatabaseRawDataReader(RawDataReader):
                 # 已經存在：
                 # 合併 Geo List (避免重複)
                 if isinstance(item['geo'], str):
-                    # 防禦性檢查，雖然 _fetch_trending_now 回傳的是 str
+                    # 防禦性檢查，雖然 TrendingNowBackend 回傳的是 str
                     new_geo = item['geo']
                 else:
                     new_geo = item['geo'][0]
@@ -121,16 +159,6 @@ class DatabaseRawDataReader(RawDataReader):
                 # 取較早的時間
                 merged_dict[kw]['started'] = min(merged_dict[kw]['started'], item['started'])
 
-        dedup_data = list(merged_dict.values())
-
-        # 3. 排序
-        sorted_data = sorted(dedup_data, key=lambda x: x['frequency'], reverse=True)
-
-        # 4. 存入資料庫
-        self._save_to_database(sorted_data)
-        
-        return sorted_data
-
     def _save_to_database(self, data_list: list):
         """
         將處理好的資料寫入 MetricBatch 與 MetricQuery
@@ -161,71 +189,19 @@ class DatabaseRawDataReader(RawDataReader):
 
             print(f"Saving new Trending Batch to DB. ID: {new_batch.id}, Count: {total_keywords}")
 
-            # B. 建立 Queries
-            # 這邊加上 tags=["trending"] 方便之後辨識來源
-            for item in data_list:
-                query = MetricQuery(
-                    batch_id=new_batch.id,
-                    keyword=item['keyword'],
-                    geo=item['geo'],    # 存入 JSONB
-                    frequency=item['frequency'],
-                    tags=[]
-                )
-                session.add(query)
+            # B. 建立 Queries (一次 executemany 批次寫入)
+            rows = [
+                {
+                    "batch_id": new_batch.id,
+                    "keyword": item['keyword'],
+                    "geo": item['geo'],    # 存入 JSONB
+                    "frequency": item['frequency'],
+                    "tags": []
+                }
+                for item in data_list
+            ]
+            if rows:
+                session.execute(insert(MetricQuery), rows)
             
             session.commit()
             print("Save completed.")
-
-    def _fetch_trending_now(self, geo: str) -> list:
-        """
-        從 SerpApi 獲取指定國家的 Google Trends Trending Now 數據
-        (維持原邏輯，僅微調註解)
-        """
-        max_retries = 3
-        retry_delay = 30 
-
-        for attempt in range(max_retries + 1):
-            try:
-                params = {
-                    "engine": "google_trends_trending_now",
-                    "geo": geo,
-                    "api_key": os.environ.get('SERPAPI_KEY'),
-                    "hours": 168
-                }
-
-                search = GoogleSearch(params)
-                results = search.get_dict()
-
-                if "error" in results:
-                    raise Exception(results['error'])
-                
-                trending_searches = results.get("trending_searches", [])
-
-                trending_list = []
-                for row in trending_searches:
-                    keyword = row.get("query")
-                    freq = row.get("search_volume") or 0
-                    started_ts = row.get("start_timestamp")
-                    
-                    data = {
-                        "keyword": keyword,
-                        "frequency": freq,
-                        "started": started_ts,
-                        "geo": geo # 這裡回傳 string，merge 時會轉 list
-                    }
-                    trending_list.append(data)
-                    
-                print(f'Fetch {geo} Trending Query Success')
-                return trending_list
-
-            except Exception as e:
-                error_msg = str(e)
-                print(f"Error fetching {geo} (Attempt {attempt + 1}/{max_retries + 1}): {error_msg}")
-
-                if attempt < max_retries:
-                    print(f"Waiting {retry_delay} seconds before retrying...")
-                    time.sleep(retry_delay)
-                else:
-                    print(f"All {max_retries + 1} attempts failed for {geo}. Giving up.")
-                    return []
-        return []
\ No newline at end of file
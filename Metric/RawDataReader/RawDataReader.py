@@ -3,4 +3,10 @@ class RawDataReader:
         pass
 
     def readData(self) -> list:
-        pass
\ No newline at end of file
+        pass
+
+    def ensureBatch(self):
+        """
+        只確保最新的 Batch 存在 (必要時建立)，不回傳資料；子類別可覆寫以避免讀出整個 Batch
+        """
+        self.readData()
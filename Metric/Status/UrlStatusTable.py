@@ -0,0 +1,144 @@
+import numpy as np
+
+DISCOVERED = 1
+CRAWLED = 2
+INDEXED = 4
+
+TEAM_A = (0, 127)
+TEAM_B = (128, 255)
+
+def _grow(arr: np.ndarray, size: int, fill=0) -> np.ndarray:
+    """
+    容量不足時以 2 倍擴充 (攤銷 O(1))
+    """
+    if size <= len(arr):
+        return arr
+    new = np.full(max(size, len(arr) * 2), fill, dtype=arr.dtype)
+    new[:len(arr)] = arr
+    return new
+
+
+class UrlStatusTable:
+    """
+    Golden URL 狀態表 (欄式 NumPy 儲存)
+
+    每個不重複的 URL 對應一個 index (interning)：
+        flags[i]:    bit-packed 狀態 (DISCOVERED | CRAWLED | INDEXED)
+        shard[i]:    所在 Shard (int16，-1 表示未找到)
+        tag_bits[i]: 屬於哪些標籤 (第 k 個標籤為 bit k)
+    每筆 MetricURL 只存 (id, url index)，不再為每筆資料建立 dict。
+    """
+    def __init__(self, tags, capacity: int = 1024):
+        self.tags = list(tags)
+        if len(self.tags) > 32:
+            raise ValueError("UrlStatusTable supports at most 32 tags")
+        self.tag_bit = {tag: 1 << k for k, tag in enumerate(self.tags)}
+
+        self.urls = []
+        self.index = {}
+        self.flags = np.zeros(capacity, dtype=np.uint8)
+        self.shard = np.full(capacity, -1, dtype=np.int16)
+        self.tag_bits = np.zeros(capacity, dtype=np.uint32)
+
+        self.row_num = 0
+        self.metric_ids = np.zeros(capacity, dtype=np.int64)
+        self.metric_url = np.zeros(capacity, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.urls)
+
+    def add(self, metric_id: int, url: str, tags) -> bool:
+        """
+        加入一筆 MetricURL，回傳該 URL 是否第一次出現
+        """
+        i = self.index.get(url)
+        is_new = i is None
+        if is_new:
+            i = len(self.urls)
+            self.index[url] = i
+            self.urls.append(url)
+            self.flags = _grow(self.flags, i + 1)
+            self.shard = _grow(self.shard, i + 1, -1)
+            self.tag_bits = _grow(self.tag_bits, i + 1)
+
+        for tag in tags:
+            bit = self.tag_bit.get(tag)
+            if bit:
+                self.tag_bits[i] |= bit
+
+        r = self.row_num
+        self.metric_ids = _grow(self.metric_ids, r + 1)
+        self.metric_url = _grow(self.metric_url, r + 1)
+        self.metric_ids[r] = metric_id
+        self.metric_url[r] = i
+        self.row_num += 1
+        return is_new
+
+    def set_status(self, url: str, fetch_ok, indexed, shard_id) -> bool:
+        i = self.index.get(url)
+        if i is None:
+            return False
+        flags = DISCOVERED
+        if fetch_ok > 0:
+            flags |= CRAWLED
+        if indexed == 1:
+            flags |= INDEXED
+        self.flags[i] = flags
+        self.shard[i] = shard_id
+        return True
+
+    def unresolved(self) -> np.ndarray:
+        """
+        回傳 URL table 裡沒找到 (shard == -1) 的 URL index
+        """
+        return np.flatnonzero(self.shard[:len(self.urls)] == -1)
+
+    def set_shard(self, indices, shard_ids):
+        self.shard[np.asarray(indices, dtype=np.int64)] = np.asarray(shard_ids, dtype=np.int16)
+
+    def aggregate(self) -> dict:
+        """
+        以遮罩加總計算每個標籤的 Total / Team A / Team B 統計
+        回傳 {tag: {"Total"|"A"|"B": {"total", "disc", "crawl", "idx"}}}
+        """
+        n = len(self.urls)
+        flags = self.flags[:n]
+        shard = self.shard[:n]
+        tag_bits = self.tag_bits[:n]
+
+        disc = (flags & DISCOVERED) != 0
+        crawl = (flags & CRAWLED) != 0
+        idx = (flags & INDEXED) != 0
+        groups = {
+            "Total": np.ones(n, dtype=bool),
+            "A": (shard >= TEAM_A[0]) & (shard <= TEAM_A[1]),
+            "B": (shard >= TEAM_B[0]) & (shard <= TEAM_B[1]),
+        }
+
+        result = {}
+        for tag in self.tags:
+            member = (tag_bits & self.tag_bit[tag]) != 0
+            result[tag] = {}
+            for g, g_mask in groups.items():
+                mask = member & g_mask
+                result[tag][g] = {
+                    "total": int(np.count_nonzero(mask)),
+                    "disc": int(np.count_nonzero(mask & disc)),
+                    "crawl": int(np.count_nonzero(mask & crawl)),
+                    "idx": int(np.count_nonzero(mask & idx)),
+                }
+        return result
+
+    def metric_columns(self) -> tuple:
+        """
+        回傳每筆 MetricURL 的 (id, is_discovered, is_crawled, is_indexed, shard_id) 欄位陣列
+        """
+        rows = self.metric_url[:self.row_num]
+        flags = self.flags[rows]
+        return (
+            self.metric_ids[:self.row_num],
+            (flags & DISCOVERED) != 0,
+            (flags & CRAWLED) != 0,
+            (flags & INDEXED) != 0,
+            self.shard[rows],
+        )
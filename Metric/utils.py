@@ -0,0 +1,45 @@
+from functools import lru_cache
+from urllib.parse import urlsplit
+import threading
+import tldextract
+
+_extractor = None
+_extractor_lock = threading.Lock()
+
+def _get_extractor() -> tldextract.TLDExtract:
+    """
+    只使用 tldextract 內附的 Public Suffix List 快照：
+    不寫快取檔 (cache_dir=None)，也不連網抓最新清單 (suffix_list_urls=())，啟動結果固定且可離線執行。
+    """
+    global _extractor
+    if _extractor is None:
+        with _extractor_lock:
+            if _extractor is None:
+                _extractor = tldextract.TLDExtract(cache_dir=None, suffix_list_urls=(), fallback_to_snapshot=True)
+    return _extractor
+
+@lru_cache(maxsize=200_000)
+def get_registrable_domain(hostname: str) -> str:
+    """
+    hostname -> registrable domain (e.g. "news.bbc.co.uk" -> "bbc.co.uk")，IP 或無後綴回傳 ""
+    以 hostname 為 key 做 LRU 快取，同一網站的大量 URL 只需解析一次。
+    """
+    extracted = _get_extractor()(hostname)
+    if extracted.domain and extracted.suffix:
+        return f"{extracted.domain}.{extracted.suffix}"
+    return ""
+
+def get_domain(url: str) -> str:
+    """
+    URL -> registrable domain，解析失敗回傳 ""
+    沒有 Scheme 的 URL (e.g. "example.com/path") 補上 "//"，否則 urlsplit 會把整串當成 path
+    """
+    if url and "://" not in url and not url.startswith("//"):
+        url = "//" + url
+    try:
+        hostname = urlsplit(url).hostname
+    except ValueError:
+        return ""
+    if not hostname:
+        return ""
+    return get_registrable_domain(hostname)
@@ -1,6 +1,7 @@
 from argparse import ArgumentParser
 from itertools import islice
 import json
+import math
 import time
 import os
 from concurrent.futures import ProcessPoolExecutor
@@ -8,6 +9,9 @@ from concurrent.futures import ProcessPoolExecutor
 # Database
 from Database.Database import Database
 from WebSearchEngine.Database.CrawlerModels import create_url_state_model, UrlStateMixin
+from Database.CrawlerModels import IndexRetry
+from Database.utils import missingColumns
+from sqlalchemy import or_, and_
 
 # Chain Handlers
 from IndexSelection.Chain.Handler import Handler
@@ -16,7 +20,13 @@ from IndexSelection.Chain.ContentRead import ContentRead
 from IndexSelection.Chain.ExtractionJson import ExtractionJson
 from IndexSelection.Chain.QualityFilter import QualityFilter
 from IndexSelection.Chain.Scoring import Scoring
+from IndexSelection.Chain.DiversityCap import DiversityCap
 from IndexSelection.Chain.Ingestion import Ingestion
+from IndexSelection.Gazetteer.Gazetteer import ensure_compiled
+
+# Retry
+from IndexSelection.Retry.FailureClassifier import FailureClassifier
+from IndexSelection.Retry.RetryQueue import RetryQueue
 
 def parseArgs():
     parser = ArgumentParser()
@@ -25,11 +35,46 @@ def parseArgs():
     parser.add_argument("--range", type=int, default=256, help="Limit number of tables")
     parser.add_argument("--batch_size", type=int, default=100, help="Process batch size")
     parser.add_argument("--workers", type=int, default=4, help="Number of processes") # 新增 worker 參數
-    parser.add_argument("--reset", action="store_true", help="Reset typesense status before processing")
+    parser.add_argument("--reset", action="store_true", help="Reset indexed and transient-failed rows before processing")
+    parser.add_argument("--reset_all", action="store_true", help="Reset every processed row (including permanent rejects) and clear the retry queue")
+    parser.add_argument("--retry", action="store_true", help="Only reprocess due items from the index_retry queue")
+    parser.add_argument("--max_retry", type=int, default=5, help="Attempts before a transient failure becomes permanent")
+    parser.add_argument("--gazetteer", type=str, default=None, help="Entity name list (one per line, optional TAB + canonical name) for entity extraction")
+    parser.add_argument("--use_page_rank", action="store_true", help="Use page_rank (from IndexSelection.page_rank) as link score")
+    parser.add_argument("--domain_cap", type=int, default=0, help="Max indexed pages per domain (0 for no limit)")
+    parser.add_argument("--domain_cap_file", type=str, default=None, help="JSON file of per-domain cap overrides, e.g. {\"example.com\": 100}")
+    parser.add_argument("--index_budget", type=int, default=0, help="Max indexed pages over all tables (0 for no limit)")
 
     args = parser.parse_args()
     return args
 
+def load_domain_caps(path):
+    if not path:
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return {domain: int(cap) for domain, cap in json.load(f).items()}
+
+def demote_evicted(s, UrlState, evicted):
+    """
+    將被 DiversityCap 擠出去的 URL 降級為 indexed = -3 (政策拒絕)，並記錄獨立的 indexed_reason
+    """
+    by_reason = {}
+    for url, reason in evicted:
+        by_reason.setdefault(reason, []).append(url)
+
+    chunk_size = 5000
+    for reason, urls in by_reason.items():
+        for i in range(0, len(urls), chunk_size):
+            s.query(UrlState)\
+                .filter(UrlState.url.in_(urls[i:i + chunk_size]))\
+                .update(
+                    {
+                        UrlState.indexed: FailureClassifier.INDEXED_POLICY,
+                        UrlState.indexed_reason: reason,
+                    },
+                    synchronize_session=False
+                )
+
 def process_single_table(table_index: int, db_url: str, args):
     """
     Worker Function: 獨立處理一張 Table 的所有邏輯
@@ -39,12 +84,17 @@ def process_single_table(table_index: int, db_url: str, args):
     
     # 2. 在 Process 內部建立獨立的 Pipeline
     h1: Handler = ContentRead()
-    h2: Handler = ExtractionJson()
+    h2: Handler = ExtractionJson(gazetteer_path=args.gazetteer_compiled)
     h3: Handler = QualityFilter()
-    h4: Handler = Scoring()
-    h5: Handler = Ingestion()
+    h4: Handler = Scoring(use_page_rank=args.use_page_rank)
+    h5: DiversityCap = DiversityCap(
+        default_cap=args.domain_cap,
+        domain_caps=load_domain_caps(args.domain_cap_file),
+        shard_budget=math.ceil(args.index_budget / args.range) if args.index_budget > 0 else 0
+    )
+    h6: Handler = Ingestion()
 
-    h1.setNext(h2).setNext(h3).setNext(h4).setNext(h5)
+    h1.setNext(h2).setNext(h3).setNext(h4).setNext(h5).setNext(h6)
 
     # 統計變數
     error_breakdown = {}
@@ -52,17 +102,35 @@ def process_single_table(table_index: int, db_url: str, args):
     
     table_name = f'url_state_{table_index:03}'
     UrlState = create_url_state_model(table_name)
+    retry = RetryQueue(IndexRetry, table_index, max_attempts=args.max_retry)
 
     # =================================================
     # Reset Logic (如果需要)
     # =================================================
-    if args.reset:            
+    # --reset 只重跑已索引、「暫時失敗」與「政策拒絕」(上限 / 預算可能已調整) 的舊資料，永久失敗 (Soft 404 等) 不會再被解析
+    # --reset_all 維持舊行為：全部歸零，並清空重試佇列
+    if args.reset or args.reset_all:
+        if args.reset_all:
+            reset_filter = UrlState.indexed != 0
+        else:
+            reset_filter = or_(
+                UrlState.indexed == FailureClassifier.INDEXED_OK,
+                UrlState.indexed == FailureClassifier.INDEXED_POLICY,
+                and_(
+                    UrlState.indexed == FailureClassifier.INDEXED_PERMANENT,
+                    or_(
+                        FailureClassifier.transient_clause(UrlState.indexed_reason),
+                        FailureClassifier.policy_clause(UrlState.indexed_reason)
+                    )
+                )
+            )
+
         reset_batch_size = 5000
         while True:
             with db.session() as s:
                 subquery = s.query(UrlState.url)\
                     .filter(UrlState.fetch_ok > 0)\
-                    .filter(UrlState.indexed != 0)\
+                    .filter(reset_filter)\
                     .limit(reset_batch_size)\
                     .with_for_update(skip_locked=True)
                     
@@ -81,9 +149,27 @@ def process_single_table(table_index: int, db_url: str, args):
                     )
                 s.commit()
 
+        if args.reset_all:
+            with db.session() as s:
+                retry.clear(s)
+                s.commit()
+
+    # =================================================
+    # Diversity Cap 預熱：載入已經 indexed 的資料，讓上限跨 Run 生效
+    # =================================================
+    if args.domain_cap > 0 or args.domain_cap_file or args.index_budget > 0:
+        with db.session() as s:
+            rows = s.query(UrlState.url, UrlState.domain, UrlState.index_priority)\
+                .filter(UrlState.indexed == 1)\
+                .yield_per(10000)
+            h5.seed(rows)
+            demote_evicted(s, UrlState, h5.drainEvicted())
+            s.commit()
+
     # =================================================
     # Processing Logic
     # =================================================
+    # 一般模式處理 indexed = 0；--retry 模式只處理 index_retry 中已到期的項目
     total_processed_in_table = 0
 
     while True:
@@ -91,42 +177,89 @@ def process_single_table(table_index: int, db_url: str, args):
             break
 
         with db.session() as s:
-            query = s.query(UrlState)\
-                .filter(UrlState.fetch_ok > 0)\
-                .filter(UrlState.indexed == 0)\
-                .order_by(UrlState.url.asc()) \
-                .limit(args.batch_size)\
-                .with_for_update(skip_locked=True)
-            
-            batch_data: list[UrlStateMixin] = query.all()
+            if args.retry:
+                due_attempts = retry.due(s, args.batch_size)
+                if not due_attempts:
+                    break
+
+                batch_data: list[UrlStateMixin] = s.query(UrlState)\
+                    .filter(UrlState.url.in_(list(due_attempts)))\
+                    .with_for_update()\
+                    .all()
+
+                # URL 已不存在於 url_state 的項目直接移出佇列
+                found = {data.url for data in batch_data}
+                retry.resolve(s, [url for url in due_attempts if url not in found])
+            else:
+                due_attempts = {}
+                query = s.query(UrlState)\
+                    .filter(UrlState.fetch_ok > 0)\
+                    .filter(UrlState.indexed == 0)\
+                    .order_by(UrlState.url.asc()) \
+                    .limit(args.batch_size)\
+                    .with_for_update(skip_locked=True)
+                
+                batch_data: list[UrlStateMixin] = query.all()
 
             if not batch_data:
+                s.commit()
                 break
 
+            resolved = []
             for data in batch_data:
                 last_url = data.url
                 
                 try:
                     result: PipelineResult = h1.handle(data)
+                except Exception as e:
+                    result = PipelineResult(success=False, stage="Unhandled", reason=f"Unhandled error: {e}")
+
+                # 統計 Stage
+                if result.stage not in stage_breakdown:
+                    stage_breakdown[result.stage] = 0
+                stage_breakdown[result.stage] += 1
 
-                    # 統計 Stage
-                    if result.stage not in stage_breakdown:
-                        stage_breakdown[result.stage] = 0
-                    stage_breakdown[result.stage] += 1
+                if result.success:
+                    data.indexed = FailureClassifier.INDEXED_OK
+                    resolved.append(data.url)
+                    continue
 
-                    if result.success:
-                        data.indexed = 1
+                if result.reason not in error_breakdown:
+                    error_breakdown[result.reason] = 0
+                error_breakdown[result.reason] += 1
+                
+                data.index_priority = -1 
+
+                if FailureClassifier.is_policy(result.reason):
+                    data.indexed = FailureClassifier.INDEXED_POLICY
+                    data.indexed_reason = result.reason
+                    resolved.append(data.url)
+                elif FailureClassifier.is_transient(result.reason):
+                    attempts = due_attempts.get(data.url, 0) + 1
+                    if retry.exhausted(attempts):
+                        data.indexed = FailureClassifier.INDEXED_PERMANENT
+                        data.indexed_reason = f"Retry exhausted: {result.reason}"
+                        resolved.append(data.url)
                     else:
-                        if result.reason not in error_breakdown:
-                            error_breakdown[result.reason] = 0
-                        error_breakdown[result.reason] += 1
-                        
-                        data.indexed = -1
+                        data.indexed = FailureClassifier.INDEXED_TRANSIENT
                         data.indexed_reason = result.reason
-                        data.index_priority = -1 
+                        retry.schedule(s, data.url, result.reason, attempts)
+                else:
+                    data.indexed = FailureClassifier.INDEXED_PERMANENT
+                    data.indexed_reason = result.reason
+                    resolved.append(data.url)
 
-                except Exception:
-                    data.indexed = -1 
+            if args.retry:
+                retry.resolve(s, resolved)
+
+            # 被擠出 Top-K 的頁面 (可能在之前的 Batch 已經 commit 為 indexed = 1)
+            # 先 flush 本 Batch 的狀態，再用 UPDATE 降級，避免被 ORM 的 flush 蓋回去
+            evicted = h5.drainEvicted()
+            if evicted:
+                s.flush()
+                demote_evicted(s, UrlState, evicted)
+                for _, reason in evicted:
+                    error_breakdown[reason] = error_breakdown.get(reason, 0) + 1
 
             s.commit()
             total_processed_in_table += len(batch_data)
@@ -154,6 +287,19 @@ def main():
     DB_NAME = "crawlerdb"
     # 組合 DB URL 傳給 worker，讓 worker 自己建立連線
     DATABASE_URL = f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{args.database}/{DB_NAME}"
+
+    db = Database(DATABASE_URL)
+
+    # UrlStateMixin 含有 migrate_db 新增的欄位，舊資料庫沒有的話每個 url_state 查詢都會失敗，先檢查
+    missing = missingColumns(db.engine, "url_state_000", ["page_rank"])
+    if missing:
+        raise SystemExit(f"url_state tables are missing columns {missing}; run `python -m IndexSelection.migrate_db` first.")
+
+    # 重試佇列表 (若不存在則建立)
+    IndexRetry.__table__.create(db.engine, checkfirst=True)
+
+    # Gazetteer 只在主 Process 編譯一次，Worker 各自 mmap 同一個檔案 (共用 Page Cache)
+    args.gazetteer_compiled = ensure_compiled(args.gazetteer) if args.gazetteer else None
     
     # 使用 ProcessPoolExecutor 進行多進程並行
     # max_workers 建議設定為 CPU 核心數，或根據 DB 連線數限制調整
@@ -5,20 +5,38 @@ from Metric.RawDataReader.DatabaseRawDataReader import DatabaseRawDataReader
 from Metric.Query.QueryContext import QueryContext
 from Metric.Query.RandomQueryStrategy import RandomQueryStrategy
 from Metric.Query.HeadQueryStrategy import HeadQueryStrategy
+from Metric.Query.Search.AsyncSearchClient import AsyncSearchClient
+from Metric.Query.Search.SerpApiBackend import SerpApiBackend
+from Metric.Query.Search.FakeSearchBackend import FakeSearchBackend
+from Metric.Query.Search.TrendingNowBackend import TrendingNowBackend
+from Metric.Query.Search.SerpCache import SerpCache
+from Metric.Query.BatchStats import BatchStats
+from Metric.Query.ReservoirSampler import ReservoirSampler
 
 from Metric.Measure.MeasureContext import MeasureContext
 from Metric.Measure.TypesenseRankMeasure import TypesenseRankMeasure
 from Metric.Measure.CrawlerAllMetricMeasure import CrawlerAllMetricMeasure
 from Metric.Measure.SearchEngineAllMetricMeasure import SearchEngineAllMetricMeasure
 from Metric.Measure.CrawlerStatusMeasure import CrawlerStatusMeasure
+from Metric.Measure.IRMetricMeasure import IRMetricMeasure
+
+from Metric.Directory.DomainShardDirectory import DomainShardDirectory
+from Metric.Lookup.ShardLookup import ShardLookup
+from Metric.Lookup.InListShardLookup import InListShardLookup
+from Metric.Lookup.TempTableShardLookup import TempTableShardLookup
+from Metric.Bloom.ShardBloomIndex import ShardBloomIndex
+from Metric.Counter.ShardCounter import ShardCounter
+from Metric.Flow.TeamFlowAggregator import TeamFlowAggregator
+from Metric.Rank.FakeTypesenseServer import FakeTypesenseServer
 
 from Database.Database import Database
 from Database.CrawlerModels import Base as CrawlerBase
 from Database.MetricModels import Base as MetricBase
 from Database.ModelFactory.AppModelFactory import AppModelFactory
-from Database.utils import createAllMetricModel, createDB
+from Database.utils import createAllMetricModel, createDB, missingColumns
 
 from argparse import ArgumentParser
+from datetime import timedelta
 
 import os
 
@@ -53,10 +71,46 @@ def parseArgs():
     parser.add_argument("--rawdatareader", choices=['db'], default='db', help="raw data reader strategy")
     parser.add_argument("--update", type=int, default=14, help="auto generator days")
     parser.add_argument("--keywordNums", type=int, default=100, help="Metric Data Keyword Nums")
+    parser.add_argument("--search_backend", choices=['serpapi', 'fake', 'sync'], default='serpapi', help="golden set search backend ('sync' = one query at a time)")
+    parser.add_argument("--search_rate", type=float, default=1.0, help="max search requests per second")
+    parser.add_argument("--serp_cache", help="SerpApi response cache (sqlite path); reruns within the TTL cost no API calls")
+    parser.add_argument("--serp_cache_ttl", type=float, default=7, help="SERP cache TTL in days")
+    parser.add_argument("--serp_cache_bucket", type=int, default=1, help="SERP cache date bucket in days")
+    parser.add_argument("--serp_cache_max_mb", type=int, default=256, help="SERP cache size limit (LRU eviction)")
+    parser.add_argument("--search_concurrency", type=int, default=8, help="max in-flight search requests")
+    parser.add_argument("--reservoir", action='store_true', help="random strategy streams the batch from the DB and reservoir-samples it (constant memory)")
+    parser.add_argument("--stratify", nargs='*', choices=['geo', 'band'], default=['geo', 'band'], help="reservoir strata: primary geo and/or frequency band (none = plain reservoir)")
+    parser.add_argument("--sample_seed", type=int, help="reservoir sampling seed (reproducible samples)")
+    parser.add_argument("--recount_batch_stats", action='store_true', help="rebuild the latest batch's tag/query/url metadata with one aggregate query")
 
     parser.add_argument("--test", action='store_true', help="test performance")
     parser.add_argument("--typesense_url", help="typesense url")
-    parser.add_argument("--measure", nargs='+', choices=['status', 'rank', 'crawler_all', 'all'], help="raw data path")
+    parser.add_argument("--fake_typesense", action='store_true', help="rank measure against a local stand-in Typesense seeded from the batch's golden set (offline benchmark, results are not written to MetricDB)")
+    parser.add_argument("--rank_batch_size", type=int, default=50, help="queries per Typesense multi_search request")
+    parser.add_argument("--rank_workers", type=int, default=8, help="concurrent multi_search requests")
+    parser.add_argument("--ir_k", type=int, nargs='+', default=[1, 5, 10], help="cutoffs for precision/recall/nDCG@k")
+    parser.add_argument("--ir_bootstrap", type=int, default=1000, help="bootstrap resamples for IR metric confidence intervals (0 = none)")
+    parser.add_argument("--measure", nargs='+', choices=['status', 'rank', 'crawler_all', 'ir', 'all'], help="raw data path")
+
+    parser.add_argument("--multi_tag", action='store_true', help="measure all --strategy tags in one shard scan")
+    parser.add_argument("--shard_directory", action='store_true', help="route golden URL lookups through the domain -> shard directory")
+    parser.add_argument("--lookup", choices=['in', 'temp'], default='in', help="golden URL lookup: IN-list per shard, or COPY into a temp table and join")
+    parser.add_argument("--build_directory", action='store_true', help="rebuild the domain -> shard directory from domain_stats_*")
+    parser.add_argument("--directory_miss_ttl", type=float, default=24, help="hours before a domain missing from every shard is probed again")
+
+    parser.add_argument("--bloom_dir", help="per-shard URL bloom filter directory (enables shard pruning)")
+    parser.add_argument("--bloom_max_age", type=float, default=24, help="hours before a bloom filter is treated as stale")
+    parser.add_argument("--build_bloom", action='store_true', help="build / incrementally refresh bloom filters in --bloom_dir")
+
+    parser.add_argument("--approx", action='store_true', help="status measure estimates counts from TABLESAMPLE (with confidence intervals)")
+    parser.add_argument("--sample_rate", type=float, default=0.01, help="TABLESAMPLE SYSTEM page fraction for --approx")
+    parser.add_argument("--confidence", type=float, default=0.95, help="confidence level of --approx intervals")
+    parser.add_argument("--no_team_flow", action='store_true', help="skip per-team fetch/error stats from domain_stats_daily_*")
+    parser.add_argument("--history_days", type=int, default=0, help="status measure also backfills fetch/error columns of the previous N days")
+    parser.add_argument("--flow_cache", help="directory caching daily flow prefix sums (later runs only read new days)")
+    parser.add_argument("--create_flow_index", action='store_true', help="create stat_date indexes on domain_stats_daily_* (CONCURRENTLY)")
+    parser.add_argument("--use_counter", action='store_true', help="status measure reads trigger-maintained url_state counters instead of scanning shards")
+    parser.add_argument("--install_counter", action='store_true', help="install url_state counter triggers and seed the counters")
 
     parser.add_argument("--createtable", action='store_true', help="create table")
 
@@ -64,33 +118,107 @@ def parseArgs():
     return args
 
 
+def getSerpCache(args) -> SerpCache:
+    if not args.serp_cache:
+        return None
+    return SerpCache(args.serp_cache, ttl=timedelta(days=args.serp_cache_ttl), bucket_days=args.serp_cache_bucket,
+                     max_bytes=args.serp_cache_max_mb * 1024 * 1024)
+
+def getSearchClient(args, cache: SerpCache = None) -> AsyncSearchClient:
+    if args.search_backend == 'sync':
+        return None
+    backend = FakeSearchBackend() if args.search_backend == 'fake' else SerpApiBackend()
+    return AsyncSearchClient(backend, rate=args.search_rate, concurrency=args.search_concurrency, cache=cache)
+
 def createDataset(args, modelFactory: AppModelFactory, crawlerDB, metricDB):
+    # Trending / Head / Random 共用同一個 SERP 快取
+    cache = getSerpCache(args)
     rawDataReader: RawDataReader = None
     if args.rawdatareader == "db":
-        rawDataReader = DatabaseRawDataReader(metricDB, modelFactory, args.update)
-    rawData = rawDataReader.readData()
+        # Trending Now 各國並行查詢，與 Golden Set 查詢使用相同的速率限制
+        trendingClient = AsyncSearchClient(TrendingNowBackend(), rate=args.search_rate, concurrency=args.search_concurrency, cache=cache)
+        rawDataReader = DatabaseRawDataReader(metricDB, modelFactory, args.update, cache, trendingClient)
+    # 只跑水庫抽樣的 Random 策略時直接從 DB 串流抽樣，不必把整個 Batch 讀進記憶體
+    if args.reservoir and set(args.strategy) <= {'random'}:
+        rawDataReader.ensureBatch()
+        rawData = None
+    else:
+        rawData = rawDataReader.readData()
     batch_id = get_latest_batch_id(metricDB, modelFactory)
 
     context: QueryContext = QueryContext()
+    searchClient = getSearchClient(args, cache)
 
     if 'random' in args.strategy:
-        context.setQueryStrategy(RandomQueryStrategy(metricDB, modelFactory, batch_id, rawData, args.keywordNums))
+        sampler = ReservoirSampler(args.keywordNums, args.sample_seed, args.stratify) if args.reservoir else None
+        context.setQueryStrategy(RandomQueryStrategy(metricDB, modelFactory, batch_id, rawData, args.keywordNums, searchClient, cache, sampler))
         context.getGoldenSet()
     if 'head' in args.strategy:
-        context.setQueryStrategy(HeadQueryStrategy(metricDB, modelFactory, batch_id, rawData, args.keywordNums))
+        context.setQueryStrategy(HeadQueryStrategy(metricDB, modelFactory, batch_id, rawData, args.keywordNums, searchClient, cache))
         context.getGoldenSet()
 
+def getBloomIndex(args, modelFactory: AppModelFactory, crawlerDB) -> ShardBloomIndex:
+    if not args.bloom_dir:
+        return None
+    return ShardBloomIndex(modelFactory, crawlerDB, args.bloom_dir, max_age=timedelta(hours=args.bloom_max_age))
+
 def test(args, modelFactory: AppModelFactory, crawlerDB, metricDB):
     context: MeasureContext = MeasureContext()
 
     if 'status' in args.measure:
-        context.setMeasure(CrawlerStatusMeasure(modelFactory, crawlerDB, metricDB))
+        counter = ShardCounter(modelFactory, crawlerDB) if args.use_counter else None
+        context.setMeasure(CrawlerStatusMeasure(modelFactory, crawlerDB, metricDB, counter, args.approx, args.sample_rate, args.confidence, not args.no_team_flow,
+                                                args.history_days, args.flow_cache))
         context.test()
 
-    for tag in args.strategy:
-        if 'crawler_all' in args.measure:
-            context.setMeasure(CrawlerAllMetricMeasure(modelFactory, crawlerDB, metricDB, get_latest_batch_id(metricDB, modelFactory), tag))
-            context.test()
+    lookup: ShardLookup = None
+    if args.lookup == 'in':
+        lookup = InListShardLookup(modelFactory, crawlerDB)
+    elif args.lookup == 'temp':
+        lookup = TempTableShardLookup(modelFactory, crawlerDB)
+
+    directory = DomainShardDirectory(modelFactory, crawlerDB, metricDB, lookup=lookup,
+                                      miss_ttl=timedelta(hours=args.directory_miss_ttl)) if args.shard_directory else None
+    bloom = getBloomIndex(args, modelFactory, crawlerDB)
+
+    if 'crawler_all' in args.measure:
+        # --multi_tag: 所有標籤共用一次 Shard 掃描，再依標籤分開寫入 metric_<set>_*
+        tag_groups = [args.strategy] if args.multi_tag and args.strategy else args.strategy
+        try:
+            for tag in tag_groups:
+                context.setMeasure(CrawlerAllMetricMeasure(modelFactory, crawlerDB, metricDB, get_latest_batch_id(metricDB, modelFactory), tag, directory, lookup, bloom))
+                context.test()
+        finally:
+            if bloom:
+                bloom.close()
+
+    if 'rank' in args.measure or 'ir' in args.measure:
+        batch_id = get_latest_batch_id(metricDB, modelFactory)
+        server = None
+        typesense_url = args.typesense_url
+        if args.fake_typesense:
+            server = FakeTypesenseServer(FakeTypesenseServer.documents_from_batch(metricDB, modelFactory, batch_id),
+                                         api_key=os.getenv("TYPESENSE_API_KEY", "apiapiapi"))
+            typesense_url = server.start()
+            # 假 Typesense 的文件是隨機抽樣產生的，結果只輸出報告，不寫入 MetricDB
+            print("🧪 --fake_typesense: rank / ir results are reported only (dry run).")
+        try:
+            tag_groups = [args.strategy] if args.multi_tag and args.strategy else args.strategy
+            for tag in tag_groups:
+                if 'rank' in args.measure:
+                    context.setMeasure(TypesenseRankMeasure(modelFactory, metricDB, batch_id, tag, typesense_url,
+                                                            batch_size=args.rank_batch_size, workers=args.rank_workers,
+                                                            dry_run=args.fake_typesense))
+                    context.test()
+                if 'ir' in args.measure:
+                    context.setMeasure(IRMetricMeasure(modelFactory, metricDB, batch_id, tag, typesense_url, args.ir_k,
+                                                       args.ir_bootstrap, args.confidence,
+                                                       batch_size=args.rank_batch_size, workers=args.rank_workers,
+                                                       dry_run=args.fake_typesense))
+                    context.test()
+        finally:
+            if server:
+                server.stop()
 
 def main():
     args = parseArgs()
@@ -103,6 +231,27 @@ def main():
     crawlerDB = createDB("crawler", "crawler", args.crawler_db_url, "crawlerdb")
     metricDB = createDB("metric", "metric", args.metric_db_url, "metricdb", args.createtable, MetricBase)
 
+    # 既有的 crawler_stat_* 表不會被 create_all 補欄位，需先跑 migrate_db --metric_database
+    if args.measure and 'status' in args.measure:
+        missing = missingColumns(metricDB.engine, "crawler_stat_total", ["is_estimate", "discovered_ci", "crawled_ci", "indexed_ci"])
+        if missing:
+            raise SystemExit(f"crawler_stat tables are missing columns {missing}; run `python -m IndexSelection.migrate_db --metric_database ...` first.")
+
+    if args.install_counter:
+        counter = ShardCounter(modelFactory, crawlerDB)
+        counter.install()
+        counter.seed()
+    if args.create_flow_index:
+        TeamFlowAggregator(modelFactory, crawlerDB).ensure_indexes()
+    if args.build_bloom:
+        getBloomIndex(args, modelFactory, crawlerDB).refresh()
+    if args.build_directory:
+        DomainShardDirectory(modelFactory, crawlerDB, metricDB).build()
+    if args.recount_batch_stats:
+        # Batch Metadata 平常由寫入端增量維護；舊 Batch 或懷疑不一致時用一條 SQL 重算
+        batch_id = get_latest_batch_id(metricDB, modelFactory)
+        stats = BatchStats(modelFactory).refresh(metricDB, batch_id)
+        print(f"Batch {batch_id} Stats Recounted: Queries={stats['queries']}, URLs={stats['urls']}, Tags={stats['tags']}")
     if args.create:
         createDataset(args, modelFactory, crawlerDB, metricDB)
     if args.test:
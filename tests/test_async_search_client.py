@@ -0,0 +1,115 @@
+from Metric.Query.Search.AsyncSearchClient import AsyncSearchClient
+from Metric.Query.Search.FakeSearchBackend import FakeSearchBackend
+from Metric.Query.Search.SearchBackend import SearchError
+from Metric.Query.Search.SerpCache import SerpCache
+import threading
+import time
+
+
+class FlakyBackend(FakeSearchBackend):
+    """
+    每個 query 的前 failures 次呼叫失敗，之後成功
+    """
+    def __init__(self, failures: int, retryable: bool = True):
+        super().__init__(latency=0.0)
+        self.failures = failures
+        self.retryable = retryable
+        self.attempts = {}
+
+    async def search(self, query: str, num: int = 10) -> list:
+        self.attempts[query] = self.attempts.get(query, 0) + 1
+        if self.attempts[query] <= self.failures:
+            self.calls += 1
+            raise SearchError("flaky", retryable=self.retryable)
+        return await super().search(query, num)
+
+
+def run(client: AsyncSearchClient, queries, num: int = 10) -> dict:
+    return dict(client.iter_results(enumerate(queries), num))
+
+
+def test_rate_limit_spaces_requests():
+    backend = FakeSearchBackend(latency=0.0)
+    client = AsyncSearchClient(backend, rate=20, burst=1, concurrency=8)
+
+    start = time.monotonic()
+    results = run(client, [f"q{i}" for i in range(11)])
+    elapsed = time.monotonic() - start
+
+    # burst = 1：第一個請求立即送出，之後每 1/20 秒一個
+    assert len(results) == 11
+    assert backend.calls == 11
+    assert elapsed >= 10 / 20 * 0.9
+
+
+def test_retry_until_success():
+    backend = FlakyBackend(failures=2)
+    client = AsyncSearchClient(backend, rate=1000, burst=10, max_retries=3, base_delay=0.01)
+
+    results = run(client, ["a", "b"])
+
+    assert backend.attempts == {"a": 3, "b": 3}
+    assert all(len(urls) == 10 for urls in results.values())
+
+
+def test_retry_gives_up():
+    backend = FlakyBackend(failures=5)
+    client = AsyncSearchClient(backend, rate=1000, burst=10, max_retries=3, base_delay=0.01)
+
+    assert run(client, ["a"]) == {0: []}
+    assert backend.attempts == {"a": 3}
+
+
+def test_non_retryable_error_is_not_retried():
+    backend = FlakyBackend(failures=5, retryable=False)
+    client = AsyncSearchClient(backend, rate=1000, burst=10, max_retries=3, base_delay=0.01)
+
+    assert run(client, ["a"]) == {0: []}
+    assert backend.attempts == {"a": 1}
+
+
+def test_cache_hits_skip_backend(tmp_path):
+    cache = SerpCache(str(tmp_path / "serp.sqlite"))
+    queries = [f"q{i}" for i in range(5)]
+    try:
+        backend = FakeSearchBackend(latency=0.0)
+        first = run(AsyncSearchClient(backend, rate=1000, burst=10, cache=cache), queries)
+        assert backend.calls == 5
+        assert cache.hits == 0
+
+        backend = FakeSearchBackend(latency=0.0)
+        second = run(AsyncSearchClient(backend, rate=1000, burst=10, cache=cache), queries)
+        assert backend.calls == 0
+        assert cache.hits == 5
+        assert second == first
+    finally:
+        cache.close()
+
+
+def test_cache_io_runs_off_event_loop(tmp_path):
+    cache = SerpCache(str(tmp_path / "serp.sqlite"))
+    threads = {"loop": set(), "cache": set()}
+
+    class RecordingBackend(FakeSearchBackend):
+        async def search(self, query: str, num: int = 10) -> list:
+            threads["loop"].add(threading.get_ident())
+            return await super().search(query, num)
+
+    get, put = cache.get, cache.put
+
+    def recording_get(*args, **kwargs):
+        threads["cache"].add(threading.get_ident())
+        return get(*args, **kwargs)
+
+    def recording_put(*args, **kwargs):
+        threads["cache"].add(threading.get_ident())
+        return put(*args, **kwargs)
+
+    cache.get, cache.put = recording_get, recording_put
+    try:
+        run(AsyncSearchClient(RecordingBackend(latency=0.0), rate=1000, burst=10, cache=cache), ["a", "b"])
+    finally:
+        cache.close()
+
+    assert threads["cache"]
+    assert not threads["cache"] & threads["loop"]
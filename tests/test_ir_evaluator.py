@@ -0,0 +1,74 @@
+from Metric.IR.IREvaluator import IREvaluator
+import math
+import numpy as np
+import pytest
+
+# Query 1：Golden a (第 1 名)、b (第 2 名)；搜尋結果 x, b, a
+# Query 2：Golden c；搜尋結果 c, y
+GOLDEN = [[("a", 1), ("b", 2)], [("c", 1)]]
+RESULTS = [["x", "b", "a"], ["c", "y"]]
+
+
+def evaluate(golden=GOLDEN, results=RESULTS, **kwargs):
+    report = IREvaluator(ks=(1, 5), **kwargs).evaluate(golden, results, n_boot=0)
+    return {name: r["value"] for name, r in report.items()}
+
+
+def test_hand_computed_graded_metrics():
+    values = evaluate()
+
+    # graded：Query 1 的相關度 a = 2、b = 1
+    # DCG@5 = 1 / log2(3) + 2 / log2(4)，IDCG@5 = 2 / log2(2) + 1 / log2(3)
+    ndcg_q1 = (1 / math.log2(3) + 2 / math.log2(4)) / (2 + 1 / math.log2(3))
+
+    assert values["precision@1"] == pytest.approx((0 + 1) / 2)
+    assert values["precision@5"] == pytest.approx((2 / 5 + 1 / 5) / 2)
+    assert values["recall@1"] == pytest.approx((0 + 1) / 2)
+    assert values["recall@5"] == pytest.approx((1 + 1) / 2)
+    assert values["mrr"] == pytest.approx((1 / 2 + 1) / 2)
+    assert values["ndcg@1"] == pytest.approx((0 + 1) / 2)
+    assert values["ndcg@5"] == pytest.approx((ndcg_q1 + 1) / 2, rel=1e-6)
+
+
+def test_binary_relevance_ndcg():
+    values = evaluate(graded=False)
+
+    # 相關度皆為 1：DCG@5 = 1 / log2(3) + 1 / log2(4)，IDCG@5 = 1 + 1 / log2(3)
+    ndcg_q1 = (1 / math.log2(3) + 1 / math.log2(4)) / (1 + 1 / math.log2(3))
+    assert values["ndcg@5"] == pytest.approx((ndcg_q1 + 1) / 2, rel=1e-6)
+
+
+def test_duplicates_and_empty_golden():
+    report = IREvaluator(ks=(1, 5)).evaluate(
+        [[("a", 1)], []],
+        [["a", "a", "a"], ["z"]],
+        n_boot=0
+    )
+
+    # 重複出現的命中只算一次；沒有 Golden URL 的 Query 不參與評估
+    assert report["precision@5"]["value"] == pytest.approx(1 / 5)
+    assert report["precision@5"]["queries"] == 1
+    assert report["mrr"]["value"] == pytest.approx(1.0)
+
+
+def test_bootstrap_interval_contains_mean():
+    rng = np.random.default_rng(1)
+    golden = [[(f"g{i}", 1)] for i in range(500)]
+    results = [[f"g{i}"] if rng.random() < 0.3 else ["miss"] for i in range(500)]
+    evaluator = IREvaluator(ks=(1,))
+
+    exact = evaluator.evaluate(golden, results, n_boot=500, max_units=None)["precision@1"]
+    grouped = evaluator.evaluate(golden, results, n_boot=500, max_units=100)["precision@1"]
+
+    assert exact["ci_low"] < exact["value"] < exact["ci_high"]
+    # 分組重抽是近似，區間寬度應與逐筆重抽相近
+    exact_width = exact["ci_high"] - exact["ci_low"]
+    grouped_width = grouped["ci_high"] - grouped["ci_low"]
+    assert grouped_width == pytest.approx(exact_width, rel=0.3)
+
+
+def test_duplicate_golden_urls_count_once():
+    report = IREvaluator(ks=(1, 5)).evaluate([[("a", 1), ("a", 2), ("b", 3)]], [["a", "b"]], n_boot=0)
+
+    # Golden 只有 a / b 兩個不同的 URL，兩個都命中時 Recall 為 1
+    assert report["recall@5"]["value"] == pytest.approx(1.0)